@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -86,6 +87,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # checkouts write in a transaction (orders.stock): take the write lock
+            # when it begins and wait for it, instead of failing with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # a file, not shared-cache memory, so concurrent tests wait for locks as in production
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -144,10 +153,57 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # orjson renderer/parser; use rest_framework.renderers.JSONRenderer and
+    # rest_framework.parsers.JSONParser instead to go back to the stdlib json.
+    # Clients can ask for MessagePack with Accept: application/msgpack
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'api.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'api.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CatalogPagination',
     'PAGE_SIZE': 10,
+    'MAX_PAGE_SIZE': 100,
 }
 
+# Use a shared backend (Redis, Memcached) in production so that every worker
+# sees the version bumps of api.cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Seconds a public catalog response stays in the cache, 0 disables caching
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+# brotli runs on every uncached response, so keep it well below the maximum of 11
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Widths (px) of the WebP/JPEG derivatives of uploaded images, see api.images
+IMAGE_DERIVATIVE_WIDTHS = (160, 320, 640, 1280)
+# Render derivatives on a worker thread after the upload commits
+IMAGE_DERIVATIVES_ASYNC = True
+
+# Pending orders older than this are cancelled by expire_pending_orders and
+# their reserved stock released
+ORDER_PENDING_TTL_MINUTES = 30
+
+# Most GET sub-requests one POST /api/batch/ may carry
+BATCH_MAX_REQUESTS = 20
+
+# Seconds before a worker rebuilds its in-memory autocomplete index
+AUTOCOMPLETE_TTL = 300
+
 # JWT settings
 from datetime import timedelta
 SIMPLE_JWT = {
@@ -198,3 +254,25 @@ CORS_ALLOWED_HEADERS = [
 ]
 
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+STORAGES = {
+    # uploads get content-hashed names, served as immutable by api.media
+    'default': {'BACKEND': 'api.storage.HashedMediaStorage'},
+    # hashed names plus .gz/.br copies for the web server
+    'staticfiles': {'BACKEND': 'api.storage.CompressedManifestStaticFilesStorage'},
+}
+
+# How /media/ files are sent: 'nginx' (X-Accel-Redirect to an internal location
+# at MEDIA_SENDFILE_PREFIX aliased to MEDIA_ROOT), 'xsendfile' (Apache
+# mod_xsendfile, lighttpd) or None to stream them from Python, for development only
+MEDIA_SENDFILE_BACKEND = None
+MEDIA_SENDFILE_PREFIX = '/protected-media/'
+# Cache lifetime of media without a content hash in the name (older uploads)
+MEDIA_CACHE_MAX_AGE = 3600
+
+# Resumable uploads (api.uploads): largest accepted image, where part files
+# are kept (None: MEDIA_ROOT/.uploads, must be on the same filesystem) and
+# when clear_stale_uploads drops an abandoned session
+UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+UPLOAD_TEMP_DIR = None
+UPLOAD_SESSION_TTL_HOURS = 24
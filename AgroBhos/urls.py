@@ -14,20 +14,21 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from pip._internal import locations
 
+from api.media import serve_media
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/',include("api.urls")),
     path('users/',include("users.urls")),
     path('orders/', include('orders.urls')),
     path('locations/', include('map.urls')),
-]
-
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # the bytes are sent by the web server in production, see api.media
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+]
\ No newline at end of file
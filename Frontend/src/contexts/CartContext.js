@@ -1,5 +1,6 @@
 import React, { createContext, useState, useContext, useEffect } from 'react';
 import AsyncStorage from '@react-native-async-storage/async-storage';
+import { cartAPI } from '../services/api';
 
 const CartContext = createContext();
 
@@ -108,6 +109,29 @@ export const CartProvider = ({ children }) => {
     }));
   };
 
+  // Обновляет цены всех строк одним запросом к /api/cart/quote/
+  const refreshQuote = async () => {
+    if (cartItems.length === 0) {
+      return null;
+    }
+    const response = await cartAPI.quote(cartItems.map(item => ({
+      type: item.content_type,
+      id: item.object_id,
+      quantity: item.quantity,
+    })));
+    const prices = {};
+    response.data.farms.forEach(farm => farm.lines.forEach(line => {
+      prices[`${line.type}:${line.id}`] = line.price;
+    }));
+    setCartItems(prevItems =>
+      prevItems.map(item => {
+        const price = prices[`${item.content_type}:${item.object_id}`];
+        return price === undefined ? item : { ...item, price };
+      })
+    );
+    return response.data;
+  };
+
   const value = {
     cartItems,
     addToCart,
@@ -117,6 +141,7 @@ export const CartProvider = ({ children }) => {
     getCartTotal,
     getCartCount,
     getCartItemsForOrder,
+    refreshQuote,
   };
 
   return (
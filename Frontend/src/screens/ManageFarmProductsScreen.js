@@ -9,7 +9,7 @@ import {
   ActivityIndicator,
   RefreshControl,
 } from 'react-native';
-import { farmsAPI, businessAPI } from '../services/api';
+import { farmsAPI, businessAPI, productsAPI } from '../services/api';
 
 const ManageFarmProductsScreen = ({ route, navigation }) => {
   const { farm } = route.params;
@@ -64,8 +64,21 @@ const ManageFarmProductsScreen = ({ route, navigation }) => {
     setRefreshing(false);
   };
 
-  const handleEditProduct = (product) => {
-    navigation.navigate('EditProduct', { product, farm });
+  const handleEditProduct = async (product) => {
+    // строки списка — краткие (без описания и т.п.), форма отправляет все поля,
+    // поэтому перед редактированием загружаем полный продукт
+    const getDetail = {
+      crop: productsAPI.getCrop,
+      item: productsAPI.getItem,
+      machinery: productsAPI.getMachinery,
+    }[product.type];
+    try {
+      const response = await getDetail(product.id);
+      navigation.navigate('EditProduct', { product: { ...product, ...response.data, type: product.type }, farm });
+    } catch (error) {
+      console.error('Error loading product:', error);
+      Alert.alert('Ошибка', 'Не удалось загрузить продукт');
+    }
   };
 
   const handleDeleteProduct = (product) => {
@@ -56,9 +56,10 @@ const OrderCard = ({ order }) => {
     }
   };
 
+  // цены сохраняются в заказе при покупке; пересчёт только для старых ответов без total
   const calculateTotal = (items) => {
     return items.reduce((total, item) => {
-      return total + (item.product?.price || 0) * item.quantity;
+      return total + (item.subtotal ?? (item.product?.price || 0) * item.quantity);
     }, 0);
   };
 
@@ -81,7 +82,7 @@ const OrderCard = ({ order }) => {
               {item.product?.name || `Товар ${item.object_id}`}
             </Text>
             <Text style={styles.itemQuantity}>
-              {item.quantity} шт. × ${item.product?.price || 0}
+              {item.quantity} шт. × ${item.unit_price ?? item.product?.price ?? 0}
             </Text>
           </View>
         ))}
@@ -90,7 +91,7 @@ const OrderCard = ({ order }) => {
       <View style={styles.orderFooter}>
         <Text style={styles.totalLabel}>Итого:</Text>
         <Text style={styles.totalAmount}>
-                      ${calculateTotal(order.items || [])}
+                      ${order.total ?? calculateTotal(order.items || [])}
         </Text>
       </View>
     </View>
@@ -11,7 +11,7 @@ export const authAPI = {
 
 // Продукты
 export const productsAPI = {
-  getAllProducts: () => api.get('/api/all/'),
+  getAllProducts: (params) => api.get('/api/all/', { params }),
   getCrop: (id) => api.get(`/api/crops/${id}/`),
   getItem: (id) => api.get(`/api/items/${id}/`),
   getMachinery: (id) => api.get(`/api/machinery/${id}/`),
@@ -25,10 +25,20 @@ export const farmsAPI = {
   getUserFarms: () => api.get('/api/user/farms/'),
 };
 
+// Несколько GET-запросов одним обращением: [{ url, headers? }] -> [{ status, headers, body }]
+export const batchAPI = {
+  get: (urls) => api.post('/api/batch/', urls.map(url => (typeof url === 'string' ? { url } : url))),
+};
+
+// Корзина: актуальные цены и остатки всех строк одним запросом
+export const cartAPI = {
+  quote: (lines) => api.post('/api/cart/quote/', lines),
+};
+
 // Заказы
 export const ordersAPI = {
   createOrder: (items) => api.post('/orders/orders/', { items }),
-  getUserOrders: () => api.get('/orders/orders/'),
+  getUserOrders: (params) => api.get('/orders/orders/', { params }),
 };
 
 // Управление продуктами (для владельцев бизнеса)
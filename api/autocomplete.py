@@ -0,0 +1,217 @@
+"""
+In-process prefix index for search-as-you-type suggestions.
+
+Every word of every product, category and farm name is kept in one sorted
+list of ``(word suffix, kind, pk)`` tuples, so a prefix lookup is two
+``bisect`` calls plus a top-k over the matching slice. The index is built
+lazily per process, kept current by the signals in ``api.signals`` and
+``orders.signals``, and rebuilt after ``AUTOCOMPLETE_TTL`` seconds so that
+workers which did not handle a write catch up.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Count, Sum
+
+from .models import Crop, CropCategory, Farm, Item, Machinery
+
+SUGGESTION_KINDS = {
+    'crop': Crop,
+    'item': Item,
+    'machinery': Machinery,
+    'category': CropCategory,
+    'farm': Farm,
+}
+KINDS_BY_MODEL = {model: kind for kind, model in SUGGESTION_KINDS.items()}
+
+# prefixes matching more keys than this get their top-k memoized
+CACHED_RANGE_SIZE = 256
+MAX_SUGGESTIONS = 20
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def get_keys(name):
+    """Returns the name from each word onwards, so 'cherry tomato' matches 'tom'."""
+    words = normalize(name).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class PrefixIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._entries = {}
+        self._top = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, entries):
+        """Bulk-loads ``(kind, pk, name, popularity)`` entries with a single sort."""
+        with self._lock:
+            keys = []
+            for kind, pk, name, popularity in entries:
+                self._entries[kind, pk] = (name, popularity)
+                keys.extend((key, kind, pk) for key in get_keys(name))
+            keys.sort()
+            self._keys = keys
+            self._top.clear()
+
+    def add(self, kind, pk, name, popularity=0):
+        with self._lock:
+            previous = self._entries.get((kind, pk))
+            if previous is not None:
+                self._discard_keys(kind, pk, previous[0])
+                # after a rename the old name's prefixes must stop returning it
+                self._forget(previous[0])
+                popularity = previous[1] + popularity
+            self._entries[kind, pk] = (name, popularity)
+            for key in get_keys(name):
+                insort(self._keys, (key, kind, pk))
+            self._forget(name)
+
+    def remove(self, kind, pk):
+        with self._lock:
+            entry = self._entries.pop((kind, pk), None)
+            if entry is not None:
+                self._discard_keys(kind, pk, entry[0])
+                self._forget(entry[0])
+
+    def bump(self, kind, pk, amount=1):
+        with self._lock:
+            entry = self._entries.get((kind, pk))
+            if entry is not None:
+                self._entries[kind, pk] = (entry[0], entry[1] + amount)
+                self._forget(entry[0])
+
+    def _discard_keys(self, kind, pk, name):
+        for key in get_keys(name):
+            position = bisect_left(self._keys, (key, kind, pk))
+            if position < len(self._keys) and self._keys[position] == (key, kind, pk):
+                del self._keys[position]
+
+    def _forget(self, name):
+        """Drops memoized answers for every prefix the name can match."""
+        if self._top:
+            for key in get_keys(name):
+                for end in range(1, len(key) + 1):
+                    self._top.pop(key[:end], None)
+
+    def warm(self, depth=2):
+        """Memoizes answers for the short prefixes the first keystrokes hit."""
+        prefixes = {key[:end] for key, _, _ in self._keys for end in range(1, depth + 1)}
+        for prefix in prefixes:
+            self.suggest(prefix)
+
+    def suggest(self, prefix, limit=10):
+        """Returns up to ``limit`` ``(kind, pk, name)`` matches, most popular first."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        limit = min(limit, MAX_SUGGESTIONS)
+        with self._lock:
+            cached = self._top.get(prefix)
+            if cached is not None:
+                return cached[:limit]
+            start = bisect_left(self._keys, (prefix,))
+            stop = bisect_left(self._keys, (prefix + '\uffff',))
+            entries = self._entries
+            matches = {(kind, pk) for _, kind, pk in self._keys[start:stop]}
+            best = heapq.nlargest(
+                MAX_SUGGESTIONS,
+                matches,
+                key=lambda match: (entries[match][1], -len(entries[match][0])),
+            )
+            suggestions = [(kind, pk, entries[kind, pk][0]) for kind, pk in best]
+            if stop - start > CACHED_RANGE_SIZE:
+                self._top[prefix] = suggestions
+            return suggestions[:limit]
+
+
+def get_popularity():
+    """Units ordered per product, products per category and products per farm."""
+    popularity = {}
+    if apps.is_installed('orders'):
+        OrderItem = apps.get_model('orders', 'OrderItem')
+        rows = (
+            OrderItem.objects.order_by()
+            .values('content_type__model', 'object_id')
+            .annotate(units=Sum('quantity'))
+        )
+        for row in rows:
+            popularity[row['content_type__model'], row['object_id']] = row['units']
+    for model in (Crop, Item, Machinery):
+        for row in model.objects.order_by().values('farm_id').annotate(products=Count('id')):
+            key = ('farm', row['farm_id'])
+            popularity[key] = popularity.get(key, 0) + row['products']
+    for row in Crop.objects.order_by().values('category_id').annotate(products=Count('id')):
+        popularity['category', row['category_id']] = row['products']
+    return popularity
+
+
+def build_index():
+    popularity = get_popularity()
+    index = PrefixIndex()
+    index.load(
+        (kind, pk, name, popularity.get((kind, pk), 0))
+        for kind, model in SUGGESTION_KINDS.items()
+        for pk, name in model.objects.order_by().values_list('pk', 'name').iterator(chunk_size=2000)
+    )
+    index.warm()
+    return index
+
+
+_index = None
+_built_at = 0.0
+_build_lock = threading.Lock()
+
+
+def get_index():
+    global _index, _built_at
+    ttl = getattr(settings, 'AUTOCOMPLETE_TTL', 300)
+    if _index is None or time.monotonic() - _built_at > ttl:
+        with _build_lock:
+            if _index is None or time.monotonic() - _built_at > ttl:
+                _index = build_index()
+                _built_at = time.monotonic()
+    return _index
+
+
+def reset_index():
+    global _index
+    _index = None
+
+
+def record_saved(instance, created):
+    """Mirrors a saved product, category or farm into the built index, if any."""
+    if _index is None:
+        return
+    kind = KINDS_BY_MODEL[type(instance)]
+    _index.add(kind, instance.pk, instance.name)
+    if created and kind in ('crop', 'item', 'machinery'):
+        _index.bump('farm', instance.farm_id)
+        if kind == 'crop':
+            _index.bump('category', instance.category_id)
+
+
+def record_deleted(instance):
+    if _index is None:
+        return
+    kind = KINDS_BY_MODEL[type(instance)]
+    _index.remove(kind, instance.pk)
+    if kind in ('crop', 'item', 'machinery'):
+        _index.bump('farm', instance.farm_id, -1)
+        if kind == 'crop':
+            _index.bump('category', instance.category_id, -1)
+
+
+def record_ordered(kind, pk, quantity):
+    if _index is not None:
+        _index.bump(kind, pk, quantity)
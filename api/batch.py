@@ -0,0 +1,101 @@
+"""
+Batched GET requests: several API reads in one round trip.
+
+Each sub-request is resolved with the URL resolver and dispatched to its
+view in-process, as the user the batch was authenticated as, so
+authentication runs once per batch. Middleware does not run for
+sub-requests; the batch response as a whole is compressed as usual.
+"""
+import io
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import Http404
+from django.urls import Resolver404, resolve
+from rest_framework import serializers
+from rest_framework.views import APIView
+
+DEFAULT_MAX_REQUESTS = 20
+# conditional headers a sub-request may send, as (name in the batch, WSGI key)
+FORWARDED_HEADERS = {
+    'If-None-Match': 'HTTP_IF_NONE_MATCH',
+    'If-Modified-Since': 'HTTP_IF_MODIFIED_SINCE',
+}
+RETURNED_HEADERS = ('ETag', 'Last-Modified')
+
+
+class SubRequestSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=['GET'], default='GET')
+    url = serializers.CharField(max_length=2000)
+    headers = serializers.DictField(child=serializers.CharField(), required=False)
+
+    def validate_url(self, value):
+        parts = urlsplit(value)
+        if parts.scheme or parts.netloc or not parts.path.startswith('/'):
+            raise serializers.ValidationError('Must be a path on this server, such as /api/farms/1/.')
+        return value
+
+    def validate_headers(self, value):
+        unknown = set(value) - set(FORWARDED_HEADERS)
+        if unknown:
+            raise serializers.ValidationError(f"Only {', '.join(FORWARDED_HEADERS)} may be sent.")
+        return value
+
+
+def validate_batch(data):
+    max_requests = getattr(settings, 'BATCH_MAX_REQUESTS', DEFAULT_MAX_REQUESTS)
+    serializer = SubRequestSerializer(data=data, many=True, allow_empty=False, max_length=max_requests)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def build_subrequest(request, url, headers):
+    parts = urlsplit(url)
+    environ = {
+        key: value for key, value in request.META.items()
+        if not key.startswith('HTTP_IF_') and key not in ('CONTENT_TYPE', 'CONTENT_LENGTH')
+    }
+    environ.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'CONTENT_LENGTH': '0',
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.input': io.BytesIO(),
+    })
+    for name, value in headers.items():
+        environ[FORWARDED_HEADERS[name]] = value
+    subrequest = WSGIRequest(environ)
+    # picked up by rest_framework.request.Request instead of authenticating again
+    subrequest._force_auth_user = request.user
+    subrequest._force_auth_token = request.auth
+    subrequest.user = request.user
+    return subrequest
+
+
+def dispatch(request, sub):
+    try:
+        match = resolve(urlsplit(sub['url']).path)
+    except Resolver404:
+        return {'status': 404, 'headers': {}, 'body': {'detail': 'Not found.'}}
+    view_class = getattr(match.func, 'view_class', None) or getattr(match.func, 'cls', None)
+    # plain Django views (admin, media) and views that opt out, such as the batch itself
+    if view_class is None or not issubclass(view_class, APIView) or not getattr(view_class, 'batchable', True):
+        return {'status': 400, 'headers': {}, 'body': {'detail': 'This URL cannot be batched.'}}
+
+    subrequest = build_subrequest(request, sub['url'], sub.get('headers', {}))
+    subrequest.resolver_match = match
+    try:
+        response = match.func(subrequest, *match.args, **match.kwargs)
+    except Http404:
+        return {'status': 404, 'headers': {}, 'body': {'detail': 'Not found.'}}
+    # a body the batch cannot embed, such as a stream; 304s have no body to embed
+    if not hasattr(response, 'data') and response.status_code != 304:
+        return {'status': 400, 'headers': {}, 'body': {'detail': 'This URL cannot be batched.'}}
+    return {
+        'status': response.status_code,
+        'headers': {name: response[name] for name in RETURNED_HEADERS if response.has_header(name)},
+        # the data is rendered with the batch, in the format the client asked for
+        'body': getattr(response, 'data', None),
+    }
@@ -0,0 +1,67 @@
+"""Helpers for the ``benchmark_*`` management commands."""
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .indexing import rebuild_product_index
+from .models import Crop, CropCategory, Farm, Item, Machinery
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rolled_back():
+    """Runs the block in a transaction that is always rolled back."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def seed_catalog(crops, items=0, machinery=0, products_per_farm=50):
+    """Bulk-creates a benchmark catalog and indexes it; returns the farms."""
+    owner = User.objects.create_user(
+        email='benchmark@example.com', password=None, first_name='Bench', last_name='Mark',
+    )
+    category = CropCategory.objects.create(name='Benchmark')
+    farm_count = max(1, (crops + items + machinery) // products_per_farm)
+    farms = Farm.objects.bulk_create(
+        Farm(
+            name=f'Farm {i}', owner=owner, address=f'{i} Heydar Aliyev avenue, Baku',
+            description='Family farm growing vegetables and fruit on the Absheron peninsula.',
+        )
+        for i in range(farm_count)
+    )
+    Crop.objects.bulk_create(
+        Crop(
+            name=f'Crop {i}', category=category, farm=farms[i % farm_count],
+            image=f'crops/{i}.jpg' if i % 2 else '', stock=i % 7, price=1.0 + i,
+        )
+        for i in range(crops)
+    )
+    Item.objects.bulk_create(
+        Item(name=f'Item {i}', farm=farms[i % farm_count], stock=i % 5, price=2.0 + i)
+        for i in range(items)
+    )
+    Machinery.objects.bulk_create(
+        Machinery(name=f'Machine {i}', producer='Kubota', farm=farms[i % farm_count], stock=1, price=1000.0 + i)
+        for i in range(machinery)
+    )
+    rebuild_product_index()
+    return farms
+
+
+def best_of(repeat, func):
+    """Shortest wall time of ``repeat`` calls, in seconds."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
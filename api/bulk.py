@@ -0,0 +1,368 @@
+"""
+Bulk writes to the product tables.
+
+Batched inserts and updates skip ``post_save``, so every write here
+ends with ``products_changed``, which brings the read model, search index,
+response cache and sync feed up to date for the whole batch at once.
+"""
+import codecs
+import csv
+from itertools import islice
+
+import orjson
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .models import Crop, CropCategory, Farm, Item, Machinery
+from .signals import products_changed
+
+PRODUCT_MODELS = {
+    'crop': Crop,
+    'item': Item,
+    'machinery': Machinery,
+}
+
+# columns an import row may set, per product type
+PRODUCT_FIELDS = {
+    Crop: ('farm_id', 'name', 'description', 'category_id', 'stock', 'predicted_yield', 'price'),
+    Item: ('farm_id', 'name', 'description', 'stock', 'price', 'is_new'),
+    Machinery: ('farm_id', 'name', 'producer', 'description', 'stock', 'price', 'is_new'),
+}
+REQUIRED_ON_CREATE = {
+    Crop: ('name', 'category_id', 'stock'),
+    Item: ('name', 'stock'),
+    Machinery: ('name', 'stock'),
+}
+
+MAX_REPORTED_ERRORS = 1000
+
+
+def iter_csv_rows(lines, encoding='utf-8-sig'):
+    """Dicts from CSV byte lines; empty cells are left out as if the column were missing."""
+    reader = csv.DictReader(codecs.iterdecode(lines, encoding))
+    # rows are read while the import runs, so bad input surfaces here rather than in the parser
+    try:
+        for row in reader:
+            yield {key: value for key, value in row.items() if key is not None and value != ''}
+    except UnicodeDecodeError as exc:
+        raise ParseError(f'CSV is not valid {encoding} (line {reader.line_num + 1}): {exc.reason}')
+    except csv.Error as exc:
+        raise ParseError(f'CSV parse error (line {reader.line_num}): {exc}')
+
+
+class CSVParser(BaseParser):
+    """Parses ``text/csv`` bodies lazily, one row at a time."""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return []
+        encoding = (parser_context or {}).get('encoding') or 'utf-8-sig'
+        return iter_csv_rows(iter(stream.readline, b''), encoding)
+
+
+def read_upload(upload):
+    """Rows of an uploaded ``.csv`` or JSON file."""
+    if upload.name.lower().endswith('.csv'):
+        return iter_csv_rows(iter(upload.readline, b''))
+    try:
+        return orjson.loads(upload.read())
+    except orjson.JSONDecodeError as exc:
+        raise ParseError(f'JSON parse error - {exc}')
+
+
+def update_rows(model, objects, fields):
+    """
+    Writes ``fields`` of many instances with one parameterized UPDATE run
+    through ``executemany``. Unlike ``QuerySet.bulk_update``, which builds a
+    CASE expression per field and row, its cost stays linear in the rows.
+    """
+    opts = model._meta
+    quote = connection.ops.quote_name
+    fields = [opts.get_field(name) for name in fields]
+    assignments = ', '.join(f'{quote(field.column)} = %s' for field in fields)
+    sql = f'UPDATE {quote(opts.db_table)} SET {assignments} WHERE {quote(opts.pk.column)} = %s'
+    params = [
+        [field.get_db_prep_save(getattr(obj, field.attname), connection) for field in fields] + [obj.pk]
+        for obj in objects
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+class ImportRowSerializer(serializers.Serializer):
+    """
+    One crop, item or machine of an import. A row updates the product with
+    its ``id``, or else the one with the same name on the same farm, and
+    creates a product when neither exists.
+    """
+    type = serializers.ChoiceField(choices=list(PRODUCT_MODELS))
+    id = serializers.IntegerField(required=False, min_value=1)
+    farm_id = serializers.IntegerField(required=False)
+    name = serializers.CharField(max_length=255, required=False)
+    description = serializers.CharField(required=False, allow_blank=True)
+    category_id = serializers.IntegerField(required=False)
+    category = serializers.CharField(max_length=100, required=False)
+    stock = serializers.IntegerField(required=False)
+    price = serializers.FloatField(required=False, allow_null=True)
+    predicted_yield = serializers.FloatField(required=False, allow_null=True)
+    producer = serializers.CharField(max_length=255, required=False, allow_null=True, allow_blank=True)
+    is_new = serializers.BooleanField(required=False)
+
+    def validate(self, attrs):
+        if 'id' not in attrs:
+            missing = {name: ['This field is required.'] for name in ('farm_id', 'name') if name not in attrs}
+            if missing:
+                raise serializers.ValidationError(missing)
+        return attrs
+
+
+class ProductImporter:
+    """
+    Upserts rows of mixed product types in batches, inside one transaction.
+
+    Farm ownership and categories are loaded once; each batch then costs one
+    lookup of existing products, one ``bulk_create`` and one batched UPDATE
+    per product type. Invalid rows are skipped and reported.
+    """
+
+    def __init__(self, user, batch_size=1000):
+        self.batch_size = batch_size
+        self.farm_ids = set(Farm.objects.filter(owner=user).values_list('pk', flat=True))
+        self.category_ids = None
+        self.category_names = None
+        self.row_serializer = ImportRowSerializer()
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.failed = 0
+
+    def load_categories(self):
+        if self.category_ids is None:
+            categories = list(CropCategory.objects.values_list('pk', 'name'))
+            self.category_ids = {pk for pk, _ in categories}
+            self.category_names = {name.casefold(): pk for pk, name in categories}
+
+    def add_error(self, number, detail):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'errors': detail})
+
+    def run(self, rows):
+        if isinstance(rows, dict):
+            raise ParseError('Expected a list of products.')
+        rows = enumerate(rows, start=1)
+        with transaction.atomic():
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self.import_batch(batch)
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+        }
+
+    def validate(self, row):
+        if not isinstance(row, dict):
+            raise serializers.ValidationError({'non_field_errors': ['Each row must be an object.']})
+        attrs = self.row_serializer.run_validation(row)
+        if 'farm_id' in attrs and attrs['farm_id'] not in self.farm_ids:
+            raise serializers.ValidationError({'farm_id': ['You can only import products to your own farms.']})
+        if attrs['type'] == 'crop' and ('category' in attrs or 'category_id' in attrs):
+            self.load_categories()
+            if 'category' in attrs:
+                category_id = self.category_names.get(attrs.pop('category').casefold())
+                if category_id is None:
+                    raise serializers.ValidationError({'category': ['Unknown category.']})
+                attrs['category_id'] = category_id
+            elif attrs['category_id'] not in self.category_ids:
+                raise serializers.ValidationError({'category_id': ['Unknown category.']})
+        return attrs
+
+    def import_batch(self, batch):
+        rows_by_model = {model: [] for model in PRODUCT_FIELDS}
+        for number, row in batch:
+            try:
+                attrs = self.validate(row)
+            except serializers.ValidationError as exc:
+                self.add_error(number, exc.detail)
+                continue
+            rows_by_model[PRODUCT_MODELS[attrs['type']]].append((number, attrs))
+        for model, rows in rows_by_model.items():
+            if rows:
+                self.upsert(model, rows)
+
+    def find_existing(self, model, rows):
+        ids = {attrs['id'] for _, attrs in rows if 'id' in attrs}
+        keys = {(attrs['farm_id'], attrs['name']) for _, attrs in rows if 'id' not in attrs}
+        by_id = model.objects.filter(pk__in=ids, farm_id__in=self.farm_ids).in_bulk() if ids else {}
+        by_key = {}
+        if keys:
+            candidates = model.objects.filter(
+                farm_id__in={farm_id for farm_id, _ in keys},
+                name__in={name for _, name in keys},
+            ).order_by('-pk')
+            # the oldest product wins when a farm has several with one name
+            for product in candidates:
+                by_key[product.farm_id, product.name] = product
+        return by_id, by_key
+
+    def upsert(self, model, rows):
+        fields = PRODUCT_FIELDS[model]
+        by_id, by_key = self.find_existing(model, rows)
+        to_create, to_update, update_fields = {}, {}, set()
+        now = timezone.now()
+
+        for number, attrs in rows:
+            values = {name: attrs[name] for name in fields if name in attrs}
+            if 'id' in attrs:
+                product = by_id.get(attrs['id'])
+                if product is None:
+                    self.add_error(number, {'id': ['No such product on your farms.']})
+                    continue
+            else:
+                key = (attrs['farm_id'], attrs['name'])
+                product = by_key.get(key) or to_create.get(key)
+                if product is None:
+                    missing = [name for name in REQUIRED_ON_CREATE[model] if name not in values]
+                    if missing:
+                        self.add_error(number, {name: ['This field is required.'] for name in missing})
+                        continue
+                    to_create[key] = model(**values)
+                    continue
+
+            for name, value in values.items():
+                setattr(product, name, value)
+            if product.pk is not None:
+                # batched updates do not apply auto_now
+                product.updated_at = now
+                to_update[product.pk] = product
+                update_fields.update(values)
+
+        created = model.objects.bulk_create(to_create.values(), batch_size=self.batch_size)
+        if to_update:
+            update_rows(model, to_update.values(), sorted(update_fields | {'updated_at'}))
+        self.created += len(created)
+        self.updated += len(to_update)
+        products_changed.send(sender=model, pks=[product.pk for product in created] + list(to_update))
+
+
+class AdjustmentSerializer(serializers.Serializer):
+    """One stock and/or price change; ``stock_delta``/``stock`` and ``price``/``price_pct`` exclude each other."""
+    type = serializers.ChoiceField(choices=list(PRODUCT_MODELS))
+    id = serializers.IntegerField(min_value=1)
+    stock_delta = serializers.IntegerField(required=False)
+    stock = serializers.IntegerField(required=False, min_value=0)
+    price = serializers.FloatField(required=False, min_value=0)
+    price_pct = serializers.FloatField(required=False, min_value=-100)
+
+    def validate(self, attrs):
+        for first, second in (('stock_delta', 'stock'), ('price', 'price_pct')):
+            if first in attrs and second in attrs:
+                raise serializers.ValidationError(f'Pass either {first} or {second}, not both.')
+        if len(attrs) == 2:
+            raise serializers.ValidationError('Nothing to change.')
+        return attrs
+
+
+def get_update_values(change):
+    """``QuerySet.update`` keyword arguments for an adjustment."""
+    values = {}
+    if 'stock_delta' in change:
+        values['stock'] = F('stock') + change['stock_delta']
+    elif 'stock' in change:
+        values['stock'] = change['stock']
+    if 'price_pct' in change:
+        values['price'] = F('price') * (1 + change['price_pct'] / 100)
+    elif 'price' in change:
+        values['price'] = change['price']
+    return values
+
+
+class StockAdjuster:
+    """
+    Applies stock and price adjustments as set-based updates.
+
+    Operations are grouped by model and identical change, so a harvest that
+    adds the same amount to many products is one UPDATE. Every statement is
+    filtered by the owner of the product's farm, and a negative
+    ``stock_delta`` only applies while enough stock is left.
+    """
+
+    def __init__(self, user, batch_size=500):
+        self.user = user
+        self.batch_size = batch_size
+        self.row_serializer = AdjustmentSerializer()
+        self.errors = []
+        self.failed = 0
+
+    def add_error(self, number, detail):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'errors': detail})
+
+    def group(self, operations):
+        """``{model: {change: [(row, id)]}}`` of the valid operations."""
+        groups = {model: {} for model in PRODUCT_FIELDS}
+        seen = set()
+        for number, operation in enumerate(operations, start=1):
+            try:
+                attrs = self.row_serializer.run_validation(operation)
+            except serializers.ValidationError as exc:
+                self.add_error(number, exc.detail)
+                continue
+            model = PRODUCT_MODELS[attrs.pop('type')]
+            pk = attrs.pop('id')
+            if (model, pk) in seen:
+                self.add_error(number, {'id': ['Only one operation per product.']})
+                continue
+            seen.add((model, pk))
+            groups[model].setdefault(tuple(sorted(attrs.items())), []).append((number, pk))
+        return groups
+
+    def run(self, operations):
+        if not isinstance(operations, list):
+            raise ParseError('Expected a list of operations.')
+        updated = 0
+        with transaction.atomic():
+            for model, changes in self.group(operations).items():
+                changed = []
+                for change, targets in changes.items():
+                    changed += self.apply(model, dict(change), targets)
+                updated += len(changed)
+                if changed:
+                    products_changed.send(sender=model, pks=changed)
+        return {
+            'updated': updated,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+        }
+
+    def apply(self, model, change, targets):
+        """Runs one change on its targets; returns the ids that were updated."""
+        queryset = model.objects.filter(farm__owner=self.user)
+        delta = change.get('stock_delta', 0)
+        if delta < 0:
+            queryset = queryset.filter(stock__gte=-delta)
+        values = dict(get_update_values(change), updated_at=timezone.now())
+
+        changed = []
+        for start in range(0, len(targets), self.batch_size):
+            batch = targets[start:start + self.batch_size]
+            ids = [pk for _, pk in batch]
+            # lock the matching rows so the ids read are the ids updated
+            matched = set(queryset.select_for_update().filter(pk__in=ids).values_list('pk', flat=True))
+            if matched:
+                model.objects.filter(pk__in=matched).update(**values)
+            changed += matched
+            for number, pk in batch:
+                if pk not in matched:
+                    self.add_error(number, {'id': ['Not one of your products, or not enough stock.']})
+        return changed
@@ -0,0 +1,113 @@
+"""
+Versioned response cache for public catalog reads.
+
+Every cached resource has a version counter in the cache, bumped by
+post_save/post_delete signals. A response is stored under a key built from
+the request URL (query parameters included), the negotiated media type and
+the current versions of the resources it depends on, so a write makes the
+old entries unreachable instead of having to find and delete them.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+
+HITS_KEY = 'response-cache:hits'
+MISSES_KEY = 'response-cache:misses'
+
+
+def version_key(resource):
+    return f'response-cache:version:{resource}'
+
+
+def get_versions(resources):
+    keys = [version_key(resource) for resource in resources]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # start from the clock so an evicted counter never reuses an old version
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(resource):
+    try:
+        cache.incr(version_key(resource))
+    except ValueError:
+        cache.set(version_key(resource), time.time_ns(), timeout=None)
+
+
+def get_cache_key(request, resources):
+    url = request.build_absolute_uri(request.path)
+    query = sorted(request.query_params.lists())
+    # the stored ETag is per representation (see ConditionalGetMixin.get_etag)
+    media_type = request.accepted_renderer.media_type
+    versions = get_versions(resources)
+    raw = repr((url, query, media_type, versions)).encode()
+    return 'response-cache:' + hashlib.md5(raw).hexdigest()
+
+
+def increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_stats():
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else None,
+    }
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+class CachedListMixin:
+    """
+    Serves ``list`` from the cache until one of ``cache_resources`` changes.
+
+    Only for responses that are the same for every user; permission checks
+    still run before the cache is consulted. An ETag set by the wrapped view
+    is stored with the data, so a cache hit can still answer with a 304.
+    """
+    cache_resources = ()
+
+    def list(self, request, *args, **kwargs):
+        timeout = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+        if not timeout:
+            return super().list(request, *args, **kwargs)
+
+        key = get_cache_key(request, self.cache_resources)
+        cached = cache.get(key)
+        if cached is not None:
+            increment(HITS_KEY)
+            data, etag = cached
+            if etag is None:
+                response = Response(data)
+            else:
+                not_modified = get_conditional_response(request, etag=etag)
+                if not_modified is not None:
+                    return not_modified
+                response = Response(data, headers={'ETag': etag})
+            # lets api.compression store compressed bodies next to the data
+            response.compression_cache_key = key
+            return response
+
+        increment(MISSES_KEY)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, (response.data, response.get('ETag')), timeout)
+            response.compression_cache_key = key
+        return response
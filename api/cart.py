@@ -0,0 +1,88 @@
+"""
+Cart quotes: current price and stock of every cart line in one request.
+
+Lines are grouped by product type and resolved with one ``IN`` query per
+type (farm names come through a join), so a quote costs at most three
+queries however long the cart is. ``content_type`` is included per line
+from the cached ``ContentType`` map, ready for creating the order.
+"""
+from django.contrib.contenttypes.models import ContentType
+from rest_framework import serializers
+
+from .bulk import PRODUCT_MODELS
+
+MAX_CART_LINES = 200
+
+
+class CartLineSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=list(PRODUCT_MODELS))
+    id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+def merge_lines(lines):
+    """Sums the quantities of lines for the same product, keeping the cart order."""
+    quantities = {}
+    for line in lines:
+        key = (line['type'], line['id'])
+        quantities[key] = quantities.get(key, 0) + line['quantity']
+    return quantities
+
+
+def validate_cart(data):
+    serializer = CartLineSerializer(data=data, many=True, allow_empty=False, max_length=MAX_CART_LINES)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def get_quote(lines):
+    quantities = merge_lines(lines)
+    wanted = {}
+    for product_type, pk in quantities:
+        wanted.setdefault(product_type, set()).add(pk)
+
+    content_types = ContentType.objects.get_for_models(*PRODUCT_MODELS.values())
+    products = {}
+    for product_type, ids in wanted.items():
+        model = PRODUCT_MODELS[product_type]
+        rows = model.objects.filter(pk__in=ids).values('id', 'name', 'price', 'stock', 'farm_id', 'farm__name')
+        for row in rows:
+            products[product_type, row['id']] = row
+
+    farms, missing, total = {}, [], 0
+    for (product_type, pk), quantity in quantities.items():
+        product = products.get((product_type, pk))
+        if product is None:
+            missing.append({'type': product_type, 'id': pk, 'quantity': quantity})
+            continue
+        price = product['price']
+        available = price is not None and product['stock'] >= quantity
+        subtotal = price * quantity if price is not None else None
+        line = {
+            'type': product_type,
+            'id': pk,
+            'content_type': content_types[PRODUCT_MODELS[product_type]].model,
+            'name': product['name'],
+            'quantity': quantity,
+            'price': price,
+            'stock': product['stock'],
+            'available': available,
+            'subtotal': subtotal,
+        }
+        farm = farms.setdefault(product['farm_id'], {
+            'id': product['farm_id'],
+            'name': product['farm__name'],
+            'lines': [],
+            'subtotal': 0,
+        })
+        farm['lines'].append(line)
+        if available:
+            farm['subtotal'] += subtotal
+            total += subtotal
+
+    return {
+        'farms': list(farms.values()),
+        'missing': missing,
+        'available': not missing and all(line['available'] for farm in farms.values() for line in farm['lines']),
+        'total': total,
+    }
@@ -0,0 +1,125 @@
+"""
+gzip/brotli response compression.
+
+Works like Django's ``GZipMiddleware``, adding brotli when the ``brotli``
+package is installed, a size threshold (``COMPRESSION_MIN_SIZE``) and reuse of
+compressed bodies: responses served through ``api.cache.CachedListMixin``
+carry their cache key, and their compressed variants are stored next to the
+cached data, so a hot response is compressed once per version.
+"""
+import gzip
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/msgpack',
+    'application/javascript',
+    'application/xml',
+    'application/x-ndjson',
+    'image/svg+xml',
+}
+
+ACCEPT_ENCODING_RE = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?')
+
+
+def get_accepted_encodings(header):
+    """Encodings the client accepts (q > 0) from an Accept-Encoding header."""
+    accepted = set()
+    for part in header.split(','):
+        match = ACCEPT_ENCODING_RE.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2) or 1)
+        except ValueError:
+            continue
+        if quality > 0:
+            accepted.add(match.group(1).lower())
+    return accepted
+
+
+def choose_encoding(request, streaming=False):
+    accepted = get_accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if brotli is not None and not streaming and ('br' in accepted or '*' in accepted):
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+    # mtime=0 keeps the output deterministic, so cached variants stay valid
+    return gzip.compress(body, compresslevel=getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6), mtime=0)
+
+
+def is_compressible(content_type):
+    media_type = content_type.split(';')[0].strip().lower()
+    return media_type.startswith('text/') or media_type.endswith('+json') or media_type in COMPRESSIBLE_TYPES
+
+
+def get_compressed(response, encoding):
+    """The compressed body, taken from or stored to the response cache when possible."""
+    cache_key = getattr(response, 'compression_cache_key', None)
+    content_type = response.get('Content-Type', '')
+    # the browsable API renders per-user HTML, never share it
+    if cache_key is None or content_type.startswith('text/html'):
+        return compress(response.content, encoding)
+
+    # the accepted media type carries parameters such as indent that change the body
+    media_type = getattr(response, 'accepted_media_type', None) or content_type
+    variant_key = f'{cache_key}:{encoding}:{media_type}'
+    body = cache.get(variant_key)
+    if body is None:
+        body = compress(response.content, encoding)
+        cache.set(variant_key, body, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+    return body
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or not is_compressible(response.get('Content-Type', '')):
+            return response
+        # a byte range of the uncompressed body, or a body the web server sends (api.media)
+        if response.status_code == 206 or response.has_header('X-Accel-Redirect') or response.has_header('X-Sendfile'):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        if response.streaming:
+            if getattr(response, 'is_async', False):
+                return response
+            encoding = choose_encoding(request, streaming=True)
+            if encoding is None:
+                return response
+            response.streaming_content = compress_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+                return response
+            encoding = choose_encoding(request)
+            if encoding is None:
+                return response
+            body = get_compressed(response, encoding)
+            if len(body) >= len(response.content):
+                return response
+            response.content = body
+            response.headers['Content-Length'] = str(len(body))
+
+        # the representation changed, so a strong validator no longer holds
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,105 @@
+"""
+Conditional GET support (ETag / Last-Modified) for read views.
+
+The validators are computed before anything is serialized: lists from the
+version counters of the resources they show (see ``api.cache``), objects
+from their ``updated_at`` columns. A matching ``If-None-Match`` or
+``If-Modified-Since`` gets a 304 without touching the rows themselves.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .cache import get_versions
+
+
+class ConditionalGetMixin:
+    """
+    Adds strong ETags to ``list`` and ETag plus Last-Modified to ``retrieve``.
+
+    ``conditional_related`` lists relations whose ``updated_at`` also shows in
+    the representation (a crop renders its farm and category). List responses
+    get no Last-Modified: deleting a row does not move ``MAX(updated_at)``, so
+    only the ETag can validate them.
+
+    A list ETag is built from the versions of ``conditional_resources``
+    (``cache_resources`` by default), which every write to those resources
+    bumps, so it costs no query over the list. Lists without resources fall
+    back to a row count and ``MAX(updated_at)`` aggregate.
+    """
+    conditional_related = ()
+    conditional_resources = None
+
+    def get_conditional_resources(self):
+        if self.conditional_resources is not None:
+            return self.conditional_resources
+        return getattr(self, 'cache_resources', ())
+
+    def get_conditional_sources(self):
+        """Extra querysets whose row count and latest update affect the response."""
+        return []
+
+    def get_etag(self, state):
+        request = self.request
+        seed = repr((
+            request.build_absolute_uri(request.path),
+            sorted(request.query_params.lists()),
+            request.accepted_renderer.media_type,
+            state,
+        ))
+        return quote_etag(hashlib.md5(seed.encode()).hexdigest())
+
+    def get_source_state(self, queryset, related=()):
+        """Row count and latest ``updated_at`` of a queryset and its relations, in one query."""
+        aggregates = {'count': Count('pk'), 'updated': Max('updated_at')}
+        for relation in related:
+            aggregates[relation] = Max(f'{relation}__updated_at')
+        return sorted(queryset.order_by().aggregate(**aggregates).items())
+
+    def get_list_state(self):
+        resources = self.get_conditional_resources()
+        if resources:
+            return get_versions(resources)
+        queryset = self.filter_queryset(self.get_queryset())
+        state = [self.get_source_state(queryset, self.conditional_related)]
+        return state + [self.get_source_state(source) for source in self.get_conditional_sources()]
+
+    def list(self, request, *args, **kwargs):
+        etag = self.get_etag(self.get_list_state())
+
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        timestamps = [instance.updated_at]
+        for relation in self.conditional_related:
+            # a relation that was not loaded is not rendered either (see api.sparse)
+            if not instance._meta.get_field(relation).is_cached(instance):
+                continue
+            related = getattr(instance, relation)
+            if related is not None:
+                timestamps.append(related.updated_at)
+        sources = [self.get_source_state(source) for source in self.get_conditional_sources()]
+        etag = self.get_etag([timestamps, sources])
+        # like lists, responses that depend on other tables only get an ETag;
+        # HTTP dates have whole-second precision
+        last_modified = None if sources else int(max(timestamps).timestamp())
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+        serializer = self.get_serializer(instance)
+        response = Response(serializer.data)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -0,0 +1,136 @@
+"""
+Streaming NDJSON/CSV exports of whole tables for accounting and BI jobs.
+
+Rows are read from ``values()`` with ``QuerySet.iterator(chunk_size=...)``
+and encoded one chunk at a time, so memory stays flat however large the
+table is. Apps register datasets with ``register``; ``ExportView`` and the
+``export`` management command serve every registered dataset.
+"""
+import csv
+import io
+from itertools import islice
+
+import orjson
+
+from .models import Farm, ProductIndex
+
+EXPORTS = {}
+CHUNK_SIZE = 2000
+
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Export:
+    """
+    A dataset of flat rows. ``columns`` maps output names to ``values()``
+    lookups; ``process_chunk`` may add columns that need another query,
+    once per chunk rather than once per row.
+    """
+    columns = {}
+    extra_fields = ()
+    ordering = ('pk',)
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
+    @property
+    def fields(self):
+        return [*self.columns, *self.extra_fields]
+
+    def get_queryset(self, user):
+        """Rows ``user`` may export; ``user`` is None for the management command."""
+        raise NotImplementedError('Export subclasses must implement get_queryset()')
+
+    def process_chunk(self, rows):
+        return rows
+
+    def iter_chunks(self, user=None):
+        # values() cannot alias a lookup to a field name such as ``id``, so rename here
+        names = list(self.columns)
+        rows = (
+            self.get_queryset(user)
+            .order_by(*self.ordering)
+            .values_list(*self.columns.values())
+            .iterator(chunk_size=self.chunk_size)
+        )
+        for chunk in iter_chunks(rows, self.chunk_size):
+            yield self.process_chunk([dict(zip(names, row)) for row in chunk])
+
+
+def register(name, export_class):
+    EXPORTS[name] = export_class
+
+
+def stream_ndjson(export, user=None):
+    for chunk in export.iter_chunks(user):
+        yield b''.join(orjson.dumps(row) + b'\n' for row in chunk)
+
+
+def to_csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        # same format as the JSON output
+        return value.isoformat()
+    return value
+
+
+def stream_csv(export, user=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    fields = export.fields
+    writer.writerow(fields)
+    for chunk in export.iter_chunks(user):
+        writer.writerows([to_csv_value(row[name]) for name in fields] for row in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # a header-only export still has to be sent
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+FORMATS = {
+    'ndjson': (stream_ndjson, 'application/x-ndjson'),
+    'csv': (stream_csv, 'text/csv; charset=utf-8'),
+}
+
+
+class ProductExport(Export):
+    columns = {
+        'type': 'product_type',
+        'id': 'product_id',
+        'name': 'name',
+        'farm_id': 'farm_id',
+        'category_id': 'category_id',
+        'price': 'price',
+        'stock': 'stock',
+        'is_new': 'is_new',
+        'producer': 'producer',
+        'updated_at': 'updated_at',
+    }
+
+    def get_queryset(self, user):
+        return ProductIndex.objects.all()
+
+
+class FarmExport(Export):
+    columns = {
+        'id': 'id',
+        'name': 'name',
+        'description': 'description',
+        'address': 'address',
+        'owner_id': 'owner_id',
+        'updated_at': 'updated_at',
+    }
+
+    def get_queryset(self, user):
+        return Farm.objects.all()
+
+
+register('products', ProductExport)
+register('farms', FarmExport)
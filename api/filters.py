@@ -0,0 +1,119 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import BooleanField, Case, CharField, Count, Q, Value, When
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+TRUE_VALUES = {'1', 'true', 'yes'}
+FALSE_VALUES = {'0', 'false', 'no'}
+
+# upper bounds of the price facet buckets, the last bucket is open-ended
+PRICE_BUCKETS = (10, 50, 100, 500, 1000, 5000)
+
+
+def has_field(model, name):
+    try:
+        model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+def parse_ids(params, name):
+    try:
+        return [int(value) for value in params[name].split(',') if value]
+    except ValueError:
+        raise ValidationError({name: 'A comma-separated list of ids is required.'})
+
+
+def parse_number(params, name):
+    try:
+        return float(params[name])
+    except ValueError:
+        raise ValidationError({name: 'A valid number is required.'})
+
+
+def parse_bool(params, name):
+    value = params[name].lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValidationError({name: 'Must be true or false.'})
+
+
+class CatalogFilterBackend(BaseFilterBackend):
+    """
+    Filters product lists by ``category``, ``farm``, ``price_min``,
+    ``price_max``, ``in_stock``, ``is_new`` and ``producer``.
+
+    Parameters for columns the listed model does not have are ignored.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        model = queryset.model
+        conditions = Q()
+        if 'category' in params and has_field(model, 'category'):
+            conditions &= Q(category_id__in=parse_ids(params, 'category'))
+        if 'farm' in params:
+            conditions &= Q(farm_id__in=parse_ids(params, 'farm'))
+        if 'price_min' in params:
+            conditions &= Q(price__gte=parse_number(params, 'price_min'))
+        if 'price_max' in params:
+            conditions &= Q(price__lte=parse_number(params, 'price_max'))
+        if 'in_stock' in params:
+            in_stock = Q(stock__gt=0)
+            conditions &= in_stock if parse_bool(params, 'in_stock') else ~in_stock
+        if 'is_new' in params and has_field(model, 'is_new'):
+            conditions &= Q(is_new=parse_bool(params, 'is_new'))
+        if params.get('producer') and has_field(model, 'producer'):
+            conditions &= Q(producer__iexact=params['producer'])
+        return queryset.filter(conditions)
+
+
+def get_price_bucket():
+    buckets = [When(price__isnull=True, then=Value('none'))]
+    lower = 0
+    for upper in PRICE_BUCKETS:
+        buckets.append(When(price__lt=upper, then=Value(f'{lower}-{upper}')))
+        lower = upper
+    return Case(*buckets, default=Value(f'{lower}+'), output_field=CharField())
+
+
+def get_facets(queryset):
+    """
+    Counts the filtered products per category, farm, stock state and price
+    bucket with a single GROUP BY over all four dimensions.
+    """
+    model = queryset.model
+    columns = ['farm_id']
+    if has_field(model, 'category'):
+        columns.append('category_id')
+    rows = (
+        queryset.order_by()
+        .values(
+            *columns,
+            stocked=Case(When(stock__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField()),
+            price_bucket=get_price_bucket(),
+        )
+        .annotate(count=Count('pk'))
+    )
+
+    categories, farms, prices = {}, {}, {}
+    stock = {'in_stock': 0, 'out_of_stock': 0}
+    for row in rows:
+        count = row['count']
+        farms[row['farm_id']] = farms.get(row['farm_id'], 0) + count
+        if row.get('category_id') is not None:
+            categories[row['category_id']] = categories.get(row['category_id'], 0) + count
+        stock['in_stock' if row['stocked'] else 'out_of_stock'] += count
+        prices[row['price_bucket']] = prices.get(row['price_bucket'], 0) + count
+
+    bucket_order = [f'{lower}-{upper}' for lower, upper in zip((0,) + PRICE_BUCKETS, PRICE_BUCKETS)]
+    bucket_order += [f'{PRICE_BUCKETS[-1]}+', 'none']
+    return {
+        'category': [{'id': pk, 'count': count} for pk, count in sorted(categories.items())],
+        'farm': [{'id': pk, 'count': count} for pk, count in sorted(farms.items())],
+        'stock': stock,
+        'price': [{'bucket': bucket, 'count': prices[bucket]} for bucket in bucket_order if bucket in prices],
+    }
@@ -0,0 +1,187 @@
+"""
+Resized WebP and JPEG derivatives of uploaded images.
+
+Every tracked image gets one file per width in ``IMAGE_DERIVATIVE_WIDTHS``
+and format, stored under ``derivatives/`` with a name derived from the
+original, so serializers can build the URLs without touching storage or the
+database. Derivatives are rendered after the upload commits, on a worker
+thread unless ``IMAGE_DERIVATIVES_ASYNC`` is off, and are re-rendered when
+the image is replaced. ``generate_image_derivatives`` backfills existing
+uploads.
+"""
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_ROOT = 'derivatives'
+DEFAULT_WIDTHS = (160, 320, 640, 1280)
+# format -> (Pillow format, save options)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# model -> image field name, filled by ``track``
+TRACKED_FIELDS = {}
+
+_executor = None
+
+
+def get_widths():
+    return tuple(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', DEFAULT_WIDTHS))
+
+
+def get_prefix(name):
+    """Common start of the derivative names of ``name``; the width and extension follow."""
+    root, _ = posixpath.splitext(name)
+    return f'{DERIVATIVES_ROOT}/{root}_'
+
+
+def get_derivative_names(name):
+    prefix = get_prefix(name)
+    return [(fmt, width, f'{prefix}{width}w.{fmt}') for fmt in FORMATS for width in get_widths()]
+
+
+def get_derivative_urls(name, build_url=None):
+    """``{format: {'<width>w': url}}`` for the image stored as ``name``."""
+    if not name:
+        return None
+    # one storage call per image, the rest only differs in the suffix
+    prefix = default_storage.url(get_prefix(name))
+    if build_url is not None:
+        prefix = build_url(prefix)
+    widths = get_widths()
+    return {fmt: {f'{width}w': f'{prefix}{width}w.{fmt}' for width in widths} for fmt in FORMATS}
+
+
+def render(image, width, fmt):
+    image = image.copy()
+    # thumbnail() never upscales, small originals keep their size
+    image.thumbnail((width, width * 10), Image.Resampling.LANCZOS)
+    pil_format, options = FORMATS[fmt]
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+    buffer = io.BytesIO()
+    # no exif= argument, so EXIF (GPS position, camera serial) is not copied
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def generate_derivatives(name, storage=None):
+    """Renders every derivative of ``name``, replacing existing ones. Returns how many were written."""
+    storage = storage or default_storage
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image.load()
+    # apply the EXIF orientation before the metadata is dropped
+    image = ImageOps.exif_transpose(image)
+    written = 0
+    for fmt, width, path in get_derivative_names(name):
+        data = render(image, width, fmt)
+        storage.delete(path)
+        storage.save(path, ContentFile(data))
+        written += 1
+    return written
+
+
+def has_derivatives(name, storage=None):
+    storage = storage or default_storage
+    return all(storage.exists(path) for _, _, path in get_derivative_names(name))
+
+
+def delete_derivatives(name, storage=None):
+    storage = storage or default_storage
+    for _, _, path in get_derivative_names(name):
+        storage.delete(path)
+
+
+def run_safely(func, name):
+    try:
+        func(name)
+    except Exception:
+        logger.exception('Image derivatives for %s failed', name)
+
+
+def submit(func, name):
+    global _executor
+    if not getattr(settings, 'IMAGE_DERIVATIVES_ASYNC', True):
+        run_safely(func, name)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-derivatives')
+    _executor.submit(run_safely, func, name)
+
+
+def schedule(func, name):
+    """Runs ``func(name)`` off the request path once the current transaction commits."""
+    transaction.on_commit(lambda: submit(func, name))
+
+
+class ImageDerivativesField(serializers.ReadOnlyField):
+    """Derivative URLs of an image field (or a stored image name), e.g. for ``srcset``."""
+
+    def __init__(self, source='image', **kwargs):
+        super().__init__(source=source, **kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        return get_derivative_urls(getattr(value, 'name', value), request.build_absolute_uri if request else None)
+
+
+def remember_replaced_image(sender, instance, raw=False, update_fields=None, **kwargs):
+    field = TRACKED_FIELDS[sender]
+    file = getattr(instance, field)
+    # FieldFile._committed is False only for a freshly assigned upload
+    instance._new_image = bool(file) and not file._committed and not raw
+    instance._replaced_image = None
+    if instance._new_image and instance.pk is not None:
+        instance._replaced_image = (
+            sender._base_manager.filter(pk=instance.pk).values_list(field, flat=True).first()
+        )
+
+
+def image_replaced(old_name, new_name):
+    """Renders the derivatives of ``new_name`` and drops those of ``old_name``, after commit."""
+    if old_name and old_name != new_name:
+        schedule(delete_derivatives, old_name)
+    schedule(generate_derivatives, new_name)
+
+
+def render_new_image(sender, instance, **kwargs):
+    if not getattr(instance, '_new_image', False):
+        return
+    image_replaced(instance._replaced_image, getattr(instance, TRACKED_FIELDS[sender]).name)
+    instance._new_image = False
+
+
+def drop_deleted_image(sender, instance, **kwargs):
+    name = getattr(instance, TRACKED_FIELDS[sender]).name
+    if name:
+        schedule(delete_derivatives, name)
+
+
+def track(model, field='image'):
+    """Keeps derivatives of ``model.<field>`` up to date."""
+    TRACKED_FIELDS[model] = field
+    pre_save.connect(remember_replaced_image, sender=model, dispatch_uid=f'images-pre-{model._meta.label}')
+    post_save.connect(render_new_image, sender=model, dispatch_uid=f'images-post-{model._meta.label}')
+    post_delete.connect(drop_deleted_image, sender=model, dispatch_uid=f'images-delete-{model._meta.label}')
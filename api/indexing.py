@@ -0,0 +1,157 @@
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+
+from .models import Crop, Item, Machinery, ProductIndex
+
+PRODUCT_TYPES = {
+    Crop: ProductIndex.ProductType.CROP,
+    Item: ProductIndex.ProductType.ITEM,
+    Machinery: ProductIndex.ProductType.MACHINERY,
+}
+
+INDEXED_FIELDS = ('name', 'farm_id', 'category_id', 'price', 'stock', 'image', 'is_new', 'producer')
+
+# columns copied from models that only some product types have
+OPTIONAL_FIELDS = {
+    Crop: ('category_id',),
+    Item: ('is_new',),
+    Machinery: ('is_new', 'producer'),
+}
+
+
+def get_index_values(product):
+    """Returns the ProductIndex column values for a product instance."""
+    return {
+        'name': product.name,
+        'farm_id': product.farm_id,
+        'category_id': getattr(product, 'category_id', None),
+        'price': product.price,
+        'stock': product.stock,
+        'image': product.image.name or '',
+        'is_new': getattr(product, 'is_new', None),
+        'producer': getattr(product, 'producer', None),
+    }
+
+
+def index_product(product):
+    ProductIndex.objects.update_or_create(
+        product_type=PRODUCT_TYPES[type(product)],
+        product_id=product.pk,
+        defaults=get_index_values(product),
+    )
+
+
+def unindex_product(product):
+    ProductIndex.objects.filter(
+        product_type=PRODUCT_TYPES[type(product)],
+        product_id=product.pk,
+    ).delete()
+
+
+def get_index_entries(model, queryset):
+    """Yields unsaved ProductIndex rows for the products of ``queryset``."""
+    product_type = PRODUCT_TYPES[model]
+    columns = ['id', 'name', 'farm_id', 'price', 'stock', 'image', *OPTIONAL_FIELDS[model]]
+    for row in queryset.order_by().values(*columns).iterator(chunk_size=2000):
+        yield ProductIndex(
+            product_type=product_type,
+            product_id=row.pop('id'),
+            image=row.pop('image') or '',
+            **row,
+        )
+
+
+def build_index_entries():
+    """Yields unsaved ProductIndex rows for every product in the catalog."""
+    for model in PRODUCT_TYPES:
+        yield from get_index_entries(model, model.objects.all())
+
+
+@transaction.atomic
+def index_products(model, pks):
+    """
+    Re-indexes many products of one model with a bulk upsert. Rows keep
+    their ids, which break ties in the catalog's cursor ordering, so a
+    client paging through ``/api/all/`` during a checkout sees no row twice.
+    """
+    product_type = PRODUCT_TYPES[model]
+    entries = list(get_index_entries(model, model.objects.filter(pk__in=pks)))
+    ProductIndex.objects.bulk_create(
+        entries,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['product_type', 'product_id'],
+        update_fields=list(INDEXED_FIELDS),
+    )
+    # products that no longer exist
+    found = [entry.product_id for entry in entries]
+    ProductIndex.objects.filter(product_type=product_type, product_id__in=pks).exclude(product_id__in=found).delete()
+
+
+@transaction.atomic
+def rebuild_product_index(batch_size=1000):
+    """Replaces the whole index with rows built from the product tables."""
+    ProductIndex.objects.all().delete()
+    batch = []
+    total = 0
+    for entry in build_index_entries():
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            ProductIndex.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    ProductIndex.objects.bulk_create(batch)
+    return total + len(batch)
+
+
+def find_index_drift():
+    """
+    Compares the index with the product tables.
+
+    Returns a dict with the ``missing``, ``stale`` and ``orphaned`` keys,
+    each a list of ``(product_type, product_id)`` pairs.
+    """
+    expected = {
+        (entry.product_type, entry.product_id): tuple(getattr(entry, f) for f in INDEXED_FIELDS)
+        for entry in build_index_entries()
+    }
+    actual = {
+        (row[0], row[1]): tuple(row[2:])
+        for row in ProductIndex.objects.order_by().values_list('product_type', 'product_id', *INDEXED_FIELDS)
+    }
+    return {
+        'missing': sorted(key for key in expected if key not in actual),
+        'stale': sorted(key for key, values in expected.items() if key in actual and actual[key] != values),
+        'orphaned': sorted(key for key in actual if key not in expected),
+    }
+
+
+def summarize_farm_products(farm_ids):
+    """
+    Returns per-farm product stats from one grouped ProductIndex query.
+
+    The result maps every farm id to ``{product_type: {count, in_stock,
+    min_price, max_price}}`` with zeroed entries for types the farm lacks.
+    """
+    summaries = {
+        farm_id: {
+            product_type: {'count': 0, 'in_stock': 0, 'min_price': None, 'max_price': None}
+            for product_type in ProductIndex.ProductType.values
+        }
+        for farm_id in farm_ids
+    }
+    rows = (
+        ProductIndex.objects.filter(farm_id__in=farm_ids)
+        .order_by()
+        .values('farm_id', 'product_type')
+        .annotate(
+            count=Count('id'),
+            in_stock=Count('id', filter=Q(stock__gt=0)),
+            min_price=Min('price'),
+            max_price=Max('price'),
+        )
+    )
+    for row in rows:
+        farm_id = row.pop('farm_id')
+        summaries[farm_id][row.pop('product_type')] = row
+    return summaries
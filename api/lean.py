@@ -0,0 +1,202 @@
+"""
+Read-only serializers that build list output straight from ``values()`` rows.
+
+They produce the same JSON as the matching ``ModelSerializer`` but never
+create model instances or bound fields, which is where most of the time of
+a large catalog page goes. Writes and detail views keep the DRF serializers.
+
+Output fields are declared once; each request compiles them into a column
+list and one getter per field, which is also how ``?fields=`` and
+``?expand=`` (see ``api.sparse``) drop columns and joins from the query.
+"""
+from operator import itemgetter
+
+from django.core.files.storage import default_storage
+from rest_framework.response import Response
+
+from .images import get_derivative_urls
+from .sparse import get_expanded, parse_list
+
+
+class Column:
+    def __init__(self, column):
+        self.columns = (column,)
+
+    def get_getter(self, serializer):
+        return itemgetter(self.columns[0])
+
+
+class Image(Column):
+    def get_getter(self, serializer):
+        column = self.columns[0]
+        return lambda row: serializer.get_image_url(row[column])
+
+
+class ImageDerivatives(Column):
+    def get_getter(self, serializer):
+        column = self.columns[0]
+        return lambda row: get_derivative_urls(row[column], serializer.absolute_url)
+
+
+class InStock(Column):
+    def __init__(self):
+        super().__init__('stock')
+
+    def get_getter(self, serializer):
+        return lambda row: row['stock'] > 0
+
+
+class Nested:
+    """A related object rendered from ``columns`` (key -> column), or just its id when collapsed."""
+
+    def __init__(self, columns, collapsed):
+        self.nested = columns
+        self.collapsed = collapsed
+        self.columns = tuple(columns.values())
+
+    def get_getter(self, serializer):
+        items = tuple(self.nested.items())
+        return lambda row: {key: row[column] for key, column in items}
+
+
+class ValuesSerializer:
+    """Selects only the columns of the requested fields and turns each row into a dict."""
+    fields = {}
+    pk_field = 'id'
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        request = self.context.get('request')
+        self.request = request
+        # absolute URLs only differ in the path, so build the origin once
+        self.origin = request.build_absolute_uri('/')[:-1] if request else ''
+        self.getters, self.columns = self.compile()
+
+    def compile(self):
+        requested = parse_list(self.request, 'fields')
+        nested = [name for name, field in self.fields.items() if isinstance(field, Nested)]
+        expanded = get_expanded(self.request, nested)
+        getters, columns = [], []
+        for name, field in self.fields.items():
+            if requested is not None and name not in requested and name != self.pk_field:
+                continue
+            if isinstance(field, Nested) and name not in expanded:
+                field = Column(field.collapsed)
+            getters.append((name, field.get_getter(self)))
+            columns.extend(field.columns)
+        return getters, columns
+
+    def select(self, queryset):
+        # ordering columns are needed for cursor positions even when not rendered
+        ordering = [
+            name.lstrip('-') if isinstance(name, str) else name.expression.name  # OrderBy(F(...))
+            for name in queryset.query.order_by
+        ]
+        return queryset.values(*dict.fromkeys(self.columns + ordering))
+
+    def get_image_url(self, name):
+        if not name:
+            return None
+        return self.absolute_url(default_storage.url(name))
+
+    def absolute_url(self, url):
+        if url.startswith('/'):
+            return self.origin + url
+        return self.request.build_absolute_uri(url) if self.request else url
+
+    def to_representation(self, row):
+        return {name: get(row) for name, get in self.getters}
+
+    def serialize(self, rows):
+        getters = self.getters
+        return [{name: get(row) for name, get in getters} for row in rows]
+
+
+FARM = Nested(
+    {'id': 'farm_id', 'name': 'farm__name', 'description': 'farm__description', 'address': 'farm__address'},
+    collapsed='farm_id',
+)
+
+
+class CropValuesSerializer(ValuesSerializer):
+    """Same output as ``CropSerializer``."""
+    fields = {
+        'id': Column('id'),
+        'name': Column('name'),
+        'description': Column('description'),
+        'image': Image('image'),
+        'images': ImageDerivatives('image'),
+        'category': Nested({'id': 'category_id', 'name': 'category__name'}, collapsed='category_id'),
+        'farm': FARM,
+        'stock': Column('stock'),
+        'predicted_yield': Column('predicted_yield'),
+        'price': Column('price'),
+        'in_stock': InStock(),
+    }
+
+
+class ItemValuesSerializer(ValuesSerializer):
+    """Same output as ``ItemSerializer``."""
+    fields = {
+        'id': Column('id'),
+        'name': Column('name'),
+        'description': Column('description'),
+        'image': Image('image'),
+        'images': ImageDerivatives('image'),
+        'farm': FARM,
+        'stock': Column('stock'),
+        'price': Column('price'),
+        'is_new': Column('is_new'),
+        'in_stock': InStock(),
+    }
+
+
+class MachineryValuesSerializer(ValuesSerializer):
+    """Same output as ``MachinerySerializer``."""
+    fields = {
+        'id': Column('id'),
+        'name': Column('name'),
+        'producer': Column('producer'),
+        'description': Column('description'),
+        'image': Image('image'),
+        'images': ImageDerivatives('image'),
+        'farm': FARM,
+        'stock': Column('stock'),
+        'price': Column('price'),
+        'is_new': Column('is_new'),
+        'in_stock': InStock(),
+    }
+
+
+class ProductIndexValuesSerializer(ValuesSerializer):
+    """Same output as ``ProductIndexSerializer``."""
+    fields = {
+        'id': Column('product_id'),
+        'type': Column('product_type'),
+        'name': Column('name'),
+        'image': Image('image'),
+        'images': ImageDerivatives('image'),
+        'farm_id': Column('farm_id'),
+        'category_id': Column('category_id'),
+        'stock': Column('stock'),
+        'price': Column('price'),
+        'in_stock': InStock(),
+        'is_new': Column('is_new'),
+        'producer': Column('producer'),
+    }
+
+
+class ValuesListMixin:
+    """Serves ``list`` through ``values_serializer_class`` instead of model instances."""
+    values_serializer_class = None
+
+    def get_values_serializer(self):
+        return self.values_serializer_class(self.get_serializer_context())
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_values_serializer()
+        rows = serializer.select(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(rows))
@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api import compression
+from api.benchmarking import best_of, rolled_back, seed_catalog
+from api.views import AllProductsView, FarmListView
+from map.models import Location
+from map.views import LocationListAPIView
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Reports bytes saved and CPU time of gzip and brotli on /api/all/, /api/farms/ '
+        'and /locations/ over a seeded catalog, and the cost of serving a cached '
+        'compressed variant instead. Test rows are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=3000)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            farms = seed_catalog(
+                crops=options['products'] // 3, items=options['products'] // 3, machinery=options['products'] // 3,
+            )
+            Location.objects.bulk_create(
+                Location(farm=farm, lat=40.4 + i / 1000, lon=49.8 + i / 1000) for i, farm in enumerate(farms)
+            )
+            user = User.objects.get(email='benchmark@example.com')
+            endpoints = (
+                ('/api/all/', AllProductsView),
+                ('/api/farms/', FarmListView),
+                ('/locations/', LocationListAPIView),
+            )
+            for path, view in endpoints:
+                body = self.render(view, path, user, options['page_size'])
+                self.report(path, body, options['repeat'])
+
+    def render(self, view, path, user, page_size):
+        request = APIRequestFactory().get(path, {'page_size': page_size}, HTTP_ACCEPT='application/json')
+        force_authenticate(request, user)
+        response = view.as_view()(request)
+        response.render()
+        return response.content
+
+    def report(self, path, body, repeat):
+        self.stdout.write(f'{path} ({len(body):,} bytes)')
+        encodings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+        for encoding in encodings:
+            compressed = compression.compress(body, encoding)
+            seconds = best_of(repeat, lambda: compression.compress(body, encoding))
+            saved = 1 - len(compressed) / len(body)
+            self.stdout.write(
+                f'  {encoding:<5} {len(compressed):>9,} bytes  {saved:6.1%} saved  {seconds * 1000:7.2f} ms'
+            )
+            cache.set('benchmark-compression', compressed)
+            cached = best_of(repeat, lambda: cache.get('benchmark-compression'))
+            self.stdout.write(f'        cached variant {cached * 1000:7.3f} ms')
+        cache.delete('benchmark-compression')
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.benchmarking import best_of, rolled_back, seed_catalog
+from api.lean import CropValuesSerializer
+from api.models import Crop
+from api.renderers import ORJSONRenderer
+from api.serializers import CropSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures rows per second of the crop list read path: ModelSerializer and '
+        'json against values() serializers and orjson. Test rows are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            seed_catalog(crops=options['rows'])
+            self.run(options['rows'], options['repeat'])
+
+    def run(self, rows, repeat):
+        context = {'request': Request(APIRequestFactory().get('/api/crops/'))}
+        queryset = Crop.objects.filter(category__name='Benchmark').order_by('name', 'id')
+
+        def model_serializer():
+            return CropSerializer(queryset.select_related('farm', 'category'), many=True, context=context).data
+
+        def values_serializer():
+            lean = CropValuesSerializer(context)
+            return lean.serialize(lean.select(queryset))
+
+        cases = (
+            ('ModelSerializer + json', model_serializer, JSONRenderer()),
+            ('ModelSerializer + orjson', model_serializer, ORJSONRenderer()),
+            ('values() + json', values_serializer, JSONRenderer()),
+            ('values() + orjson', values_serializer, ORJSONRenderer()),
+        )
+        for label, serialize, renderer in cases:
+            seconds = best_of(repeat, lambda: renderer.render(serialize()))
+            self.stdout.write(f'{label:<26} {rows / seconds:>12,.0f} rows/s')
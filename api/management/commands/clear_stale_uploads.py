@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import UploadSession
+from api.uploads import abort_upload
+
+
+class Command(BaseCommand):
+    help = 'Deletes resumable upload sessions, and their part files, that have not received a chunk for a while.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=getattr(settings, 'UPLOAD_SESSION_TTL_HOURS', 24),
+            help='Age of the last chunk after which a session is dropped.',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        cleared = 0
+        for session in UploadSession.objects.filter(updated_at__lt=cutoff).iterator():
+            abort_upload(session)
+            cleared += 1
+        self.stdout.write(self.style.SUCCESS(f'Cleared {cleared} stale upload sessions.'))
@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.exports import CHUNK_SIZE, EXPORTS, FORMATS
+
+
+class Command(BaseCommand):
+    help = 'Streams a whole dataset (products, farms, orders) as NDJSON or CSV to a file or stdout.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+        parser.add_argument('--output', help='File to write to; stdout when omitted.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['dataset'] not in EXPORTS:
+            raise CommandError(f"Unknown dataset, choose one of: {', '.join(sorted(EXPORTS))}.")
+        export = EXPORTS[options['dataset']](chunk_size=options['chunk_size'])
+        stream, _ = FORMATS[options['format']]
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for part in stream(export):
+                output.write(part)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
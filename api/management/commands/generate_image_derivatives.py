@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from api import images
+
+
+class Command(BaseCommand):
+    help = (
+        'Renders the WebP/JPEG derivatives of every tracked image field (farm, crop, item, '
+        'machinery and profile images) that does not have them yet.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-render derivatives that already exist.')
+
+    def handle(self, *args, **options):
+        rendered = skipped = failed = 0
+        for model, field in images.TRACKED_FIELDS.items():
+            names = (
+                model._base_manager.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                .values_list(field, flat=True).distinct().iterator()
+            )
+            for name in names:
+                if not options['force'] and images.has_derivatives(name):
+                    skipped += 1
+                    continue
+                try:
+                    images.generate_derivatives(name)
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{model._meta.label} {name}: {error}')
+                    continue
+                rendered += 1
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} images, skipped {skipped}, failed {failed}.'))
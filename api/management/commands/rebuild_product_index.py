@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.indexing import find_index_drift, rebuild_product_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the ProductIndex read model from the crop, item and machinery tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report drift between the index and the product tables, do not rebuild.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            total = rebuild_product_index(batch_size=options['batch_size'])
+            self.stdout.write(f'Indexed {total} products.')
+
+        drift = find_index_drift()
+        for kind, keys in drift.items():
+            for product_type, product_id in keys:
+                self.stdout.write(f'{kind}: {product_type} #{product_id}')
+
+        drifted = sum(len(keys) for keys in drift.values())
+        if drifted:
+            raise CommandError(
+                f"Index drift: {len(drift['missing'])} missing, "
+                f"{len(drift['stale'])} stale, {len(drift['orphaned'])} orphaned."
+            )
+        self.stdout.write(self.style.SUCCESS('Product index is in sync.'))
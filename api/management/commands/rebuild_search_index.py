@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.search import fts_enabled, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the FTS5 search index from the product and farm tables.'
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            self.stdout.write('Full-text index is not available on this database, search uses icontains.')
+            return
+        total = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} documents.'))
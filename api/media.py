@@ -0,0 +1,135 @@
+"""
+Serving ``MEDIA_ROOT`` without streaming bytes through Python workers.
+
+The view only resolves the path and sets the headers; with
+``MEDIA_SENDFILE_BACKEND`` set, the web server sends the file itself through
+``X-Accel-Redirect`` (nginx) or ``X-Sendfile`` (Apache, lighttpd) and also
+answers Range requests. Without a backend, meant for development, the file
+is streamed from Python with single-range support.
+
+Uploads are stored under content-hashed names (see ``api.storage``), so
+those URLs never change content and are cached as immutable.
+"""
+import mimetypes
+import re
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+# the 12-digit hash api.storage puts in front of the extension; derivatives keep it
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}(?:[._]|$)')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+CHUNK_SIZE = 64 * 1024
+
+
+def get_cache_control(path):
+    if HASHED_NAME_RE.search(path):
+        return IMMUTABLE
+    return f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)}"
+
+
+def parse_range(header, size):
+    """
+    ``(start, end)`` (inclusive) of a single byte range, or None to send the
+    whole file. Raises ValueError when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        # multiple or malformed ranges: a 200 with the full file is allowed
+        return None
+    start, end = match.groups()
+    if start == '':
+        # bytes=-N: the last N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError('Empty suffix range')
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def iter_file(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def offload(path, relative_path, content_type):
+    backend = getattr(settings, 'MEDIA_SENDFILE_BACKEND', None)
+    response = HttpResponse(content_type=content_type)
+    if backend == 'nginx':
+        prefix = getattr(settings, 'MEDIA_SENDFILE_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix + quote(relative_path)
+    elif backend == 'xsendfile':
+        response['X-Sendfile'] = str(path)
+    else:
+        raise ValueError(f'Unknown MEDIA_SENDFILE_BACKEND: {backend!r}')
+    return response
+
+
+def serve_from_python(request, path, content_type, size, last_modified):
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    # a range is only valid for the version of the file the client already has
+    if range_header and if_range and parse_http_date_safe(if_range) != last_modified:
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, size) if range_header else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(iter_file(path, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve_media(request, path):
+    # dot directories hold unfinished uploads (api.uploads)
+    if any(part.startswith('.') for part in path.split('/')):
+        raise Http404('Media file not found.')
+    try:
+        full_path = Path(safe_join(settings.MEDIA_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404('Media file not found.')
+    if not full_path.is_file():
+        raise Http404('Media file not found.')
+
+    stat = full_path.stat()
+    last_modified = int(stat.st_mtime)
+    content_type, encoding = mimetypes.guess_type(full_path.name)
+    content_type = content_type or 'application/octet-stream'
+
+    response = get_conditional_response(request, last_modified=last_modified)
+    if response is None:
+        if getattr(settings, 'MEDIA_SENDFILE_BACKEND', None):
+            response = offload(full_path, path, content_type)
+        else:
+            response = serve_from_python(request, full_path, content_type, stat.st_size, last_modified)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = get_cache_control(path)
+    return response
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_alter_crop_options_alter_cropcategory_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='crop',
+            index=models.Index(fields=['name', 'id'], name='api_crop_name_b5576e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='crop',
+            index=models.Index(fields=['farm', 'name', 'id'], name='api_crop_farm_id_ec9585_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cropcategory',
+            index=models.Index(fields=['name', 'id'], name='api_cropcat_name_e0a1b0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farm',
+            index=models.Index(fields=['name', 'id'], name='api_farm_name_4e7615_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['name', 'id'], name='api_item_name_970455_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['farm', 'name', 'id'], name='api_item_farm_id_6eb385_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='machinery',
+            index=models.Index(fields=['name', 'id'], name='api_machine_name_f6d06b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='machinery',
+            index=models.Index(fields=['farm', 'name', 'id'], name='api_machine_farm_id_547a0a_idx'),
+        ),
+    ]
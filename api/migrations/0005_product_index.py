@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_product_index(apps, schema_editor):
+    ProductIndex = apps.get_model('api', 'ProductIndex')
+    sources = (('crop', 'Crop'), ('item', 'Item'), ('machinery', 'Machinery'))
+    for product_type, model_name in sources:
+        model = apps.get_model('api', model_name)
+        ProductIndex.objects.bulk_create(
+            ProductIndex(
+                product_type=product_type,
+                product_id=product.pk,
+                name=product.name,
+                farm_id=product.farm_id,
+                category_id=getattr(product, 'category_id', None),
+                price=product.price,
+                stock=product.stock,
+                image=product.image.name or '',
+            )
+            for product in model.objects.iterator()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_type', models.CharField(choices=[('crop', 'Crop'), ('item', 'Item'), ('machinery', 'Machinery')], max_length=10)),
+                ('product_id', models.PositiveIntegerField()),
+                ('name', models.CharField(max_length=255)),
+                ('price', models.FloatField(blank=True, null=True)),
+                ('stock', models.IntegerField()),
+                ('image', models.CharField(blank=True, max_length=100)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.cropcategory')),
+                ('farm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.farm')),
+            ],
+            options={
+                'ordering': ['name', 'id'],
+                'indexes': [models.Index(fields=['name', 'id'], name='api_product_name_23a141_idx'), models.Index(fields=['price', 'id'], name='api_product_price_20abf5_idx'), models.Index(fields=['farm', 'name', 'id'], name='api_product_farm_id_db93c7_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product_type', 'product_id'), name='unique_product_index_entry')],
+            },
+        ),
+        migrations.RunPython(populate_product_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+# rowid = pk * 4 + kind code, see api.search.SEARCH_KINDS
+POPULATE_SQL = (
+    "INSERT INTO api_search_index (rowid, name, body) "
+    "SELECT id * 4 + 0, name, description FROM api_crop",
+    "INSERT INTO api_search_index (rowid, name, body) "
+    "SELECT id * 4 + 1, name, description FROM api_item",
+    "INSERT INTO api_search_index (rowid, name, body) "
+    "SELECT id * 4 + 2, name, description || ' ' || COALESCE(producer, '') FROM api_machinery",
+    "INSERT INTO api_search_index (rowid, name, body) "
+    "SELECT id * 4 + 3, name, description || ' ' || address FROM api_farm",
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE api_search_index USING fts5("
+            "name, body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    except OperationalError:
+        # SQLite built without FTS5, api.search falls back to icontains
+        return
+    # rank the name column ten times higher than description/producer/address
+    schema_editor.execute(
+        "INSERT INTO api_search_index (api_search_index, rank) VALUES ('rank', 'bm25(10.0, 1.0)')"
+    )
+    for sql in POPULATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS api_search_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_product_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
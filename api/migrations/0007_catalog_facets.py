@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:35
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def populate_new_index_columns(apps, schema_editor):
+    ProductIndex = apps.get_model('api', 'ProductIndex')
+    for product_type, model_name, fields in (('item', 'Item', ('is_new',)), ('machinery', 'Machinery', ('is_new', 'producer'))):
+        source = apps.get_model('api', model_name).objects.filter(pk=OuterRef('product_id'))
+        ProductIndex.objects.filter(product_type=product_type).update(**{
+            field: Subquery(source.values(field)[:1]) for field in fields
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productindex',
+            name='is_new',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='productindex',
+            name='producer',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='crop',
+            index=models.Index(fields=['category', 'price'], name='api_crop_categor_80805a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='crop',
+            index=models.Index(fields=['stock'], name='api_crop_stock_ddb961_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['stock'], name='api_item_stock_25d068_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='machinery',
+            index=models.Index(fields=['stock'], name='api_machine_stock_3aba3f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productindex',
+            index=models.Index(fields=['category', 'price'], name='api_product_categor_63b454_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productindex',
+            index=models.Index(fields=['stock'], name='api_product_stock_f6224c_idx'),
+        ),
+        migrations.RunPython(populate_new_index_columns, migrations.RunPython.noop),
+    ]
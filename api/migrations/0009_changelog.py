@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:42
+
+from django.db import migrations, models
+
+
+def log_existing_objects(apps, schema_editor):
+    """Seeds the feed so that a first sync returns the whole catalog."""
+    ChangeLog = apps.get_model('api', 'ChangeLog')
+    sources = (
+        ('category', 'CropCategory'),
+        ('farm', 'Farm'),
+        ('crop', 'Crop'),
+        ('item', 'Item'),
+        ('machinery', 'Machinery'),
+    )
+    for kind, model_name in sources:
+        model = apps.get_model('api', model_name)
+        ChangeLog.objects.bulk_create(
+            (ChangeLog(kind=kind, object_id=pk) for pk in model.objects.values_list('pk', flat=True).iterator()),
+            batch_size=1000,
+        )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['seq'],
+                'indexes': [models.Index(fields=['kind', 'object_id'], name='api_changel_kind_6484eb_idx')],
+            },
+        ),
+        migrations.RunPython(log_existing_objects, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changelog',
+            name='txid',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['txid', 'seq'], name='api_changel_txid_b3a086_idx'),
+        ),
+    ]
@@ -1,11 +1,17 @@
+import uuid
+
 from django.db import models
 from users.models import User
 
 class CropCategory(models.Model):
     name = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id']),
+        ]
 
     def __str__(self):
         return self.name
@@ -16,9 +22,13 @@ class Farm(models.Model):
     image = models.ImageField(upload_to='farms/', null=True, blank=True)
     owner = models.ForeignKey(User,on_delete=models.CASCADE)
     address = models.TextField(null=False   , blank=False)
-    
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id']),
+        ]
     
     def __str__(self):
         return self.name
@@ -32,9 +42,16 @@ class Crop(models.Model):
     stock = models.IntegerField(null=False,blank=False)
     predicted_yield = models.FloatField(null=True,blank=True)
     price = models.FloatField(null=True,blank=True)
-    
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['farm', 'name', 'id']),
+            models.Index(fields=['category', 'price']),
+            models.Index(fields=['stock']),
+        ]
     
     @property
     def in_stock(self):
@@ -52,9 +69,15 @@ class Item(models.Model):
     stock = models.IntegerField(null=False, blank=False)
     price = models.FloatField(null=True, blank=True)
     is_new = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['farm', 'name', 'id']),
+            models.Index(fields=['stock']),
+        ]
 
     @property
     def in_stock(self):
@@ -73,9 +96,15 @@ class Machinery(models.Model):
     stock = models.IntegerField(null=False, blank=False)
     price = models.FloatField(null=True, blank=True)
     is_new = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['farm', 'name', 'id']),
+            models.Index(fields=['stock']),
+        ]
 
     @property
     def in_stock(self):
@@ -84,3 +113,91 @@ class Machinery(models.Model):
     def __str__(self):
         return f"{self.name} from farm {self.farm.name} of {self.farm.owner.get_full_name()}"
 
+
+class ProductIndex(models.Model):
+    """Denormalized read model with one row per crop, item or machinery."""
+
+    class ProductType(models.TextChoices):
+        CROP = 'crop'
+        ITEM = 'item'
+        MACHINERY = 'machinery'
+
+    product_type = models.CharField(max_length=10, choices=ProductType.choices)
+    product_id = models.PositiveIntegerField()
+    name = models.CharField(max_length=255)
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey(CropCategory, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    price = models.FloatField(null=True, blank=True)
+    stock = models.IntegerField()
+    image = models.CharField(max_length=100, blank=True)
+    is_new = models.BooleanField(null=True, blank=True)
+    producer = models.CharField(max_length=255, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['product_type', 'product_id'], name='unique_product_index_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['price', 'id']),
+            models.Index(fields=['farm', 'name', 'id']),
+            models.Index(fields=['category', 'price']),
+            models.Index(fields=['stock']),
+        ]
+
+    @property
+    def in_stock(self):
+        return self.stock > 0
+
+    def __str__(self):
+        return f"{self.product_type} #{self.product_id}: {self.name}"
+
+
+class ChangeLog(models.Model):
+    """
+    Append-only feed of catalog changes for delta sync.
+
+    ``(txid, seq)`` only grows once committed, so it is the sync token (see
+    ``api.sync``). An object keeps only its latest entry; deletions stay as
+    tombstones.
+    """
+    seq = models.BigAutoField(primary_key=True)
+    txid = models.BigIntegerField(default=0)
+    kind = models.CharField(max_length=20)
+    object_id = models.PositiveBigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['seq']
+        indexes = [
+            models.Index(fields=['kind', 'object_id']),
+            models.Index(fields=['txid', 'seq']),
+        ]
+
+    def __str__(self):
+        return f"#{self.seq} {'delete' if self.deleted else 'upsert'} {self.kind} {self.object_id}"
+
+
+class UploadSession(models.Model):
+    """A resumable image upload, written chunk by chunk (see ``api.uploads``)."""
+    class TargetChoices(models.TextChoices):
+        FARM = 'farm'
+        CROP = 'crop'
+        ITEM = 'item'
+        MACHINERY = 'machinery'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    target_type = models.CharField(max_length=10, choices=TargetChoices.choices)
+    target_id = models.PositiveIntegerField()
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Upload {self.id}: {self.offset}/{self.size} bytes of {self.filename}'
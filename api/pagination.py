@@ -0,0 +1,143 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def get_nullable_fields(model, ordering):
+    nullable = set()
+    for field in ordering:
+        name = field.lstrip('-')
+        try:
+            if model._meta.get_field(name).null:
+                nullable.add(name)
+        except FieldDoesNotExist:
+            pass
+    return nullable
+
+
+def get_order_by(model, ordering):
+    """
+    ``order_by`` arguments for ``ordering`` with NULLs of nullable columns
+    last in either direction, the order the keyset filter below assumes.
+    """
+    nullable = get_nullable_fields(model, ordering)
+    order_by = []
+    for field in ordering:
+        name = field.lstrip('-')
+        if name not in nullable:
+            order_by.append(field)
+        elif field.startswith('-'):
+            order_by.append(F(name).desc(nulls_last=True))
+        else:
+            order_by.append(F(name).asc(nulls_last=True))
+    return order_by
+
+
+class CatalogPagination(PageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset (cursor) mode.
+
+    Passing ``?cursor=`` (empty for the first page) switches the view to
+    keyset pagination on ``view.cursor_ordering``: no COUNT(*) and no OFFSET,
+    so every page costs the same regardless of how deep the client scrolls.
+    Views that set ``cursor_ordering = None`` only support page numbers.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = settings.REST_FRAMEWORK.get('MAX_PAGE_SIZE', 100)
+    cursor_query_param = 'cursor'
+    cursor_ordering = ('name', 'id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'cursor_ordering', self.cursor_ordering)
+        self.use_cursor = ordering is not None and self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = tuple(ordering)
+        page_size = self.get_page_size(request) or self.page_size
+
+        self.nullable = get_nullable_fields(queryset.model, self.ordering)
+        queryset = queryset.order_by(*get_order_by(queryset.model, self.ordering))
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position))
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.next_position = self.get_position(rows[-1]) if self.has_next else None
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_cursor_link(),
+            'results': data,
+        })
+
+    def get_keyset_filter(self, position):
+        """
+        Builds ``(a > x) OR (a = x AND b > y) ...`` for the current ordering.
+        NULLs sort last, so they come after any value and only tie with NULL.
+        """
+        keyset = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            if value is None:
+                equal &= Q(**{f'{name}__isnull': True})
+                continue
+            after = Q(**{f'{name}__{lookup}': value})
+            if name in self.nullable:
+                after |= Q(**{f'{name}__isnull': True})
+            keyset |= equal & after
+            equal &= Q(**{name: value})
+        return keyset
+
+    def get_position(self, row):
+        values = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            if name == 'pk':
+                value = row.pk
+            elif isinstance(row, dict):
+                value = row[name]
+            else:
+                value = getattr(row, name)
+            values.append(value)
+        return values
+
+    def encode_cursor(self, position):
+        raw = json.dumps(position, default=str).encode()
+        return urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            position = json.loads(raw)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_cursor_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
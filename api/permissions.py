@@ -6,5 +6,5 @@ class IsOwnerOrAdmin(permissions.BasePermission):
         if request.user.is_staff:
             return True
         if hasattr(obj, 'farm'):
-            return obj.farm.owner == request.user
-        return obj.owner == request.user
\ No newline at end of file
+            return obj.farm.owner_id == request.user.pk
+        return obj.owner_id == request.user.pk
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+orjson-backed JSON and MessagePack renderers and parsers.
+
+Enabled through ``DEFAULT_RENDERER_CLASSES`` / ``DEFAULT_PARSER_CLASSES``.
+Types neither format knows natively (Decimal, datetimes, lazy strings,
+querysets, ...) go through DRF's own encoder, so both formats carry the same
+values as ``JSONRenderer`` output.
+"""
+import msgpack
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+encode_fallback = JSONEncoder().default
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        options = orjson.OPT_NON_STR_KEYS
+        if accepted_media_type and 'indent' in accepted_media_type:
+            # orjson only indents by two spaces, whatever the requested width
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=encode_fallback, option=options)
+
+
+class ORJSONParser(BaseParser):
+    media_type = 'application/json'
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Serves ``Accept: application/msgpack`` (or ``?format=msgpack``)."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_fallback, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
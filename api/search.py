@@ -0,0 +1,208 @@
+"""
+Full-text search over products and farms.
+
+On SQLite the catalog is mirrored into the ``api_search_index`` FTS5 table,
+kept in sync by the signals in ``api.signals``. Each row's rowid encodes the
+object kind and primary key, so updates and deletes hit the rowid b-tree
+instead of scanning the table. Other backends fall back to ``icontains``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Crop, Farm, Item, Machinery, ProductIndex
+
+SEARCH_TABLE = 'api_search_index'
+
+# kind -> (code stored in the rowid, model, fields matched by the fallback)
+SEARCH_KINDS = {
+    'crop': (0, Crop, ('name', 'description')),
+    'item': (1, Item, ('name', 'description')),
+    'machinery': (2, Machinery, ('name', 'description', 'producer')),
+    'farm': (3, Farm, ('name', 'description', 'address')),
+}
+KIND_COUNT = len(SEARCH_KINDS)
+KINDS_BY_CODE = {code: kind for kind, (code, _, _) in SEARCH_KINDS.items()}
+KINDS_BY_MODEL = {model: kind for kind, (_, model, _) in SEARCH_KINDS.items()}
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Only the MAX_RESULTS best-ranked matches can be paged through; counting
+# stops there too, so a very common term does not count its whole posting list.
+MAX_RESULTS = 1000
+
+_fts_enabled = {}
+
+
+def fts_enabled():
+    """Whether the FTS5 table exists on the default database."""
+    alias = connection.alias
+    if alias not in _fts_enabled:
+        _fts_enabled[alias] = (
+            connection.vendor == 'sqlite'
+            and SEARCH_TABLE in connection.introspection.table_names()
+        )
+    return _fts_enabled[alias]
+
+
+def get_rowid(kind, pk):
+    return pk * KIND_COUNT + SEARCH_KINDS[kind][0]
+
+
+def split_rowid(rowid):
+    return KINDS_BY_CODE[rowid % KIND_COUNT], rowid // KIND_COUNT
+
+
+def get_search_document(obj):
+    """Returns the ``(name, body)`` columns indexed for a product or farm."""
+    _, _, fields = SEARCH_KINDS[KINDS_BY_MODEL[type(obj)]]
+    body = ' '.join(filter(None, (getattr(obj, field) for field in fields[1:])))
+    return obj.name, body
+
+
+def index_search_document(obj):
+    if not fts_enabled():
+        return
+    rowid = get_rowid(KINDS_BY_MODEL[type(obj)], obj.pk)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [rowid])
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, body) VALUES (%s, %s, %s)',
+            [rowid, *get_search_document(obj)],
+        )
+
+
+def index_search_documents(model, pks):
+    """Re-indexes many objects of one model in two batched statements."""
+    if not fts_enabled():
+        return
+    kind = KINDS_BY_MODEL[model]
+    fields = SEARCH_KINDS[kind][2]
+    documents = [
+        (get_rowid(kind, obj.pk), *get_search_document(obj))
+        for obj in model.objects.filter(pk__in=pks).only(*fields)
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [[rowid] for rowid, _, _ in documents])
+        cursor.executemany(f'INSERT INTO {SEARCH_TABLE} (rowid, name, body) VALUES (%s, %s, %s)', documents)
+
+
+def remove_search_document(obj):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+            [get_rowid(KINDS_BY_MODEL[type(obj)], obj.pk)],
+        )
+
+
+def rebuild_search_index():
+    """Re-indexes every product and farm; returns the number of documents."""
+    if not fts_enabled():
+        return 0
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        for kind, (_, model, fields) in SEARCH_KINDS.items():
+            for obj in model.objects.order_by().only(*fields).iterator(chunk_size=2000):
+                cursor.execute(
+                    f'INSERT INTO {SEARCH_TABLE} (rowid, name, body) VALUES (%s, %s, %s)',
+                    [get_rowid(kind, obj.pk), *get_search_document(obj)],
+                )
+                total += 1
+    return total
+
+
+def hydrate(keys):
+    """Turns ``(kind, pk)`` pairs into ProductIndex and Farm rows, keeping their order."""
+    product_filter = Q()
+    farm_ids = []
+    for kind, pk in keys:
+        if kind == 'farm':
+            farm_ids.append(pk)
+        else:
+            product_filter |= Q(product_type=kind, product_id=pk)
+
+    found = {}
+    if product_filter:
+        for entry in ProductIndex.objects.filter(product_filter):
+            found[entry.product_type, entry.product_id] = entry
+    if farm_ids:
+        for farm in Farm.objects.filter(pk__in=farm_ids):
+            found['farm', farm.pk] = farm
+    return [found[key] for key in keys if key in found]
+
+
+class FTSSearchResults:
+    """Lazy, sliceable result set ordered by the table's bm25 ``rank`` (name weighs more than body)."""
+
+    def __init__(self, tokens):
+        # whole words for all but the last token, which is still being typed
+        terms = [f'"{token}"' for token in tokens[:-1]] + [f'"{tokens[-1]}"*']
+        self.match = ' '.join(terms)
+
+    def count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM (SELECT rowid FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s LIMIT %s)',
+                [self.match, MAX_RESULTS],
+            )
+            return cursor.fetchone()[0]
+
+    def __getitem__(self, index):
+        start, stop = index.start or 0, min(index.stop, MAX_RESULTS)
+        if start >= stop:
+            return []
+        with connection.cursor() as cursor:
+            # ranked before the cut: a LIMIT applied first keeps matches in rowid order
+            cursor.execute(
+                f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+                f'ORDER BY rank, rowid LIMIT %s OFFSET %s',
+                [self.match, stop - start, start],
+            )
+            return hydrate([split_rowid(rowid) for rowid, in cursor.fetchall()])
+
+
+class FallbackSearchResults:
+    """``icontains`` search for backends without FTS5; name matches rank first."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self._keys = None
+
+    def get_keys(self):
+        if self._keys is None:
+            ranked = []
+            for kind, (_, model, fields) in SEARCH_KINDS.items():
+                condition = Q()
+                for token in self.tokens:
+                    token_condition = Q()
+                    for field in fields:
+                        token_condition |= Q(**{f'{field}__icontains': token})
+                    condition &= token_condition
+                for pk, name in model.objects.filter(condition).values_list('pk', 'name').iterator():
+                    name = name.lower()
+                    rank = sum(0 if name.startswith(t) else 1 if t in name else 2 for t in self.tokens)
+                    ranked.append((rank, name, kind, pk))
+            ranked.sort()
+            self._keys = [(kind, pk) for _, _, kind, pk in ranked[:MAX_RESULTS]]
+        return self._keys
+
+    def count(self):
+        return len(self.get_keys())
+
+    def __getitem__(self, index):
+        return hydrate(self.get_keys()[index])
+
+
+def search(query):
+    """Returns a paginatable result set of ProductIndex and Farm rows for ``query``."""
+    tokens = [token.lower() for token in TOKEN_RE.findall(query)]
+    if not tokens:
+        return []
+    if fts_enabled():
+        return FTSSearchResults(tokens)
+    return FallbackSearchResults(tokens)
@@ -1,6 +1,11 @@
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
 from rest_framework import serializers
 from users.models import User
+from .images import ImageDerivativesField
+from .indexing import summarize_farm_products
 from .models import *
+from .sparse import SparseFieldsMixin
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -18,20 +23,70 @@ class CropCategorySerializer(serializers.ModelSerializer):
         fields = ('id', 'name',)
 
 
-class FarmSerializer(serializers.ModelSerializer):
+class FarmSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    images = ImageDerivativesField()
     owner = UserSerializer(read_only=True)               # вложенный
     crops = serializers.StringRelatedField(many=True, read_only=True)
     items = serializers.StringRelatedField(many=True, read_only=True)
     machines = serializers.StringRelatedField(many=True, read_only=True)
 
+    collapsed_fields = {
+        'owner': serializers.IntegerField(source='owner_id', read_only=True),
+        'crops': serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+        'items': serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+        'machines': serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+    }
+    expand_aliases = {'products': ('crops', 'items', 'machines')}
+    # StringRelatedField renders products through __str__, which reads farm.owner
+    expanded_lookups = {
+        'owner': ('owner',),
+        'crops': ('owner', 'crops'),
+        'items': ('owner', 'items'),
+        'machines': ('owner', 'machines'),
+    }
+    collapsed_lookups = {
+        'crops': (Prefetch('crops', queryset=Crop.objects.only('id', 'farm_id')),),
+        'items': (Prefetch('items', queryset=Item.objects.only('id', 'farm_id')),),
+        'machines': (Prefetch('machines', queryset=Machinery.objects.only('id', 'farm_id')),),
+    }
+
     class Meta:
         model = Farm
         fields = (
-            'id', 'name', 'description', 'image',
+            'id', 'name', 'description', 'image', 'images',
             'owner', 'crops', 'items', 'machines','address'
         )
 
-class CropSerializer(serializers.ModelSerializer):
+class FarmSummaryListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        farms = list(data.all() if hasattr(data, 'all') else data)
+        self.product_summaries = summarize_farm_products([farm.pk for farm in farms])
+        return super().to_representation(farms)
+
+
+class FarmSummarySerializer(serializers.ModelSerializer):
+    """Farm with per-type product counts and price range instead of product lists."""
+    images = ImageDerivativesField()
+    owner = UserSerializer(read_only=True)
+    products = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Farm
+        fields = (
+            'id', 'name', 'description', 'image', 'images',
+            'owner', 'products', 'address'
+        )
+        list_serializer_class = FarmSummaryListSerializer
+
+    def get_products(self, obj):
+        summaries = getattr(self.parent, 'product_summaries', None)
+        if summaries is None:
+            summaries = summarize_farm_products([obj.pk])
+        return summaries[obj.pk]
+
+
+class CropSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    images = ImageDerivativesField()
     category = CropCategorySerializer(read_only=True)
     category_id = serializers.PrimaryKeyRelatedField(
         queryset=CropCategory.objects.all(),
@@ -46,17 +101,24 @@ class CropSerializer(serializers.ModelSerializer):
     )
     in_stock = serializers.ReadOnlyField()
 
+    collapsed_fields = {
+        'category': serializers.IntegerField(source='category_id', read_only=True),
+        'farm': serializers.IntegerField(source='farm_id', read_only=True),
+    }
+    expanded_lookups = {'category': ('category',), 'farm': ('farm',)}
+
     class Meta:
         model = Crop
         fields = (
-            'id', 'name', 'description', 'image',
+            'id', 'name', 'description', 'image', 'images',
             'category', 'category_id',
             'farm', 'farm_id',
             'stock', 'predicted_yield', 'price', 'in_stock'
         )
 
 
-class ItemSerializer(serializers.ModelSerializer):
+class ItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    images = ImageDerivativesField()
     farm = FarmShortSerializer(read_only=True)
     farm_id = serializers.PrimaryKeyRelatedField(
         queryset=Farm.objects.all(),
@@ -65,16 +127,20 @@ class ItemSerializer(serializers.ModelSerializer):
     )
     in_stock = serializers.ReadOnlyField()
 
+    collapsed_fields = {'farm': serializers.IntegerField(source='farm_id', read_only=True)}
+    expanded_lookups = {'farm': ('farm',)}
+
     class Meta:
         model = Item
         fields = (
-            'id', 'name', 'description', 'image',
+            'id', 'name', 'description', 'image', 'images',
             'farm', 'farm_id',
             'stock', 'price', 'is_new', 'in_stock'
         )
 
 
-class MachinerySerializer(serializers.ModelSerializer):
+class MachinerySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    images = ImageDerivativesField()
     farm = FarmShortSerializer(read_only=True)
     farm_id = serializers.PrimaryKeyRelatedField(
         queryset=Farm.objects.all(),
@@ -83,27 +149,79 @@ class MachinerySerializer(serializers.ModelSerializer):
     )
     in_stock = serializers.ReadOnlyField()
 
+    collapsed_fields = {'farm': serializers.IntegerField(source='farm_id', read_only=True)}
+    expanded_lookups = {'farm': ('farm',)}
+
     class Meta:
         model = Machinery
         fields = (
-            'id', 'name', 'producer', 'description', 'image',
+            'id', 'name', 'producer', 'description', 'image', 'images',
             'farm', 'farm_id',
             'stock', 'price', 'is_new', 'in_stock'
         )
 
 class AllProductsSerializer(serializers.Serializer):
+    children = {
+        Crop: ('crop', CropSerializer),
+        Item: ('item', ItemSerializer),
+        Machinery: ('machinery', MachinerySerializer),
+    }
+
+    def get_child(self, model):
+        # one child serializer per type, reused for every row of the list
+        cache = self.__dict__.setdefault('_child_serializers', {})
+        if model not in cache:
+            product_type, serializer_class = self.children[model]
+            cache[model] = (product_type, serializer_class(context=self.context))
+        return cache[model]
+
     def to_representation(self, instance):
-        data = {}
-        if isinstance(instance, Crop):
-            data = CropSerializer(instance, context=self.context).data
-            data['type'] = 'crop'
-        elif isinstance(instance, Item):
-            data = ItemSerializer(instance, context=self.context).data
-            data['type'] = 'item'
-        elif isinstance(instance, Machinery):
-            data = MachinerySerializer(instance, context=self.context).data
-            data['type'] = 'machinery'
-        else:
+        if type(instance) not in self.children:
             raise TypeError('Unexpected object type')
-        
+        product_type, child = self.get_child(type(instance))
+        data = child.to_representation(instance)
+        data['type'] = product_type
         return data
+
+
+class ProductIndexSerializer(serializers.ModelSerializer):
+    """Flat product row for the unified catalog, served from ProductIndex."""
+    id = serializers.IntegerField(source='product_id', read_only=True)
+    type = serializers.CharField(source='product_type', read_only=True)
+    image = serializers.SerializerMethodField()
+    images = ImageDerivativesField()
+    farm_id = serializers.IntegerField(read_only=True)
+    category_id = serializers.IntegerField(read_only=True)
+    in_stock = serializers.ReadOnlyField()
+
+    class Meta:
+        model = ProductIndex
+        fields = (
+            'id', 'type', 'name', 'image', 'images',
+            'farm_id', 'category_id',
+            'stock', 'price', 'in_stock', 'is_new', 'producer'
+        )
+
+    def get_image(self, obj):
+        if not obj.image:
+            return None
+        url = default_storage.url(obj.image)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class FarmSearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Farm
+        fields = ('id', 'name', 'description', 'image', 'address')
+
+
+class SearchResultSerializer(serializers.Serializer):
+    def to_representation(self, instance):
+        if isinstance(instance, ProductIndex):
+            return ProductIndexSerializer(instance, context=self.context).data
+        if isinstance(instance, Farm):
+            data = FarmSearchSerializer(instance, context=self.context).data
+            data['type'] = 'farm'
+            return data
+        raise TypeError('Unexpected object type')
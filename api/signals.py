@@ -0,0 +1,158 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from users.models import User
+from . import autocomplete, images
+from .cache import bump_version
+from .indexing import index_product, index_products, unindex_product
+from . import sync
+from .models import Crop, CropCategory, Farm, Item, Machinery, ProductIndex
+from .search import index_search_document, index_search_documents, remove_search_document
+from .serializers import CropCategorySerializer, FarmSearchSerializer, ProductIndexSerializer
+
+# Sent by bulk writes (bulk_create, bulk_update, QuerySet.update) that bypass
+# post_save, with the primary keys of the created or changed products.
+products_changed = Signal()
+# Sent by stock reservations (orders.stock), which only move ``stock``: the
+# read model, response cache and sync feed follow; search and autocomplete
+# do not index stock.
+stock_changed = Signal()
+
+
+@receiver(post_save, sender=Crop)
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Machinery)
+def sync_product_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_product(instance)
+
+
+@receiver(post_delete, sender=Crop)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Machinery)
+def remove_from_product_index(sender, instance, **kwargs):
+    unindex_product(instance)
+
+
+@receiver(post_save, sender=Crop)
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Machinery)
+@receiver(post_save, sender=Farm)
+def sync_search_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    index_search_document(instance)
+
+
+@receiver(post_delete, sender=Crop)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Machinery)
+@receiver(post_delete, sender=Farm)
+def remove_from_search_index(sender, instance, **kwargs):
+    remove_search_document(instance)
+
+
+@receiver(post_save, sender=Crop)
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Machinery)
+@receiver(post_save, sender=Farm)
+@receiver(post_save, sender=CropCategory)
+def sync_autocomplete(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    autocomplete.record_saved(instance, created)
+
+
+@receiver(post_delete, sender=Crop)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Machinery)
+@receiver(post_delete, sender=Farm)
+@receiver(post_delete, sender=CropCategory)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    autocomplete.record_deleted(instance)
+
+
+CACHED_RESOURCES = {
+    Farm: 'farm',
+    Crop: 'crop',
+    Item: 'item',
+    Machinery: 'machinery',
+    CropCategory: 'category',
+    User: 'user',
+}
+
+
+@receiver(post_save, sender=Farm)
+@receiver(post_save, sender=Crop)
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Machinery)
+@receiver(post_save, sender=CropCategory)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=Farm)
+@receiver(post_delete, sender=Crop)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Machinery)
+@receiver(post_delete, sender=CropCategory)
+@receiver(post_delete, sender=User)
+def invalidate_cached_responses(sender, **kwargs):
+    bump_version(CACHED_RESOURCES[sender])
+
+
+for model, product_type in ((Crop, 'crop'), (Item, 'item'), (Machinery, 'machinery')):
+    sync.register(
+        product_type,
+        model,
+        ProductIndexSerializer,
+        queryset=ProductIndex.objects.filter(product_type=product_type),
+        lookup='product_id',
+    )
+sync.register('farm', Farm, FarmSearchSerializer)
+sync.register('category', CropCategory, CropCategorySerializer)
+
+
+@receiver(post_save, sender=Crop)
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Machinery)
+@receiver(post_save, sender=Farm)
+@receiver(post_save, sender=CropCategory)
+def log_saved_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    sync.record_change(instance)
+
+
+@receiver(post_delete, sender=Crop)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Machinery)
+@receiver(post_delete, sender=Farm)
+@receiver(post_delete, sender=CropCategory)
+def log_deleted_change(sender, instance, **kwargs):
+    sync.record_change(instance, deleted=True)
+
+
+@receiver(products_changed)
+def sync_bulk_changes(sender, pks, **kwargs):
+    """Everything the per-object receivers above do, for a batch of products."""
+    if not pks:
+        return
+    index_products(sender, pks)
+    index_search_documents(sender, pks)
+    # cheaper to rebuild lazily than to insert a large batch key by key
+    autocomplete.reset_index()
+    bump_version(CACHED_RESOURCES[sender])
+    sync.record_changes(sender, pks)
+
+
+for model in (Farm, Crop, Item, Machinery):
+    images.track(model)
+images.track(User, 'profile_image')
+
+
+@receiver(stock_changed)
+def sync_stock_changes(sender, pks, **kwargs):
+    if not pks:
+        return
+    index_products(sender, pks)
+    bump_version(CACHED_RESOURCES[sender])
+    sync.record_changes(sender, pks)
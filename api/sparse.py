@@ -0,0 +1,107 @@
+"""
+Sparse fieldsets (``?fields=``) and explicit expansion (``?expand=``).
+
+``?fields=name,price`` keeps only the listed top-level fields, plus the
+primary key. ``?expand=farm`` renders only the listed relations as nested
+objects; relations that are left out collapse to their ids. Without the
+parameters responses are unchanged, so existing clients are not affected.
+Both only apply to GET requests.
+"""
+import copy
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.serializers import ListSerializer
+
+
+def parse_list(request, name):
+    """The comma-separated values of a query parameter, or None if it is absent."""
+    if request is None or request.method != 'GET' or name not in request.query_params:
+        return None
+    return {value.strip() for value in request.query_params[name].split(',') if value.strip()}
+
+
+def get_expanded(request, names, aliases=None):
+    """Which of the expandable ``names`` the request renders nested."""
+    expand = parse_list(request, 'expand')
+    if expand is None:
+        return set(names)
+    for alias, targets in (aliases or {}).items():
+        if alias in expand:
+            expand |= set(targets)
+    return expand & set(names)
+
+
+def is_single_valued(model, lookup):
+    """Whether every step of ``lookup`` is a forward foreign key, so it can be joined."""
+    for name in lookup.split('__'):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # reverse accessors such as ``orderitem_set`` are not field names
+            return False
+        if not (field.many_to_one or field.one_to_one) or field.auto_created:
+            return False
+        model = field.related_model
+    return True
+
+
+class SparseFieldsMixin:
+    """
+    ModelSerializer mixin applying ``?fields=`` and ``?expand=`` to the root
+    serializer of a response.
+
+    ``collapsed_fields`` maps each expandable field to the field rendered in
+    its place when it is not expanded; ``expand_aliases`` lets one name
+    expand several fields. ``expanded_lookups`` and ``collapsed_lookups``
+    list what ``expand_queryset`` joins or prefetches in either case.
+    """
+    collapsed_fields = {}
+    expand_aliases = {}
+    expanded_lookups = {}
+    collapsed_lookups = {}
+
+    @classmethod
+    def expand_queryset(cls, queryset, request):
+        """Joins or prefetches only what the requested representation renders."""
+        expanded = get_expanded(request, cls.collapsed_fields, cls.expand_aliases)
+        model = queryset.model
+        for name in cls.collapsed_fields:
+            lookups = (cls.expanded_lookups if name in expanded else cls.collapsed_lookups).get(name, ())
+            for lookup in lookups:
+                if isinstance(lookup, str) and is_single_valued(model, lookup):
+                    queryset = queryset.select_related(lookup)
+                else:
+                    queryset = queryset.prefetch_related(lookup)
+        return queryset
+
+    def is_root(self):
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if not self.is_root():
+            return fields
+
+        expanded = get_expanded(request, self.collapsed_fields, self.expand_aliases)
+        for name, field in self.collapsed_fields.items():
+            if name not in expanded and name in fields:
+                fields[name] = copy.deepcopy(field)
+
+        requested = parse_list(request, 'fields')
+        if requested is not None:
+            requested.add(self.Meta.model._meta.pk.name)
+            for name in list(fields):
+                if name not in requested and not fields[name].write_only:
+                    del fields[name]
+        return fields
+
+
+class ExpandQuerysetMixin:
+    """View mixin joining only the relations its serializer renders nested."""
+
+    def get_queryset(self):
+        return self.get_serializer_class().expand_queryset(super().get_queryset(), self.request)
@@ -0,0 +1,71 @@
+"""
+Storage backends for uploads and collected static files.
+
+``HashedMediaStorage`` puts a hash of the content in every upload name, so a
+media URL always returns the same bytes and can be cached as immutable
+(see ``api.media``). ``CompressedManifestStaticFilesStorage`` adds ``.gz``
+and ``.br`` copies of the hashed static files for the web server's
+``gzip_static``/``brotli_static``.
+"""
+import gzip
+import hashlib
+import mimetypes
+import posixpath
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+from .compression import brotli, is_compressible
+from .images import DERIVATIVES_ROOT
+
+
+class HashedMediaStorage(FileSystemStorage):
+    """Saves ``crops/tomato.jpg`` as ``crops/tomato.<12 hex digits>.jpg``."""
+
+    def get_content_hash(self, content):
+        digest = hashlib.md5(usedforsecurity=False)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()[:12]
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        # derivatives are named after their original, which already carries the hash
+        if not name.startswith(f'{DERIVATIVES_ROOT}/'):
+            name = self.get_hashed_name(name, content)
+        return super().save(name, content, max_length)
+
+    def get_hashed_name(self, name, content):
+        root, ext = posixpath.splitext(name)
+        return f'{root}.{self.get_content_hash(content)}{ext}'
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """``ManifestStaticFilesStorage`` that also writes precompressed copies of text assets."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            content_type, _ = mimetypes.guess_type(name)
+            if content_type and is_compressible(content_type):
+                self.write_compressed(name)
+
+    def write_compressed(self, name):
+        with self.open(name) as file:
+            body = file.read()
+        # collectstatic runs once per deploy, so use the best compression levels
+        variants = {'.gz': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(body, quality=11)
+        for suffix, data in variants.items():
+            if len(data) < len(body):
+                self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(data))
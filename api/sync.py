@@ -0,0 +1,159 @@
+"""
+Delta sync: which catalog objects changed since a client's last sync.
+
+Apps register the kinds they want replicated with ``register`` and call
+``record_change`` from their signals. Entries are written in the same
+transaction as the change, so they commit or roll back together.
+
+Writers never wait for each other. On PostgreSQL a later ``seq`` can commit
+before an earlier one, so every entry also carries the id of the transaction
+that wrote it, the feed is read in ``(txid, seq)`` order and only up to the
+oldest transaction still running (``get_horizon``). A client holding a token
+therefore never skips an entry that commits late. SQLite allows a single
+writer, so there ``txid`` stays 0 and tokens are plain ``seq`` values.
+"""
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import ChangeLog
+
+SYNC_KINDS = {}
+
+
+class SyncKind:
+    def __init__(self, kind, model, serializer_class, queryset=None, lookup='pk'):
+        self.kind = kind
+        self.model = model
+        self.serializer_class = serializer_class
+        self.queryset = queryset if queryset is not None else model._default_manager.all()
+        self.lookup = lookup
+
+    def fetch(self, ids):
+        return self.queryset.filter(**{f'{self.lookup}__in': ids})
+
+    def get_id(self, obj):
+        return getattr(obj, self.lookup)
+
+
+def register(kind, model, serializer_class, queryset=None, lookup='pk'):
+    """Replicates ``model`` through the sync feed as ``kind``."""
+    SYNC_KINDS[kind] = SyncKind(kind, model, serializer_class, queryset, lookup)
+
+
+def get_kind(model):
+    for sync_kind in SYNC_KINDS.values():
+        if sync_kind.model is model:
+            return sync_kind.kind
+    return None
+
+
+def get_txid():
+    """Id of the current transaction; 0 where writers are already serialized."""
+    if connection.vendor != 'postgresql':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_current_xact_id()::text::bigint')
+        return cursor.fetchone()[0]
+
+
+def get_horizon():
+    """
+    The oldest transaction still running: entries written by it or by a later
+    one may still be joined by entries that sort before them, so readers stop
+    there. ``None`` where there is nothing to wait for.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+        return cursor.fetchone()[0]
+
+
+def parse_token(value):
+    """``'<seq>'`` or ``'<txid>.<seq>'`` as ``(txid, seq)``; raises ``ValueError``."""
+    parts = value.split('.')
+    if len(parts) > 2 or not all(part.isdigit() for part in parts):
+        raise ValueError(value)
+    return (0, int(parts[0])) if len(parts) == 1 else (int(parts[0]), int(parts[1]))
+
+
+def format_token(txid, seq):
+    return f'{txid}.{seq}' if txid else str(seq)
+
+
+def write_change(kind, object_id, deleted):
+    with transaction.atomic():
+        ChangeLog.objects.filter(kind=kind, object_id=object_id).delete()
+        ChangeLog.objects.create(kind=kind, object_id=object_id, deleted=deleted, txid=get_txid())
+
+
+def record_change(instance, deleted=False):
+    kind = get_kind(type(instance))
+    if kind is not None:
+        write_change(kind, instance.pk, deleted)
+
+
+def write_changes(kind, object_ids, deleted):
+    with transaction.atomic():
+        txid = get_txid()
+        ChangeLog.objects.filter(kind=kind, object_id__in=object_ids).delete()
+        ChangeLog.objects.bulk_create(
+            (ChangeLog(kind=kind, object_id=object_id, deleted=deleted, txid=txid) for object_id in object_ids),
+            batch_size=1000,
+        )
+
+
+def record_changes(model, pks, deleted=False):
+    """``record_change`` for bulk writes that send no per-object signals."""
+    kind = get_kind(model)
+    if kind is not None:
+        write_changes(kind, list(pks), deleted)
+
+
+def get_changes(since, limit):
+    """
+    Reads at most ``limit`` log entries after the ``(txid, seq)`` token
+    ``since`` and returns the token to resume from, the upserted and deleted
+    ids per kind, and whether more entries follow.
+    """
+    txid, seq = since
+    entries = ChangeLog.objects.filter(Q(txid__gt=txid) | Q(txid=txid, seq__gt=seq))
+    horizon = get_horizon()
+    if horizon is not None:
+        entries = entries.filter(txid__lt=horizon)
+    rows = list(
+        entries.order_by('txid', 'seq')
+        .values_list('txid', 'seq', 'kind', 'object_id', 'deleted')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest = {}
+    for _, _, kind, object_id, deleted in rows:
+        latest[kind, object_id] = deleted
+    upserted, deleted = {}, {}
+    for (kind, object_id), is_deleted in latest.items():
+        (deleted if is_deleted else upserted).setdefault(kind, []).append(object_id)
+    return (rows[-1][:2] if rows else since), upserted, deleted, has_more
+
+
+def get_sync_payload(since, limit, context):
+    token, upserted, deleted, has_more = get_changes(since, limit)
+    changes = {}
+    for kind, ids in upserted.items():
+        sync_kind = SYNC_KINDS.get(kind)
+        if sync_kind is None:
+            continue
+        objects = list(sync_kind.fetch(ids))
+        found = {sync_kind.get_id(obj) for obj in objects}
+        # deleted after this page was logged: the tombstone is further on, send it now
+        missing = [pk for pk in ids if pk not in found]
+        if missing:
+            deleted.setdefault(kind, []).extend(missing)
+        changes[kind] = sync_kind.serializer_class(objects, many=True, context=context).data
+    return {
+        'next': format_token(*token),
+        'has_more': has_more,
+        'changes': changes,
+        'deleted': {kind: sorted(ids) for kind, ids in deleted.items()},
+    }
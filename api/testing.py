@@ -0,0 +1,67 @@
+from importlib import import_module
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+
+
+def collect_url_names(patterns):
+    """Returns the names of every pattern in a urlconf, following include()."""
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= collect_url_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+class QueryBudgetMixin:
+    """
+    Declares a query budget for every URL name of an app's urlconf.
+
+    ``query_budgets`` maps a URL name to the maximum number of queries a GET
+    may run, or to ``None`` for endpoints that are not measured (write-only or
+    admin-only). Each read endpoint is requested before and after ``grow()``
+    adds rows, and must stay within its budget while running the same number
+    of queries both times. The response cache is cleared before every request
+    so the budget covers the uncached path.
+    """
+    urlconf = None
+    query_budgets = {}
+
+    def get_url_kwargs(self, name):
+        return {}
+
+    def get_query_params(self, name):
+        return {}
+
+    def grow(self):
+        raise NotImplementedError('QueryBudgetMixin subclasses must implement grow()')
+
+    def count_queries(self, name):
+        url = reverse(name, kwargs=self.get_url_kwargs(name))
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, self.get_query_params(name))
+        self.assertEqual(response.status_code, 200, f'{name}: {url} returned {response.status_code}')
+        return len(context)
+
+    def test_every_url_has_a_budget(self):
+        names = collect_url_names(import_module(self.urlconf).urlpatterns)
+        missing = sorted(names - set(self.query_budgets))
+        self.assertFalse(missing, f'No query budget declared for: {", ".join(missing)}')
+
+    def test_read_endpoints_stay_within_budget(self):
+        read_budgets = {name: budget for name, budget in self.query_budgets.items() if budget is not None}
+        for name in read_budgets:
+            # first request warms per-process caches such as ContentType
+            self.count_queries(name)
+        before = {name: self.count_queries(name) for name in read_budgets}
+        self.grow()
+        for name, budget in read_budgets.items():
+            with self.subTest(url=name):
+                after = self.count_queries(name)
+                self.assertLessEqual(after, budget, f'{name} ran {after} queries, budget is {budget}')
+                self.assertEqual(after, before[name], f'{name} query count grew with result size')
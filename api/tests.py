@@ -1,3 +1,1099 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import brotli
+import msgpack
+from PIL import Image
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from users.models import User
+from . import autocomplete, compression, images, sync
+from . import search as search_module
+from .cache import get_stats
+from .exports import ProductExport
+from .lean import CropValuesSerializer, ItemValuesSerializer, MachineryValuesSerializer, ProductIndexValuesSerializer
+from .models import ChangeLog, Crop, CropCategory, Farm, Item, Machinery, ProductIndex, UploadSession
+from .indexing import find_index_drift, index_products, rebuild_product_index, summarize_farm_products
+from .pagination import CatalogPagination, get_order_by
+from .serializers import CropSerializer, FarmSummarySerializer, ItemSerializer, MachinerySerializer, ProductIndexSerializer
+from .storage import CompressedManifestStaticFilesStorage
+from .testing import QueryBudgetMixin
+from .views import CatalogListMixin, ExportView
+
+
+def create_catalog(owner, category, farm_count=1, products_per_farm=2):
+    """Creates farms with a crop, an item and a machine per product slot."""
+    farms = []
+    for i in range(farm_count):
+        farm = Farm.objects.create(name=f'Farm {i}', description='Family farm', owner=owner, address='Baku')
+        for j in range(products_per_farm):
+            Crop.objects.create(name=f'Tomato {j}', category=category, farm=farm, stock=j, price=1.5 + j)
+            Item.objects.create(name=f'Jar {j}', farm=farm, stock=j, price=2.0 + j)
+            Machinery.objects.create(name=f'Tractor {j}', producer='Kubota', farm=farm, stock=1, price=1000.0 + j)
+        farms.append(farm)
+    return farms
+
+
+class ApiQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    urlconf = 'api.urls'
+    query_budgets = {
+        'all': 2,
+        'search': 4,
+        'autocomplete': 0,
+        'batch': None,
+        'cart-quote': None,
+        'cache-stats': None,
+        'sync': 7,
+        'export': None,
+        'crop-list': 2,
+        'crop-detail': 1,
+        'crop-update': None,
+        'crop-delete': None,
+        'item-list': 2,
+        'item-detail': 1,
+        'item-update': None,
+        'item-delete': None,
+        'machinery-list': 2,
+        'machinery-detail': 1,
+        'machinery-update': None,
+        'machinery-delete': None,
+        'farm-list': 3,
+        'farm-detail': 5,
+        'farm-update': None,
+        'category-list': 2,
+        'category-detail': 1,
+        'user-farms': 3,
+        'create-farm': None,
+        'add-crop': None,
+        'add-item': None,
+        'add-machinery': None,
+        'import-products': None,
+        'adjust-products': None,
+        'upload-create': None,
+        'upload-detail': None,
+        'upload-complete': None,
+        'farm-crops': 2,
+        'farm-items': 2,
+        'farm-machinery': 2,
+        'farm-all-products': 2,
+    }
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        self.category = CropCategory.objects.create(name='Vegetables')
+        self.farm, = create_catalog(self.owner, self.category)
+        self.client.force_authenticate(self.owner)
+        autocomplete.reset_index()
+
+    def grow(self):
+        CropCategory.objects.create(name='Fruits')
+        create_catalog(self.owner, self.category, farm_count=3, products_per_farm=5)
+        for i in range(5):
+            Crop.objects.create(name=f'Potato {i}', category=self.category, farm=self.farm, stock=i, price=0.5)
+            Item.objects.create(name=f'Bag {i}', farm=self.farm, stock=i, price=0.1)
+            Machinery.objects.create(name=f'Plough {i}', farm=self.farm, stock=i, price=300.0)
+
+    def get_query_params(self, name):
+        if name in ('search', 'autocomplete'):
+            return {'q': 'farm'}
+        return {}
+
+    def get_url_kwargs(self, name):
+        if name.startswith('farm-') and name not in ('farm-list', 'farm-detail', 'farm-update'):
+            return {'farm_id': self.farm.pk}
+        objects = {
+            'crop': Crop.objects.filter(farm=self.farm).first(),
+            'item': Item.objects.filter(farm=self.farm).first(),
+            'machinery': Machinery.objects.filter(farm=self.farm).first(),
+            'farm': self.farm,
+            'category': self.category,
+        }
+        prefix = name.split('-')[0]
+        if name in ('search', 'autocomplete'):
+            return {}
+        if name.endswith(('-detail', '-update', '-delete')):
+            return {'pk': objects[prefix].pk}
+        return {}
+
+
+class CatalogFilterTests(APITestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        self.vegetables = CropCategory.objects.create(name='Vegetables')
+        self.fruits = CropCategory.objects.create(name='Fruits')
+        self.farm, self.other_farm = create_catalog(owner, self.vegetables, farm_count=2, products_per_farm=3)
+        Crop.objects.create(name='Apple', category=self.fruits, farm=self.other_farm, stock=4, price=60.0)
+        Machinery.objects.filter(farm=self.other_farm).update(producer='Deere', is_new=True)
+        self.client.force_authenticate(owner)
+
+    def names(self, url_name, **params):
+        response = self.client.get(reverse(url_name), params)
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.data['results']]
+
+    def test_filters(self):
+        self.assertEqual(self.names('crop-list', category=self.fruits.pk), ['Apple'])
+        self.assertEqual(self.names('crop-list', farm=self.farm.pk, price_min=2, price_max=3), ['Tomato 1'])
+        self.assertEqual(self.names('crop-list', farm=self.farm.pk, in_stock='false'), ['Tomato 0'])
+        self.assertEqual(self.names('item-list', farm=f'{self.farm.pk},{self.other_farm.pk}', in_stock='yes'), ['Jar 1', 'Jar 1', 'Jar 2', 'Jar 2'])
+        self.assertEqual(self.names('machinery-list', is_new='true', producer='deere'), ['Tractor 0', 'Tractor 1', 'Tractor 2'])
+        # columns a model does not have are ignored
+        self.assertEqual(len(self.names('item-list', producer='deere')), 6)
+
+    def test_ordering(self):
+        self.assertEqual(self.names('crop-list', ordering='-price')[:2], ['Apple', 'Tomato 2'])
+        self.assertEqual(self.names('crop-list', ordering='-name')[0], 'Tomato 2')
+        response = self.client.get(reverse('crop-list'), {'ordering': 'stock'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.data)
+
+    def test_invalid_values_are_rejected(self):
+        for params in ({'farm': 'one'}, {'price_min': 'cheap'}, {'in_stock': 'maybe'}):
+            self.assertEqual(self.client.get(reverse('crop-list'), params).status_code, 400)
+
+    def test_facets_count_the_filtered_products(self):
+        facets = self.client.get(reverse('crop-list'), {'price_max': 100, 'facets': 1}).data['facets']
+        self.assertEqual(facets['category'], [{'id': self.vegetables.pk, 'count': 6}, {'id': self.fruits.pk, 'count': 1}])
+        self.assertEqual(facets['farm'], [{'id': self.farm.pk, 'count': 3}, {'id': self.other_farm.pk, 'count': 4}])
+        self.assertEqual(facets['stock'], {'in_stock': 5, 'out_of_stock': 2})
+        self.assertEqual(facets['price'], [{'bucket': '0-10', 'count': 6}, {'bucket': '50-100', 'count': 1}])
+        facets = self.client.get(reverse('machinery-list'), {'farm': self.farm.pk, 'facets': 1}).data['facets']
+        self.assertEqual((facets['category'], facets['price']), ([], [{'bucket': '1000-5000', 'count': 3}]))
+
+    def test_facets_are_opt_in_and_skip_cursor_pages(self):
+        self.assertNotIn('facets', self.client.get(reverse('crop-list')).data)
+        self.assertNotIn('facets', self.client.get(reverse('crop-list'), {'facets': 1, 'cursor': ''}).data)
+
+
+class PaginationTests(APITestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        farm, = create_catalog(owner, CropCategory.objects.create(name='Vegetables'), products_per_farm=0)
+        # duplicate names, so pages must break the ties on id
+        for i in range(25):
+            Item.objects.create(name=f'Jar {i % 4}', farm=farm, stock=1, price=float(i % 3))
+        self.client.force_authenticate(owner)
+
+    def walk(self, **params):
+        ids, pages = [], 0
+        response = self.client.get(reverse('item-list'), {'cursor': '', 'page_size': 4, **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(row['id'] for row in response.data['results'])
+            pages += 1
+            if response.data['next'] is None:
+                return ids, pages
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_pages_visit_every_row_once_in_order(self):
+        ids, pages = self.walk()
+        self.assertEqual(pages, 7)
+        self.assertEqual(ids, list(Item.objects.order_by('name', 'id').values_list('id', flat=True)))
+        ids, _ = self.walk(ordering='-price')
+        self.assertEqual(ids, list(Item.objects.order_by('-price', '-id').values_list('id', flat=True)))
+
+    def test_page_numbers_and_page_size_cap(self):
+        response = self.client.get(reverse('item-list'), {'page': 2, 'page_size': 10})
+        self.assertEqual((response.data['count'], len(response.data['results'])), (25, 10))
+        self.assertIsNotNone(response.data['previous'])
+        self.assertIsNotNone(response.data['next'])
+        with mock.patch.object(CatalogPagination, 'max_page_size', 6):
+            for params in ({'page_size': 1000}, {'cursor': '', 'page_size': 1000}):
+                self.assertEqual(len(self.client.get(reverse('item-list'), params).data['results']), 6)
+
+    def test_bad_cursors_are_not_found(self):
+        for cursor in ('not base64!', 'bm90IGpzb24', 'WzFd'):
+            response = self.client.get(reverse('item-list'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+class ProductIndexTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        self.farm, = create_catalog(self.owner, CropCategory.objects.create(name='Vegetables'), products_per_farm=3)
+        self.client.force_authenticate(self.owner)
+
+    def entry(self, product):
+        return ProductIndex.objects.filter(product_type=product._meta.model_name, product_id=product.pk).first()
+
+    def test_signals_keep_the_index_in_sync(self):
+        crop = Crop.objects.create(name='Carrot', category=CropCategory.objects.get(), farm=self.farm, stock=4, price=0.8)
+        self.assertEqual((self.entry(crop).name, self.entry(crop).price), ('Carrot', 0.8))
+        crop.price = 1.2
+        crop.stock = 0
+        crop.save()
+        self.assertEqual((self.entry(crop).price, self.entry(crop).stock), (1.2, 0))
+        machine = Machinery.objects.filter(farm=self.farm).first()
+        machine.delete()
+        self.assertIsNone(self.entry(machine))
+        self.assertEqual(find_index_drift(), {'missing': [], 'stale': [], 'orphaned': []})
+
+    def test_rows_carry_type_specific_fields(self):
+        Machinery.objects.filter(farm=self.farm).update(is_new=False)
+        rebuild_product_index()
+        rows = self.client.get(reverse('farm-all-products', kwargs={'farm_id': self.farm.pk}), {'page_size': 50}).data['results']
+        machine = next(row for row in rows if row['type'] == 'machinery')
+        self.assertEqual((machine['producer'], machine['is_new']), ('Kubota', False))
+        crop = next(row for row in rows if row['type'] == 'crop')
+        self.assertEqual((crop['producer'], crop['is_new']), (None, None))
+
+    def test_bulk_reindexing_keeps_row_ids(self):
+        pks = list(Crop.objects.filter(farm=self.farm).values_list('pk', flat=True))
+        ids = dict(ProductIndex.objects.filter(product_type='crop').values_list('product_id', 'id'))
+        # queryset writes skip the signals, as bulk writes do
+        Crop.objects.filter(pk=pks[0]).update(stock=42)
+        ProductIndex.objects.create(product_type='crop', product_id=9999, name='Gone', farm=self.farm, stock=1)
+        index_products(Crop, [*pks, 9999])
+        self.assertEqual(ProductIndex.objects.get(product_type='crop', product_id=pks[0]).stock, 42)
+        self.assertEqual(dict(ProductIndex.objects.filter(product_type='crop').values_list('product_id', 'id')), ids)
+
+    def test_check_reports_drift_and_rebuild_repairs_it(self):
+        crop, item = Crop.objects.first(), Item.objects.first()
+        # queryset writes skip the signals
+        ProductIndex.objects.filter(product_type='crop', product_id=crop.pk).update(price=99)
+        ProductIndex.objects.filter(product_type='item', product_id=item.pk).delete()
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, 'Index drift: 1 missing, 1 stale, 0 orphaned.'):
+            call_command('rebuild_product_index', '--check', stdout=out)
+        self.assertIn(f'stale: crop #{crop.pk}', out.getvalue())
+
+        call_command('rebuild_product_index', stdout=out)
+        self.assertIn('Product index is in sync.', out.getvalue())
+        self.assertEqual(self.entry(crop).price, crop.price)
+
+    def test_cursor_pages_by_price_keep_unpriced_products_last(self):
+        Item.objects.filter(farm=self.farm, stock__gt=0).update(price=None)
+        rebuild_product_index()
+        for ordering in ('price', '-price'):
+            ids, url = [], reverse('all')
+            params = {'cursor': '', 'page_size': 2, 'ordering': ordering}
+            while url:
+                data = self.client.get(url, params).data
+                ids.extend((row['type'], row['id']) for row in data['results'])
+                url, params = data['next'], None
+            expected = ProductIndex.objects.order_by(*get_order_by(ProductIndex, CatalogListMixin.orderings[ordering]))
+            self.assertEqual(ids, [(row.product_type, row.product_id) for row in expected])
+            self.assertEqual(len(ids), 9)
+            self.assertEqual(ProductIndex.objects.get(product_type=ids[-1][0], product_id=ids[-1][1]).price, None)
+
+
+class FarmSummaryTests(APITestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        self.farm, = create_catalog(owner, CropCategory.objects.create(name='Vegetables'), products_per_farm=3)
+        self.empty = Farm.objects.create(name='Empty farm', description='', owner=owner, address='Ganja')
+        Item.objects.create(name='Unpriced jar', farm=self.farm, stock=5)
+
+    def test_summarizes_products_per_type(self):
+        farms = {farm['id']: farm['products'] for farm in self.client.get(reverse('farm-list')).data['results']}
+        self.assertEqual(farms[self.farm.pk], {
+            'crop': {'count': 3, 'in_stock': 2, 'min_price': 1.5, 'max_price': 3.5},
+            'item': {'count': 4, 'in_stock': 3, 'min_price': 2.0, 'max_price': 4.0},
+            'machinery': {'count': 3, 'in_stock': 3, 'min_price': 1000.0, 'max_price': 1002.0},
+        })
+        empty = {'count': 0, 'in_stock': 0, 'min_price': None, 'max_price': None}
+        self.assertEqual(farms[self.empty.pk], {'crop': empty, 'item': empty, 'machinery': empty})
+
+    def test_detail_summary_matches_the_list(self):
+        self.assertEqual(
+            FarmSummarySerializer(self.farm).data['products'],
+            summarize_farm_products([self.farm.pk, self.empty.pk])[self.farm.pk],
+        )
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        self.category = CropCategory.objects.create(name='Vegetables')
+        self.farm, = create_catalog(owner, self.category)
+        self.client.force_authenticate(owner)
+
+    def search(self, query):
+        response = self.client.get(reverse('search'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [(row['type'], row['id']) for row in response.data['results']]
+
+    def test_ranks_name_matches_across_types(self):
+        machine = Machinery.objects.create(name='Seeder', producer='Kubota', farm=self.farm, stock=1, price=10.0)
+        results = self.search('kubo')
+        self.assertEqual(len(results), 3)
+        self.assertEqual(self.search('seeder'), [('machinery', machine.pk)])
+        self.assertIn(('farm', self.farm.pk), self.search('family farm'))
+
+    def test_index_follows_updates_and_deletes(self):
+        crop = Crop.objects.filter(farm=self.farm).first()
+        crop.name = 'Pomegranate'
+        crop.save()
+        self.assertEqual(self.search('pomegr'), [('crop', crop.pk)])
+        crop.delete()
+        self.assertEqual(self.search('pomegranate'), [])
+
+    def test_best_matches_survive_the_result_cap(self):
+        # body-only matches with lower rowids than the exact name match
+        for i in range(10):
+            Crop.objects.create(name=f'Seedling {i}', description='grows into a tomato', category=self.category, farm=self.farm, stock=1)
+        crop = Crop.objects.create(name='Tomato', category=self.category, farm=self.farm, stock=1, price=1.0)
+        with mock.patch.object(search_module, 'MAX_RESULTS', 3):
+            self.assertIn(('crop', crop.pk), self.search('tomato'))
+
+    def test_query_is_required(self):
+        response = self.client.get(reverse('search'))
+        self.assertEqual(response.status_code, 400)
+
+
+class AutocompleteTests(APITestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        category = CropCategory.objects.create(name='Tomatoes')
+        self.farm, = create_catalog(owner, category)
+        self.client.force_authenticate(owner)
+        autocomplete.reset_index()
+
+    def suggest(self, query):
+        response = self.client.get(reverse('autocomplete'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [(row['type'], row['name']) for row in response.data['results']]
+
+    def test_matches_word_prefixes_by_popularity(self):
+        self.assertEqual(self.suggest('tom')[0], ('category', 'Tomatoes'))
+        self.assertIn(('crop', 'Tomato 1'), self.suggest('tom'))
+        self.assertEqual(self.suggest('tractor 1'), [('machinery', 'Tractor 1')])
+
+    def test_follows_saves_and_deletes(self):
+        self.suggest('x')
+        crop = Crop.objects.filter(farm=self.farm).first()
+        crop.name = 'Cherry tomato'
+        crop.save()
+        self.assertIn(('crop', 'Cherry tomato'), self.suggest('cher'))
+        crop.delete()
+        self.assertEqual(self.suggest('cher'), [])
+
+    def test_renames_drop_memoized_prefixes_of_the_old_name(self):
+        index = autocomplete.PrefixIndex()
+        index.load(('crop', pk, f'tomato {pk}', 0) for pk in range(autocomplete.CACHED_RANGE_SIZE + 1))
+        self.assertIn(('crop', 0, 'tomato 0'), index.suggest('tom'))
+        index.add('crop', 0, 'cucumber')
+        self.assertNotIn(0, [pk for _, pk, _ in index.suggest('tom', limit=autocomplete.MAX_SUGGESTIONS)])
+        self.assertEqual(index.suggest('cuc'), [('crop', 0, 'cucumber')])
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        CropCategory.objects.create(name='Vegetables')
+        self.client.force_authenticate(self.user)
+
+    def test_serves_repeated_reads_from_cache_until_a_write(self):
+        url = reverse('category-list')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.data, second.data)
+        self.client.get(url, {'page_size': 5})
+
+        CropCategory.objects.create(name='Fruits')
+        self.assertEqual(self.client.get(url).data['count'], 2)
+        self.assertEqual(get_stats(), {'hits': 1, 'misses': 3, 'hit_ratio': 0.25})
+
+    def test_keeps_each_representation_apart(self):
+        url = reverse('category-list')
+        cold = {
+            accept: self.client.get(url, HTTP_ACCEPT=accept)
+            for accept in ('application/json', 'application/msgpack')
+        }
+        for accept, response in cold.items():
+            warm = self.client.get(url, HTTP_ACCEPT=accept)
+            self.assertEqual(warm['Content-Type'], response['Content-Type'])
+            self.assertEqual(warm['ETag'], response['ETag'])
+        self.assertNotEqual(cold['application/json']['ETag'], cold['application/msgpack']['ETag'])
+        self.assertEqual(get_stats()['hits'], 2)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        self.category = CropCategory.objects.create(name='Vegetables')
+        self.farm, = create_catalog(owner, self.category)
+        self.client.force_authenticate(owner)
+
+    def test_list_revalidates_with_etag(self):
+        url = reverse('crop-list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # a change to a related row shows up in the nested representation
+        self.farm.name = 'Renamed farm'
+        self.farm.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_etag_needs_no_query_over_the_rows(self):
+        url = reverse('farm-crops', kwargs={'farm_id': self.farm.pk})
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # deleting a row does not move MAX(updated_at), but bumps the version
+        Crop.objects.filter(farm=self.farm).first().delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_farm_lists_revalidate_after_an_owner_edit(self):
+        owner = self.farm.owner
+        for url in (reverse('farm-list'), reverse('user-farms')):
+            etag = self.client.get(url)['ETag']
+            owner.first_name = owner.first_name + 'a'
+            owner.save()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_revalidates_with_last_modified(self):
+        crop = Crop.objects.filter(farm=self.farm).first()
+        url = reverse('crop-detail', kwargs={'pk': crop.pk})
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+
+class SyncTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = CropCategory.objects.create(name='Vegetables')
+            self.farm, = create_catalog(self.owner, self.category)
+        self.client.force_authenticate(self.owner)
+
+    def sync(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        response = self.client.get(reverse('sync'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_first_sync_returns_the_catalog(self):
+        data = self.sync()
+        self.assertEqual(len(data['changes']['crop']), 2)
+        self.assertEqual(len(data['changes']['machinery']), 2)
+        self.assertEqual([farm['id'] for farm in data['changes']['farm']], [self.farm.pk])
+        self.assertEqual(data['deleted'], {})
+        self.assertEqual(self.sync(data['next'])['changes'], {})
+
+    def test_returns_each_changed_object_once_and_tombstones(self):
+        token = self.sync()['next']
+        crop, other = Crop.objects.filter(farm=self.farm)
+        with self.captureOnCommitCallbacks(execute=True):
+            crop.price = 9.0
+            crop.save()
+            crop.stock = 0
+            crop.save()
+        other_pk = other.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+
+        data = self.sync(token)
+        self.assertEqual([(row['id'], row['price'], row['stock']) for row in data['changes']['crop']], [(crop.pk, 9.0, 0)])
+        self.assertEqual(data['deleted'], {'crop': [other_pk]})
+        self.assertEqual(ChangeLog.objects.filter(kind='crop', object_id=crop.pk).count(), 1)
+
+    def test_logs_changes_in_the_same_transaction(self):
+        crop = Crop.objects.filter(farm=self.farm).first()
+        before = ChangeLog.objects.count()
+        latest = ChangeLog.objects.latest('seq').seq
+        try:
+            with transaction.atomic():
+                crop.name = 'Renamed'
+                crop.save()
+                # written before commit, without waiting for an on_commit hook
+                self.assertTrue(ChangeLog.objects.filter(kind='crop', object_id=crop.pk, seq__gt=latest).exists())
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual((ChangeLog.objects.count(), ChangeLog.objects.latest('seq').seq), (before, latest))
+
+    def test_pages_through_the_log(self):
+        data = self.sync(limit=4)
+        self.assertTrue(data['has_more'])
+        seen = sum(len(rows) for rows in data['changes'].values())
+        while data['has_more']:
+            data = self.sync(data['next'], limit=4)
+            seen += sum(len(rows) for rows in data['changes'].values())
+        self.assertEqual(seen, 8)
+
+    def test_rejects_malformed_tokens(self):
+        for since in ('yesterday', '1.2.3', '.5', '-1'):
+            self.assertEqual(self.client.get(reverse('sync'), {'since': since}).status_code, 400)
+
+    def test_waits_for_transactions_still_running(self):
+        # as on PostgreSQL: transaction 20 took a lower seq but commits after 30
+        crop, other = Crop.objects.filter(farm=self.farm)
+        token = self.sync()['next']
+        late = ChangeLog.objects.create(kind='crop', object_id=crop.pk, txid=20)
+        ChangeLog.objects.create(kind='crop', object_id=other.pk, txid=30)
+        with mock.patch.object(sync, 'get_horizon', return_value=20):
+            self.assertEqual(self.sync(token)['changes'], {})
+        with mock.patch.object(sync, 'get_horizon', return_value=31):
+            data = self.sync(token)
+        self.assertEqual([row['id'] for row in data['changes']['crop']], [crop.pk, other.pk])
+        self.assertEqual(data['next'], f'30.{late.seq + 1}')
+        self.assertEqual(self.sync(data['next'])['changes'], {})
+
+
+class ValuesSerializerTests(APITestCase):
+    def test_matches_model_serializers(self):
+        owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        create_catalog(owner, CropCategory.objects.create(name='Vegetables'))
+        crop = Crop.objects.first()
+        crop.image = 'crops/tomato.jpg'
+        crop.save()
+        context = {'request': Request(APIRequestFactory().get('/api/crops/'))}
+        pairs = (
+            (Crop, CropSerializer, CropValuesSerializer),
+            (Item, ItemSerializer, ItemValuesSerializer),
+            (Machinery, MachinerySerializer, MachineryValuesSerializer),
+            (ProductIndex, ProductIndexSerializer, ProductIndexValuesSerializer),
+        )
+        for model, serializer_class, values_serializer_class in pairs:
+            with self.subTest(model=model.__name__):
+                queryset = model.objects.order_by('id')
+                lean = values_serializer_class(context)
+                self.assertEqual(
+                    lean.serialize(lean.select(queryset)),
+                    serializer_class(queryset, many=True, context=context).data,
+                )
+
+
+class SparseFieldsTests(APITestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        self.farm, = create_catalog(owner, CropCategory.objects.create(name='Vegetables'))
+        self.crop = Crop.objects.filter(farm=self.farm).first()
+        self.client.force_authenticate(owner)
+
+    def test_list_selects_fields_and_collapses_relations(self):
+        response = self.client.get(reverse('crop-list'), {'fields': 'name,price,farm', 'expand': ''})
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'name', 'price', 'farm'})
+        self.assertEqual(row['farm'], self.farm.pk)
+
+        response = self.client.get(reverse('crop-list'), {'fields': 'name,farm', 'expand': 'farm'})
+        self.assertEqual(response.data['results'][0]['farm']['name'], self.farm.name)
+
+    def test_detail_drops_joins_of_collapsed_relations(self):
+        url = reverse('crop-detail', kwargs={'pk': self.crop.pk})
+        self.assertEqual(self.client.get(url).data['category']['name'], 'Vegetables')
+        with self.assertNumQueries(1) as queries:
+            response = self.client.get(url, {'expand': 'category'})
+        self.assertNotIn('"api_farm"', queries.captured_queries[0]['sql'])
+        self.assertEqual(response.data['farm'], self.farm.pk)
+        self.assertEqual(response.data['category']['name'], 'Vegetables')
+
+    def test_farm_products_collapse_to_ids(self):
+        response = self.client.get(reverse('farm-detail', kwargs={'pk': self.farm.pk}), {'expand': 'owner'})
+        self.assertEqual(sorted(response.data['crops']), sorted(self.farm.crops.values_list('pk', flat=True)))
+        self.assertEqual(response.data['owner']['email'], 'owner@example.com')
+
+
+class MessagePackTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        self.category = CropCategory.objects.create(name='Vegetables')
+        self.farm, = create_catalog(self.owner, self.category)
+        self.client.force_authenticate(self.owner)
+
+    def get_both(self, url, params=None):
+        as_json = self.client.get(url, params, HTTP_ACCEPT='application/json')
+        as_msgpack = self.client.get(url, params, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(as_msgpack['Content-Type'], 'application/msgpack')
+        self.assertEqual(as_msgpack.status_code, as_json.status_code)
+        self.assertEqual(msgpack.unpackb(as_msgpack.content), json.loads(as_json.content))
+        return as_json.status_code
+
+    def test_responses_match_json(self):
+        self.assertEqual(self.get_both(reverse('crop-list'), {'page_size': 1}), 200)
+        self.assertEqual(self.get_both(reverse('farm-detail', kwargs={'pk': self.farm.pk})), 200)
+        self.assertEqual(self.get_both(reverse('crop-detail', kwargs={'pk': 0})), 404)
+        self.assertEqual(self.get_both(reverse('sync'), {'since': 'yesterday'}), 400)
+
+    def test_accepts_request_bodies(self):
+        payload = {'name': 'Pepper', 'category_id': self.category.pk, 'farm_id': self.farm.pk, 'stock': 3, 'price': 2.5}
+        response = self.client.post(
+            reverse('add-crop'), msgpack.packb(payload),
+            content_type='application/msgpack', HTTP_ACCEPT='application/msgpack',
+        )
+        self.assertEqual(response.status_code, 201)
+        crop = msgpack.unpackb(response.content)
+        self.assertEqual((crop['name'], crop['price'], crop['farm']['id']), ('Pepper', 2.5, self.farm.pk))
+
+        response = self.client.patch(
+            reverse('crop-update', kwargs={'pk': crop['id']}), msgpack.packb({'stock': 0}),
+            content_type='application/msgpack',
+        )
+        self.assertEqual(response.data['in_stock'], False)
+
+        response = self.client.patch(
+            reverse('crop-update', kwargs={'pk': crop['id']}), b'\xc1',
+            content_type='application/msgpack',
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class CompressionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        self.farm, = create_catalog(owner, CropCategory.objects.create(name='Vegetables'), products_per_farm=20)
+        self.client.force_authenticate(owner)
+
+    def test_compresses_large_responses(self):
+        url = reverse('all')
+        plain = self.client.get(url, {'page_size': 60})
+        self.assertNotIn('Content-Encoding', plain)
+
+        for encoding, decompress in (('gzip', gzip.decompress), ('br', brotli.decompress)):
+            with self.subTest(encoding=encoding):
+                response = self.client.get(url, {'page_size': 60}, HTTP_ACCEPT_ENCODING=f'{encoding}, identity')
+                self.assertEqual(response['Content-Encoding'], encoding)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+                self.assertEqual(decompress(response.content), plain.content)
+
+    def test_small_responses_stay_plain(self):
+        response = self.client.get(reverse('farm-detail', kwargs={'pk': self.farm.pk}), {'fields': 'name'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_cached_responses_are_compressed_once(self):
+        url = reverse('all')
+        with mock.patch.object(compression, 'compress', wraps=compression.compress) as compress:
+            first = self.client.get(url, {'page_size': 60}, HTTP_ACCEPT_ENCODING='gzip')
+            second = self.client.get(url, {'page_size': 60}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compress.call_count, 1)
+        self.assertEqual(first.content, second.content)
+
+
+class ProductImportTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        self.category = CropCategory.objects.create(name='Vegetables')
+        self.farm, = create_catalog(self.owner, self.category)
+        self.client.force_authenticate(self.owner)
+        self.url = reverse('import-products')
+
+    def rows(self, count, start=0):
+        return [
+            {'type': 'crop', 'farm_id': self.farm.pk, 'name': f'Onion {i}', 'category': 'vegetables', 'stock': i, 'price': 1.0}
+            for i in range(start, start + count)
+        ]
+
+    def test_upserts_json_rows_and_reports_errors(self):
+        other_farm = Farm.objects.create(
+            name='Other', description='', address='Ganja',
+            owner=User.objects.create_user(email='other@example.com', password='secret', first_name='V', last_name='A'),
+        )
+        existing = Item.objects.filter(farm=self.farm).first()
+        rows = self.rows(2) + [
+            {'type': 'item', 'farm_id': self.farm.pk, 'name': existing.name, 'price': 9.5},
+            {'type': 'machinery', 'farm_id': self.farm.pk, 'name': 'Seeder', 'stock': 1, 'producer': 'Kubota'},
+            {'type': 'crop', 'farm_id': other_farm.pk, 'name': 'Stolen', 'category_id': self.category.pk, 'stock': 1},
+            {'type': 'crop', 'farm_id': self.farm.pk, 'name': 'Nameless category', 'stock': 1},
+            {'type': 'boat', 'farm_id': self.farm.pk, 'name': 'Boat', 'stock': 1},
+        ]
+        response = self.client.post(self.url, rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['failed']), (3, 1, 3))
+        self.assertEqual([error['row'] for error in response.data['errors']], [5, 6, 7])
+
+        existing.refresh_from_db()
+        self.assertEqual(existing.price, 9.5)
+        self.assertEqual(self.client.get(reverse('search'), {'q': 'seeder'}).data['count'], 1)
+        self.assertTrue(ProductIndex.objects.filter(product_type='crop', name='Onion 1', stock=1).exists())
+
+    def test_imports_csv_bodies_and_uploads(self):
+        crop = Crop.objects.filter(farm=self.farm).first()
+        body = (
+            'type,id,farm_id,name,category,stock,price\n'
+            f'crop,{crop.pk},,,,7,\n'
+            f'crop,,{self.farm.pk},Garlic,Vegetables,3,4.5\n'
+        )
+        response = self.client.post(self.url, body.encode(), content_type='text/csv')
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['failed']), (1, 1, 0))
+        crop.refresh_from_db()
+        self.assertEqual(crop.stock, 7)
+
+        upload = SimpleUploadedFile('products.csv', body.encode(), content_type='text/csv')
+        response = self.client.post(self.url, {'file': upload}, format='multipart')
+        self.assertEqual((response.data['created'], response.data['updated']), (0, 2))
+
+    def test_undecodable_csv_is_a_parse_error(self):
+        body = f'type,farm_id,name,category,stock\ncrop,{self.farm.pk},Garlic,Vegetables,3\n'.encode()
+        body += b'crop,%d,Onion \xff\xfe,Vegetables,3\n' % self.farm.pk
+        count = Crop.objects.count()
+        response = self.client.post(self.url, body, content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('not valid utf-8', response.data['detail'])
+        # the import runs in one transaction, so the good first row is not kept either
+        self.assertEqual(Crop.objects.count(), count)
+
+        upload = SimpleUploadedFile('products.csv', body, content_type='text/csv')
+        self.assertEqual(self.client.post(self.url, {'file': upload}, format='multipart').status_code, 400)
+
+    def test_queries_are_batched(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(self.url, self.rows(5), format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(self.url, self.rows(200, start=5), format='json')
+        # only SQLite's limit on parameters per INSERT splits the larger batch
+        self.assertLess(len(large.captured_queries), len(small.captured_queries) + 5)
+
+
+class StockAdjustmentTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        self.farm, = create_catalog(self.owner, CropCategory.objects.create(name='Vegetables'), products_per_farm=4)
+        self.client.force_authenticate(self.owner)
+        self.url = reverse('adjust-products')
+
+    def test_applies_grouped_updates(self):
+        crops = list(Crop.objects.filter(farm=self.farm).order_by('id'))
+        machine = Machinery.objects.filter(farm=self.farm).first()
+        operations = [{'type': 'crop', 'id': crop.pk, 'stock_delta': 10} for crop in crops]
+        operations.append({'type': 'machinery', 'id': machine.pk, 'stock': 0, 'price_pct': -10})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, operations, format='json')
+        # one UPDATE per distinct change, not per product
+        updates = [query for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual((response.data['updated'], response.data['failed']), (5, 0))
+        self.assertEqual(
+            list(Crop.objects.filter(farm=self.farm).order_by('id').values_list('stock', flat=True)),
+            [crop.stock + 10 for crop in crops],
+        )
+        machine_price = machine.price
+        machine.refresh_from_db()
+        self.assertEqual((machine.stock, machine.price), (0, machine_price * 0.9))
+        self.assertEqual(ProductIndex.objects.get(product_type='machinery', product_id=machine.pk).stock, 0)
+
+    def test_reports_rows_it_cannot_apply(self):
+        stranger = User.objects.create_user(email='other@example.com', password='secret', first_name='V', last_name='A')
+        foreign, = create_catalog(stranger, CropCategory.objects.first(), products_per_farm=1)
+        item = Item.objects.filter(farm=self.farm, stock=1).first()
+        operations = [
+            {'type': 'item', 'id': item.pk, 'stock_delta': -5},
+            {'type': 'item', 'id': foreign.items.first().pk, 'stock': 100},
+            {'type': 'item', 'id': item.pk, 'price': 3},
+            {'type': 'item', 'id': item.pk + 1000, 'stock': 1, 'price': 2, 'price_pct': 5},
+        ]
+        response = self.client.post(self.url, operations, format='json')
+        self.assertEqual((response.data['updated'], response.data['failed']), (0, 4))
+        item.refresh_from_db()
+        self.assertEqual(item.stock, 1)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='bi@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        create_catalog(self.user, CropCategory.objects.create(name='Vegetables'), farm_count=2, products_per_farm=3)
+        self.client.force_authenticate(self.user)
+
+    def read(self, dataset, fmt):
+        response = self.client.get(reverse('export', kwargs={'dataset': dataset, 'fmt': fmt}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_streams_ndjson(self):
+        lines = self.read('products', 'ndjson').splitlines()
+        self.assertEqual(len(lines), ProductIndex.objects.count())
+        row = json.loads(lines[0])
+        self.assertEqual(set(row), {'type', 'id', 'name', 'farm_id', 'category_id', 'price', 'stock', 'is_new', 'producer', 'updated_at'})
+
+    def test_streams_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.read('farms', 'csv'))))
+        self.assertEqual([row['name'] for row in rows], ['Farm 0', 'Farm 1'])
+        self.assertEqual(rows[0]['owner_id'], str(self.user.pk))
+
+    def test_reads_in_chunks(self):
+        export = ProductExport(chunk_size=4)
+        with CaptureQueriesContext(connection) as queries:
+            chunks = list(export.iter_chunks())
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 4, 4, 4, 2])
+        self.assertEqual(len(queries), 1)
+
+    def test_unknown_dataset(self):
+        response = self.client.get(reverse('export', kwargs={'dataset': 'users', 'fmt': 'csv'}))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(IMAGE_DERIVATIVES_ASYNC=False, IMAGE_DERIVATIVE_WIDTHS=(160, 320))
+class ImageDerivativeTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        self.farm = Farm.objects.create(name='Farm', description='Family farm', owner=owner, address='Baku')
+        self.category = CropCategory.objects.create(name='Vegetables')
+        self.client.force_authenticate(owner)
+
+    def photo(self, name):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def add_crop(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Crop.objects.create(
+                name='Tomato', category=self.category, farm=self.farm, stock=1, image=self.photo('tomato.jpg'),
+            )
+
+    def test_renders_derivatives_after_upload(self):
+        crop = self.add_crop()
+        data = self.client.get(reverse('crop-detail', kwargs={'pk': crop.pk})).data
+        self.assertEqual(set(data['images']), {'webp', 'jpeg'})
+        self.assertEqual(set(data['images']['webp']), {'160w', '320w'})
+
+        for fmt, width, name in images.get_derivative_names(crop.image.name):
+            with default_storage.open(name) as file, Image.open(file) as image:
+                self.assertEqual(image.width, width)
+                self.assertEqual(image.format, {'webp': 'WEBP', 'jpeg': 'JPEG'}[fmt])
+                self.assertFalse(image.getexif())
+            self.assertTrue(data['images'][fmt][f'{width}w'].endswith(default_storage.url(name)))
+
+    def test_replacing_an_image_drops_old_derivatives(self):
+        crop = self.add_crop()
+        old_name = crop.image.name
+        crop.image = self.photo('tomato-new.jpg')
+        with self.captureOnCommitCallbacks(execute=True):
+            crop.save()
+        self.assertTrue(images.has_derivatives(crop.image.name))
+        self.assertFalse(any(default_storage.exists(name) for _, _, name in images.get_derivative_names(old_name)))
+
+    def test_backfill_command(self):
+        crop = self.add_crop()
+        images.delete_derivatives(crop.image.name)
+        out = io.StringIO()
+        call_command('generate_image_derivatives', stdout=out)
+        self.assertIn('Rendered 1 images, skipped 0', out.getvalue())
+        self.assertTrue(images.has_derivatives(crop.image.name))
+
+
+class MediaServingTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.name = default_storage.save('crops/tomato.txt', ContentFile(b'0123456789'))
+
+    def test_uploads_get_content_hashed_names(self):
+        self.assertRegex(self.name, r'^crops/tomato\.[0-9a-f]{12}\.txt$')
+
+    def test_serves_byte_ranges(self):
+        url = f'/media/{self.name}'
+        response = self.client.get(url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        response = self.client.get(url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=20-').status_code, 416)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='nginx')
+    def test_offloads_to_the_web_server(self):
+        response = self.client.get(f'/media/{self.name}', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_rejects_paths_outside_media_root(self):
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/crops/missing.jpg').status_code, 404)
+
+    def test_static_files_are_precompressed(self):
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        storage = CompressedManifestStaticFilesStorage(location=static_root)
+        storage.save('app.css', ContentFile(b'body { color: red; }\n' * 100))
+        list(storage.post_process({'app.css': (storage, 'app.css')}))
+        hashed = storage.stored_name('app.css')
+        self.assertNotEqual(hashed, 'app.css')
+        self.assertTrue(storage.exists(hashed + '.gz'))
+        self.assertTrue(storage.exists(hashed + '.br'))
+
+
+@override_settings(IMAGE_DERIVATIVES_ASYNC=False, IMAGE_DERIVATIVE_WIDTHS=(160,))
+class ResumableUploadTests(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        self.farm, = create_catalog(self.owner, CropCategory.objects.create(name='Vegetables'), products_per_farm=1)
+        self.crop = self.farm.crops.get()
+        self.client.force_authenticate(self.owner)
+        buffer = io.BytesIO()
+        Image.new('RGB', (400, 300), 'green').save(buffer, 'PNG')
+        self.photo = buffer.getvalue()
+
+    def start(self, **data):
+        data = {'type': 'crop', 'target_id': self.crop.pk, 'filename': 'field.png', 'size': len(self.photo), **data}
+        return self.client.post(reverse('upload-create'), data, format='json')
+
+    def put(self, session_id, start, body):
+        return self.client.put(
+            reverse('upload-detail', kwargs={'pk': session_id}), body,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{start + len(body) - 1}/{len(self.photo)}',
+        )
+
+    def test_chunked_upload_replaces_the_image(self):
+        session_id = self.start().data['id']
+        middle = len(self.photo) // 2
+        self.assertEqual(self.put(session_id, middle, self.photo[middle:]).status_code, 409)
+        self.assertEqual(self.put(session_id, 0, self.photo[:middle]).data['offset'], middle)
+        self.assertEqual(self.client.get(reverse('upload-detail', kwargs={'pk': session_id})).data['offset'], middle)
+        self.assertEqual(self.put(session_id, middle, self.photo[middle:]).data['offset'], len(self.photo))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('upload-complete', kwargs={'pk': session_id}))
+        self.assertEqual(response.status_code, 200)
+        self.crop.refresh_from_db()
+        self.assertRegex(self.crop.image.name, r'^crops/field\.[0-9a-f]{12}\.png$')
+        with self.crop.image.open('rb') as file:
+            self.assertEqual(file.read(), self.photo)
+        self.assertTrue(images.has_derivatives(self.crop.image.name))
+        self.assertEqual(ProductIndex.objects.get(product_type='crop', product_id=self.crop.pk).image, self.crop.image.name)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_an_interrupted_chunk_keeps_what_arrived(self):
+        session_id = self.start().data['id']
+        response = self.client.put(
+            reverse('upload-detail', kwargs={'pk': session_id}), self.photo[:100],
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes 0-{len(self.photo) - 1}/{len(self.photo)}',
+        )
+        self.assertEqual(response.data['offset'], 100)
+        response = self.client.post(reverse('upload-complete', kwargs={'pk': session_id}))
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_own_products(self):
+        stranger = User.objects.create_user(email='other@example.com', password='secret', first_name='V', last_name='A')
+        self.client.force_authenticate(stranger)
+        self.assertEqual(self.start().status_code, 400)
+        self.assertEqual(self.start(filename='field.exe').status_code, 400)
+
+
+class CartQuoteTests(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(email='buyer@example.com', password='secret', first_name='Leyla', last_name='Mammadova')
+        self.farms = create_catalog(user, CropCategory.objects.create(name='Vegetables'), farm_count=2, products_per_farm=10)
+        self.client.force_authenticate(user)
+
+    def test_quotes_a_cart_in_three_queries(self):
+        lines = [
+            {'type': product_type, 'id': product.pk, 'quantity': 1}
+            for farm in self.farms
+            for product_type, products in (('crop', farm.crops), ('item', farm.items), ('machinery', farm.machines))
+            for product in products.filter(stock__gt=0)
+        ]
+        ContentType.objects.get_for_models(Crop, Item, Machinery)
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse('cart-quote'), lines, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([farm['id'] for farm in response.data['farms']], [farm.pk for farm in self.farms])
+        self.assertEqual(sum(len(farm['lines']) for farm in response.data['farms']), len(lines))
+        self.assertTrue(response.data['available'])
+        expected = sum(product.price for farm in self.farms for products in (farm.crops, farm.items, farm.machines) for product in products.filter(stock__gt=0))
+        self.assertAlmostEqual(response.data['total'], expected)
+
+    def test_reports_short_stock_and_missing_products(self):
+        crop = self.farms[0].crops.get(stock=2)
+        lines = [
+            {'type': 'crop', 'id': crop.pk, 'quantity': 2},
+            {'type': 'crop', 'id': crop.pk, 'quantity': 1},
+            {'type': 'item', 'id': 10 ** 6, 'quantity': 1},
+        ]
+        response = self.client.post(reverse('cart-quote'), lines, format='json')
+        line, = response.data['farms'][0]['lines']
+        self.assertEqual((line['quantity'], line['available'], line['content_type']), (3, False, 'crop'))
+        self.assertEqual(response.data['missing'], [{'type': 'item', 'id': 10 ** 6, 'quantity': 1}])
+        self.assertEqual((response.data['available'], response.data['total']), (False, 0))
+
+    def test_validates_lines(self):
+        self.assertEqual(self.client.post(reverse('cart-quote'), [], format='json').status_code, 400)
+        response = self.client.post(reverse('cart-quote'), [{'type': 'tractor', 'id': 1, 'quantity': 0}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class BatchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='secret', first_name='Leyla', last_name='Mammadova')
+        self.farm, = create_catalog(self.user, CropCategory.objects.create(name='Vegetables'))
+        self.client.force_authenticate(self.user)
+
+    def batch(self, requests):
+        return self.client.post(reverse('batch'), requests, format='json')
+
+    def test_runs_sub_requests_in_order(self):
+        farm_url = reverse('farm-detail', kwargs={'pk': self.farm.pk})
+        response = self.batch([
+            {'url': farm_url},
+            {'url': reverse('farm-all-products', kwargs={'farm_id': self.farm.pk}) + '?page_size=1'},
+            {'url': '/locations/'},
+            {'url': '/api/nowhere/'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([sub['status'] for sub in response.data], [200, 200, 200, 404])
+        self.assertEqual(response.data[0]['body']['name'], self.farm.name)
+        self.assertEqual(len(response.data[1]['body']['results']), 1)
+
+        etag = response.data[0]['headers']['ETag']
+        response = self.batch([{'url': farm_url, 'headers': {'If-None-Match': etag}}])
+        self.assertEqual(response.data[0]['status'], 304)
+
+    def test_sub_requests_use_the_batch_user(self):
+        response = self.batch([{'url': reverse('user-farms')}])
+        self.assertEqual([farm['id'] for farm in response.data[0]['body']], [self.farm.pk])
+
+        self.client.force_authenticate(None)
+        self.assertEqual(self.batch([{'url': reverse('user-farms')}]).status_code, 401)
+
+    def test_rejects_what_cannot_be_batched(self):
+        export = reverse('export', kwargs={'dataset': 'products', 'fmt': 'csv'})
+        response = self.batch([{'url': reverse('batch')}, {'url': '/admin/'}, {'url': export}])
+        self.assertEqual([sub['status'] for sub in response.data], [400, 400, 400])
+        # responses without data are refused even from views that do not opt out
+        with mock.patch.object(ExportView, 'batchable', True):
+            self.assertEqual(self.batch([{'url': export}]).data[0]['status'], 400)
+        self.assertEqual(self.batch([{'url': 'https://example.com/api/farms/'}]).status_code, 400)
+        self.assertEqual(self.batch([{'url': reverse('farm-list')}] * 21).status_code, 400)
@@ -0,0 +1,178 @@
+"""
+Resumable image uploads for farms and products.
+
+The client creates a session for the image of one of its farms or products,
+PUTs the file in chunks with ``Content-Range: bytes <start>-<end>/<size>``
+and finishes with ``complete``. Each chunk is copied from the request stream
+straight into a part file; after a dropped connection the client reads the
+session's ``offset`` and resumes from there. Completing renames the part
+file into ``MEDIA_ROOT`` and points the image field at it, so the bytes are
+written to disk once.
+"""
+import os
+import re
+import shutil
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+from PIL import Image
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .images import get_derivative_urls, image_replaced
+from .models import Crop, Farm, Item, Machinery, UploadSession
+
+TARGETS = {'farm': Farm, 'crop': Crop, 'item': Item, 'machinery': Machinery}
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif'}
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+CHUNK_SIZE = 64 * 1024
+
+
+class OffsetMismatch(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The chunk does not start at the current offset.'
+
+
+def get_upload_dir():
+    # must be on the filesystem of MEDIA_ROOT for completing to be a rename;
+    # api.media does not serve dot directories
+    return Path(getattr(settings, 'UPLOAD_TEMP_DIR', None) or Path(settings.MEDIA_ROOT) / '.uploads')
+
+
+def get_part_path(session):
+    return get_upload_dir() / f'{session.pk}.part'
+
+
+def get_target_queryset(user, target_type):
+    model = TARGETS[target_type]
+    queryset = model.objects.all()
+    if user.is_staff:
+        return queryset
+    if model is Farm:
+        return queryset.filter(owner=user)
+    return queryset.filter(farm__owner=user)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    type = serializers.ChoiceField(source='target_type', choices=UploadSession.TargetChoices.choices)
+
+    class Meta:
+        model = UploadSession
+        fields = ('id', 'type', 'target_id', 'filename', 'size', 'offset', 'created_at')
+        read_only_fields = ('id', 'offset', 'created_at')
+
+    def validate_filename(self, value):
+        if os.path.splitext(value)[1].lower() not in IMAGE_EXTENSIONS:
+            raise ValidationError(f"Allowed extensions: {', '.join(sorted(IMAGE_EXTENSIONS))}.")
+        return os.path.basename(value)
+
+    def validate_size(self, value):
+        max_size = getattr(settings, 'UPLOAD_MAX_SIZE', 20 * 1024 * 1024)
+        if not 0 < value <= max_size:
+            raise ValidationError(f'Must be between 1 and {max_size} bytes.')
+        return value
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        if not get_target_queryset(user, attrs['target_type']).filter(pk=attrs['target_id']).exists():
+            raise ValidationError({'target_id': 'Not one of your farms or products.'})
+        return attrs
+
+
+def parse_content_range(header, session):
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise ValidationError({'Content-Range': 'bytes <start>-<end>/<size> is required.'})
+    start, end, total = map(int, match.groups())
+    if total != session.size or start > end or end >= total:
+        raise ValidationError({'Content-Range': f'Must lie within the {session.size} bytes of the upload.'})
+    if start != session.offset:
+        raise OffsetMismatch({'detail': OffsetMismatch.default_detail, 'offset': session.offset})
+    return start, end
+
+
+def receive_chunk(session, stream, content_range):
+    """
+    Appends one chunk from ``stream`` to the part file and returns the new
+    offset. A chunk cut short by a dropped connection still counts up to
+    the last byte received.
+    """
+    start, end = parse_content_range(content_range, session)
+    expected = end - start + 1
+    path = get_part_path(session)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    received = 0
+    with open(path, 'r+b' if path.exists() else 'wb') as part:
+        # bytes past the offset belong to an attempt that was never acknowledged
+        part.seek(start)
+        part.truncate()
+        while stream is not None and received < expected:
+            chunk = stream.read(min(CHUNK_SIZE, expected - received))
+            if not chunk:
+                break
+            part.write(chunk)
+            received += len(chunk)
+
+    # a concurrent PUT of the same range loses instead of corrupting the offset
+    moved = UploadSession.objects.filter(pk=session.pk, offset=start).update(
+        offset=start + received, updated_at=timezone.now(),
+    )
+    if not moved:
+        session.refresh_from_db(fields=['offset'])
+        raise OffsetMismatch({'detail': OffsetMismatch.default_detail, 'offset': session.offset})
+    session.offset = start + received
+    return session.offset
+
+
+def move_into_storage(path, instance, filename):
+    """Renames the part file to where the image field would have saved it and returns the name."""
+    field = instance._meta.get_field('image')
+    storage = field.storage
+    name = field.generate_filename(instance, filename)
+    if hasattr(storage, 'get_hashed_name'):
+        with open(path, 'rb') as file:
+            name = storage.get_hashed_name(name, File(file))
+    name = storage.get_available_name(name, max_length=field.max_length)
+    destination = Path(storage.path(name))
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.replace(path, destination)
+    except OSError:
+        # UPLOAD_TEMP_DIR on another filesystem
+        shutil.move(path, destination)
+    return name
+
+
+def complete_upload(session, request):
+    if session.offset != session.size:
+        raise ValidationError({'offset': f'Only {session.offset} of {session.size} bytes were received.'})
+    path = get_part_path(session)
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception:
+        raise ValidationError({'filename': 'The uploaded file is not a valid image.'})
+
+    instance = get_target_queryset(request.user, session.target_type).filter(pk=session.target_id).first()
+    if instance is None:
+        raise ValidationError({'target_id': 'Not one of your farms or products.'})
+    old_name = instance.image.name
+    instance.image = move_into_storage(path, instance, session.filename)
+    # post_save updates the product index, search, cache and sync feed as for any edit
+    instance.save(update_fields=['image', 'updated_at'])
+    image_replaced(old_name, instance.image.name)
+    session.delete()
+    return {
+        'type': session.target_type,
+        'target_id': instance.pk,
+        'image': request.build_absolute_uri(instance.image.url),
+        'images': get_derivative_urls(instance.image.name, request.build_absolute_uri),
+    }
+
+
+def abort_upload(session):
+    get_part_path(session).unlink(missing_ok=True)
+    session.delete()
@@ -4,6 +4,13 @@ from . import views
 
 urlpatterns = [
     path('all/',views.AllProductsView.as_view(),name='all'),
+    path('search/', views.SearchView.as_view(), name='search'),
+    path('autocomplete/', views.AutocompleteView.as_view(), name='autocomplete'),
+    path('sync/', views.SyncView.as_view(), name='sync'),
+    path('export/<slug:dataset>.<slug:fmt>', views.ExportView.as_view(), name='export'),
+    path('batch/', views.BatchView.as_view(), name='batch'),
+    path('cart/quote/', views.CartQuoteView.as_view(), name='cart-quote'),
+    path('cache/stats/', views.CacheStatsView.as_view(), name='cache-stats'),
     path('crops/', views.CropListView.as_view(), name='crop-list'),
     path('crops/<int:pk>/', views.CropDetailView.as_view(), name='crop-detail'),
     path('crops/<int:pk>/update/', views.CropUpdateView.as_view(), name='crop-update'),
@@ -32,6 +39,11 @@ urlpatterns = [
     path('user/crops/add/', views.AddCropView.as_view(), name='add-crop'),
     path('user/items/add/', views.AddItemView.as_view(), name='add-item'),
     path('user/machinery/add/', views.AddMachineryView.as_view(), name='add-machinery'),
+    path('user/products/import/', views.ImportProductsView.as_view(), name='import-products'),
+    path('user/products/adjust/', views.AdjustProductsView.as_view(), name='adjust-products'),
+    path('user/uploads/', views.UploadSessionCreateView.as_view(), name='upload-create'),
+    path('user/uploads/<uuid:pk>/', views.UploadSessionView.as_view(), name='upload-detail'),
+    path('user/uploads/<uuid:pk>/complete/', views.UploadCompleteView.as_view(), name='upload-complete'),
     
     # Новые URL для получения продуктов конкретной фермы
     path('farms/<int:farm_id>/crops/', views.FarmCropsView.as_view(), name='farm-crops'),
@@ -1,118 +1,316 @@
-from itertools import chain
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from .serializers import *
 from rest_framework import generics
-from .models import Crop, Item, Machinery, Farm, CropCategory
+from rest_framework.views import APIView
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.settings import api_settings
+from .models import Crop, Item, Machinery, Farm, CropCategory, ProductIndex, UploadSession
 from .serializers import (
     CropSerializer, ItemSerializer, MachinerySerializer,
-    FarmSerializer, CropCategorySerializer
+    FarmSerializer, FarmSummarySerializer, CropCategorySerializer, ProductIndexSerializer
 )
 from .permissions import *
+from .filters import CatalogFilterBackend, get_facets
+from .pagination import get_order_by
+from .batch import dispatch, validate_batch
+from .bulk import CSVParser, ProductImporter, StockAdjuster, read_upload
+from .cache import CachedListMixin, get_stats
+from .cart import get_quote, validate_cart
+from .conditional import ConditionalGetMixin
+from .exports import EXPORTS, FORMATS
+from .lean import (
+    CropValuesSerializer, ItemValuesSerializer, MachineryValuesSerializer,
+    ProductIndexValuesSerializer, ValuesListMixin,
+)
+from . import autocomplete
+from .search import search
+from .sparse import ExpandQuerysetMixin
+from .sync import get_sync_payload, parse_token
+from .uploads import UploadSessionSerializer, abort_upload, complete_upload, receive_chunk
+
+# StringRelatedField renders products through __str__, which reads farm.owner
+FARM_PRODUCTS = ('crops', 'items', 'machines')
+
+
+class CatalogListMixin:
+    """
+    Filtering (see ``CatalogFilterBackend``), ``?ordering=name|-name|price|-price``
+    and, with ``?facets=1``, facet counts for product lists.
+    """
+    filter_backends = [CatalogFilterBackend]
+    orderings = {
+        'name': ('name', 'id'),
+        '-name': ('-name', '-id'),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+    }
+
+    def get_ordering(self):
+        ordering = self.request.query_params.get('ordering', 'name')
+        if ordering not in self.orderings:
+            raise ValidationError({'ordering': f"Must be one of: {', '.join(self.orderings)}."})
+        return self.orderings[ordering]
+
+    @property
+    def cursor_ordering(self):
+        return self.get_ordering()
+
+    def order_catalog(self, queryset):
+        # unpriced products last, in page-number and cursor mode alike
+        return queryset.order_by(*get_order_by(queryset.model, self.get_ordering()))
 
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        # a GROUP BY over the whole filtered list: only on request, and never for cursor pages
+        wants_facets = request.query_params.get('facets') in ('1', 'true')
+        if wants_facets and not getattr(self.paginator, 'use_cursor', False) and response.status_code == 200:
+            response.data['facets'] = get_facets(self.filter_queryset(self.get_queryset()))
+        return response
 
 
-
-class CropListView(generics.ListAPIView):
-    queryset = Crop.objects.all().order_by('name')
+class CropListView(CachedListMixin, ConditionalGetMixin, CatalogListMixin, ValuesListMixin, generics.ListAPIView):
     serializer_class = CropSerializer
+    values_serializer_class = CropValuesSerializer
+    cache_resources = ('crop', 'farm', 'category')
+    conditional_related = ('farm', 'category')
+
+    def get_queryset(self):
+        return self.order_catalog(Crop.objects.select_related('farm', 'category'))
 
 
-class CropDetailView(generics.RetrieveAPIView):
+class CropDetailView(ConditionalGetMixin, ExpandQuerysetMixin, generics.RetrieveAPIView):
     queryset = Crop.objects.all()
     serializer_class = CropSerializer
+    conditional_related = ('farm', 'category')
 
 
 class CropUpdateView(generics.UpdateAPIView):
-    queryset = Crop.objects.all()
+    queryset = Crop.objects.select_related('farm', 'category')
     serializer_class = CropSerializer
     permission_classes = [IsOwnerOrAdmin]
 
 
-class ItemListView(generics.ListAPIView):
-    queryset = Item.objects.all().order_by('name')
+class ItemListView(CachedListMixin, ConditionalGetMixin, CatalogListMixin, ValuesListMixin, generics.ListAPIView):
     serializer_class = ItemSerializer
+    values_serializer_class = ItemValuesSerializer
+    cache_resources = ('item', 'farm')
+    conditional_related = ('farm',)
+
+    def get_queryset(self):
+        return self.order_catalog(Item.objects.select_related('farm'))
 
 
-class ItemDetailView(generics.RetrieveAPIView):
+class ItemDetailView(ConditionalGetMixin, ExpandQuerysetMixin, generics.RetrieveAPIView):
     queryset = Item.objects.all()
     serializer_class = ItemSerializer
+    conditional_related = ('farm',)
 
 
 class ItemUpdateView(generics.UpdateAPIView):
-    queryset = Item.objects.all()
+    queryset = Item.objects.select_related('farm')
     serializer_class = ItemSerializer
     permission_classes = [IsOwnerOrAdmin]
 
 
-class MachineryListView(generics.ListAPIView):
-    queryset = Machinery.objects.all().order_by('name')
+class MachineryListView(CachedListMixin, ConditionalGetMixin, CatalogListMixin, ValuesListMixin, generics.ListAPIView):
     serializer_class = MachinerySerializer
+    values_serializer_class = MachineryValuesSerializer
+    cache_resources = ('machinery', 'farm')
+    conditional_related = ('farm',)
+
+    def get_queryset(self):
+        return self.order_catalog(Machinery.objects.select_related('farm'))
 
 
-class MachineryDetailView(generics.RetrieveAPIView):
+class MachineryDetailView(ConditionalGetMixin, ExpandQuerysetMixin, generics.RetrieveAPIView):
     queryset = Machinery.objects.all()
     serializer_class = MachinerySerializer
+    conditional_related = ('farm',)
 
 
 class MachineryUpdateView(generics.UpdateAPIView):
-    queryset = Machinery.objects.all()
+    queryset = Machinery.objects.select_related('farm')
     serializer_class = MachinerySerializer
     permission_classes = [IsOwnerOrAdmin]
 
 
-class FarmListView(generics.ListAPIView):
-    queryset = Farm.objects.all().order_by('name')
-    serializer_class = FarmSerializer
+class FarmSummaryMixin:
+    """
+    Lists farms as product summaries unless products are expanded with
+    ``?expand=products`` (or ``crops``, ``items``, ``machines``).
+    """
+
+    def expand_products(self):
+        expand = self.request.query_params.get('expand', '').split(',')
+        return any(name in expand for name in ('products', *FARM_PRODUCTS))
+
+    def get_serializer_class(self):
+        return FarmSerializer if self.expand_products() else FarmSummarySerializer
+
+    def get_farm_queryset(self, queryset):
+        if self.expand_products():
+            queryset = FarmSerializer.expand_queryset(queryset, self.request)
+        else:
+            queryset = queryset.select_related('owner')
+        return queryset.order_by('name')
+
+
+class FarmListView(CachedListMixin, ConditionalGetMixin, FarmSummaryMixin, generics.ListAPIView):
     permission_classes = [AllowAny]
+    cache_resources = ('farm', 'crop', 'item', 'machinery', 'user')
 
-class FarmDetailView(generics.RetrieveAPIView):
+    def get_queryset(self):
+        return self.get_farm_queryset(Farm.objects.all())
+
+class FarmDetailView(ConditionalGetMixin, ExpandQuerysetMixin, generics.RetrieveAPIView):
     queryset = Farm.objects.all()
     serializer_class = FarmSerializer
     permission_classes = [AllowAny]
 
+    def get_conditional_sources(self):
+        return [ProductIndex.objects.filter(farm_id=self.kwargs['pk'])]
+
 
 class FarmUpdateView(generics.UpdateAPIView):
-    queryset = Farm.objects.all()
+    queryset = Farm.objects.select_related('owner').prefetch_related(*FARM_PRODUCTS)
     serializer_class = FarmSerializer
     permission_classes = [IsOwnerOrAdmin]
 
 
-class CropCategoryListView(generics.ListAPIView):
+class CropCategoryListView(CachedListMixin, ConditionalGetMixin, generics.ListAPIView):
     queryset = CropCategory.objects.all().order_by('name')
     serializer_class = CropCategorySerializer
+    cache_resources = ('category',)
 
 
-class CropCategoryDetailView(generics.RetrieveAPIView):
+class CropCategoryDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     queryset = CropCategory.objects.all()
     serializer_class = CropCategorySerializer
 
 
-class AllProductsView(generics.ListAPIView):
-    serializer_class = AllProductsSerializer
+class ProductIndexListView(CatalogListMixin, ValuesListMixin, generics.ListAPIView):
+    """Unified crop/item/machinery list served by one indexed ProductIndex query."""
+    serializer_class = ProductIndexSerializer
+    values_serializer_class = ProductIndexValuesSerializer
 
     def get_queryset(self):
-        return Crop.objects.none()
+        return self.order_catalog(ProductIndex.objects.all())
 
-    def list(self, request, *args, **kwargs):
-        crops = Crop.objects.all()
-        items = Item.objects.all()
-        machinery = Machinery.objects.all()
 
-        all_products = list(chain(crops, items, machinery))
-        serializer = self.get_serializer(all_products, many=True)
-        return Response(serializer.data)
+class AllProductsView(CachedListMixin, ConditionalGetMixin, ProductIndexListView):
+    cache_resources = ('crop', 'item', 'machinery')
+
+
+class SearchView(generics.ListAPIView):
+    """Ranked full-text search across crops, items, machinery and farms."""
+    serializer_class = SearchResultSerializer
+    cursor_ordering = None
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'This query parameter is required.'})
+        return search(query)
+
+
+class AutocompleteView(APIView):
+    """Most popular products, categories and farms whose name starts with ``q``."""
+    default_limit = 10
+    max_limit = autocomplete.MAX_SUGGESTIONS
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            raise ValidationError({'limit': 'A valid integer is required.'})
+        limit = max(1, min(limit, self.max_limit))
+        suggestions = autocomplete.get_index().suggest(request.query_params.get('q', ''), limit)
+        return Response({
+            'results': [{'type': kind, 'id': pk, 'name': name} for kind, pk, name in suggestions],
+        })
+
+
+class SyncView(APIView):
+    """
+    Catalog changes since ``?since=<token>`` for offline replicas.
+
+    Start without a token for a full snapshot, then pass the returned ``next``
+    until ``has_more`` is false. ``deleted`` lists ids to drop per kind.
+    """
+    default_limit = 500
+    max_limit = 2000
+
+    def get(self, request):
+        try:
+            since = parse_token(request.query_params.get('since') or '0')
+        except ValueError:
+            raise ValidationError({'since': 'A token returned by a previous sync is required.'})
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            raise ValidationError({'limit': 'A valid integer is required.'})
+        limit = max(1, min(limit, self.max_limit))
+        context = {'request': request, 'view': self}
+        return Response(get_sync_payload(since, limit, context))
+
+
+class ExportView(APIView):
+    """
+    Streams a whole dataset (``products``, ``farms``, ``orders``) as NDJSON
+    or CSV, e.g. ``/api/export/orders.csv``. Orders are limited to the
+    user's own unless they are staff.
+    """
+    permission_classes = [IsAuthenticated]
+    # streamed, there is no data to put in a batch response
+    batchable = False
+
+    def get(self, request, dataset, fmt):
+        if dataset not in EXPORTS or fmt not in FORMATS:
+            raise NotFound()
+        stream, content_type = FORMATS[fmt]
+        response = StreamingHttpResponse(stream(EXPORTS[dataset](), request.user), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+        return response
+
+
+class CartQuoteView(APIView):
+    """Price, stock and subtotals for a list of ``{type, id, quantity}`` cart lines, grouped by farm."""
+
+    def post(self, request):
+        return Response(get_quote(validate_cart(request.data)))
+
+
+class BatchView(APIView):
+    """
+    Runs a list of ``{url, headers?}`` GET sub-requests in-process and
+    returns ``{status, headers, body}`` for each, in order.
+    """
+    batchable = False
+
+    def post(self, request):
+        return Response([dispatch(request, sub) for sub in validate_batch(request.data)])
+
+
+class CacheStatsView(APIView):
+    """Hit/miss counters of the response cache, for sizing it."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_stats())
 
 
 # Представления для владельцев бизнеса
-class UserFarmsView(generics.ListAPIView):
-    serializer_class = FarmSerializer
+class UserFarmsView(ConditionalGetMixin, FarmSummaryMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     pagination_class = None  # Отключаем пагинацию для ферм пользователя
+    # фермы показываются вместе с продуктами и владельцем
+    conditional_resources = ('farm', 'crop', 'item', 'machinery', 'user')
 
     def get_queryset(self):
         """Возвращает только фермы текущего пользователя"""
-        return Farm.objects.filter(owner=self.request.user).order_by('name')
+        return self.get_farm_queryset(Farm.objects.filter(owner=self.request.user))
 
 
 class AddCropView(generics.CreateAPIView):
@@ -151,6 +349,68 @@ class AddMachineryView(generics.CreateAPIView):
         serializer.save()
 
 
+class ImportProductsView(APIView):
+    """
+    Creates or updates many crops, items and machines of the user's farms from
+    a JSON array, a CSV body or an uploaded ``file``; see ``api.bulk``.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [*api_settings.DEFAULT_PARSER_CLASSES, CSVParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file') if request.content_type.startswith('multipart/') else None
+        rows = read_upload(upload) if upload is not None else request.data
+        return Response(ProductImporter(request.user).run(rows))
+
+
+class AdjustProductsView(APIView):
+    """
+    Applies a list of ``{type, id, stock_delta | stock, price | price_pct}``
+    operations to the user's products in one transaction.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        return Response(StockAdjuster(request.user).run(request.data))
+
+
+class UploadSessionCreateView(generics.CreateAPIView):
+    """Starts a resumable upload of a farm or product image; see ``api.uploads``."""
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        serializer.save(owner=self.request.user)
+
+
+class UploadSessionView(generics.RetrieveDestroyAPIView):
+    """GET reports the offset to resume from, PUT appends a chunk, DELETE aborts."""
+    serializer_class = UploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(owner=self.request.user)
+
+    def put(self, request, *args, **kwargs):
+        session = self.get_object()
+        # the body is read from the stream, never through request.data
+        receive_chunk(session, request.stream, request.headers.get('Content-Range'))
+        return Response(self.get_serializer(session).data)
+
+    def perform_destroy(self, instance):
+        abort_upload(instance)
+
+
+class UploadCompleteView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(owner=self.request.user)
+
+    def post(self, request, *args, **kwargs):
+        return Response(complete_upload(self.get_object(), request))
+
+
 class CreateFarmView(generics.CreateAPIView):
     serializer_class = FarmSerializer
     permission_classes = [IsAuthenticated]
@@ -161,63 +421,65 @@ class CreateFarmView(generics.CreateAPIView):
 
 
 # Новые views для фильтрации по ферме
-class FarmCropsView(generics.ListAPIView):
+class FarmCropsView(ConditionalGetMixin, ValuesListMixin, generics.ListAPIView):
     serializer_class = CropSerializer
+    values_serializer_class = CropValuesSerializer
+    conditional_related = ('farm', 'category')
+    conditional_resources = ('crop', 'farm', 'category')
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         farm_id = self.kwargs.get('farm_id')
-        return Crop.objects.filter(farm_id=farm_id).order_by('name')
+        return Crop.objects.filter(farm_id=farm_id).select_related('farm', 'category').order_by('name')
 
 
-class FarmItemsView(generics.ListAPIView):
+class FarmItemsView(ConditionalGetMixin, ValuesListMixin, generics.ListAPIView):
     serializer_class = ItemSerializer
+    values_serializer_class = ItemValuesSerializer
+    conditional_related = ('farm',)
+    conditional_resources = ('item', 'farm')
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         farm_id = self.kwargs.get('farm_id')
-        return Item.objects.filter(farm_id=farm_id).order_by('name')
+        return Item.objects.filter(farm_id=farm_id).select_related('farm').order_by('name')
 
 
-class FarmMachineryView(generics.ListAPIView):
+class FarmMachineryView(ConditionalGetMixin, ValuesListMixin, generics.ListAPIView):
     serializer_class = MachinerySerializer
+    values_serializer_class = MachineryValuesSerializer
+    conditional_related = ('farm',)
+    conditional_resources = ('machinery', 'farm')
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         farm_id = self.kwargs.get('farm_id')
-        return Machinery.objects.filter(farm_id=farm_id).order_by('name')
+        return Machinery.objects.filter(farm_id=farm_id).select_related('farm').order_by('name')
 
 
-class FarmAllProductsView(generics.ListAPIView):
-    serializer_class = AllProductsSerializer
+class FarmAllProductsView(ConditionalGetMixin, ProductIndexListView):
     permission_classes = [IsAuthenticated]
+    conditional_resources = ('crop', 'item', 'machinery')
 
-    def list(self, request, *args, **kwargs):
+    def get_queryset(self):
         farm_id = self.kwargs.get('farm_id')
-        
-        crops = Crop.objects.filter(farm_id=farm_id)
-        items = Item.objects.filter(farm_id=farm_id)
-        machinery = Machinery.objects.filter(farm_id=farm_id)
-
-        all_products = list(chain(crops, items, machinery))
-        serializer = self.get_serializer(all_products, many=True)
-        return Response(serializer.data)
+        return super().get_queryset().filter(farm_id=farm_id)
 
 
 # Views для удаления продуктов
 class CropDeleteView(generics.DestroyAPIView):
-    queryset = Crop.objects.all()
+    queryset = Crop.objects.select_related('farm', 'category')
     serializer_class = CropSerializer
     permission_classes = [IsOwnerOrAdmin]
 
 
 class ItemDeleteView(generics.DestroyAPIView):
-    queryset = Item.objects.all()
+    queryset = Item.objects.select_related('farm')
     serializer_class = ItemSerializer
     permission_classes = [IsOwnerOrAdmin]
 
 
 class MachineryDeleteView(generics.DestroyAPIView):
-    queryset = Machinery.objects.all()
+    queryset = Machinery.objects.select_related('farm')
     serializer_class = MachinerySerializer
     permission_classes = [IsOwnerOrAdmin]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:42
+
+from django.db import migrations
+
+
+def log_existing_locations(apps, schema_editor):
+    ChangeLog = apps.get_model('api', 'ChangeLog')
+    Location = apps.get_model('map', 'Location')
+    ChangeLog.objects.bulk_create(
+        (ChangeLog(kind='location', object_id=pk) for pk in Location.objects.values_list('pk', flat=True).iterator()),
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_changelog'),
+        ('map', '0002_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(log_existing_locations, migrations.RunPython.noop),
+    ]
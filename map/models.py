@@ -5,6 +5,7 @@ class Location(models.Model):
     farm = models.ForeignKey(Farm, on_delete=models.CASCADE)
     lat = models.FloatField()
     lon = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f'{self.farm.name} {self.lat} {self.lon}'
\ No newline at end of file
@@ -1,6 +1,12 @@
 from rest_framework import serializers
 from .models import Location
 
+class LocationSyncSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Location
+        fields = ('id', 'farm', 'lat', 'lon')
+
+
 class LocationSerializer(serializers.ModelSerializer):
     farm = serializers.SerializerMethodField()
 
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api import sync
+from api.cache import bump_version
+from .models import Location
+from .serializers import LocationSyncSerializer
+
+sync.register('location', Location, LocationSyncSerializer)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def invalidate_cached_locations(sender, **kwargs):
+    bump_version('location')
+
+
+
+@receiver(post_save, sender=Location)
+def log_saved_location(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    sync.record_change(instance)
+
+
+@receiver(post_delete, sender=Location)
+def log_deleted_location(sender, instance, **kwargs):
+    sync.record_change(instance, deleted=True)
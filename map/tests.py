@@ -1,3 +1,31 @@
-from django.test import TestCase
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from api.models import Farm
+from api.testing import QueryBudgetMixin
+from users.models import User
+from .models import Location
+
+
+class MapQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    urlconf = 'map.urls'
+    query_budgets = {
+        'locations': 3,
+        'locations-details': 1,
+    }
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        self.location = self.add_location(0)
+
+    def add_location(self, i):
+        farm = Farm.objects.create(name=f'Farm {i}', description='Family farm', owner=self.owner, address='Baku')
+        return Location.objects.create(farm=farm, lat=40.4 + i, lon=49.8 + i)
+
+    def grow(self):
+        for i in range(1, 6):
+            self.add_location(i)
+
+    def get_url_kwargs(self, name):
+        if name == 'locations-details':
+            return {'pk': self.location.pk}
+        return {}
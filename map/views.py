@@ -2,19 +2,24 @@ from django.shortcuts import render
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from django.core.exceptions import ValidationError
+from api.cache import CachedListMixin
+from api.conditional import ConditionalGetMixin
 from .models import Location
 from .serializers import LocationSerializer
 
 
-class LocationListAPIView(generics.ListAPIView):
-    queryset = Location.objects.all()
+class LocationListAPIView(CachedListMixin, ConditionalGetMixin, generics.ListAPIView):
+    queryset = Location.objects.select_related('farm')
     serializer_class = LocationSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly, )
+    cursor_ordering = ('id',)
+    cache_resources = ('location', 'farm')
+    conditional_related = ('farm',)
 
     def get_queryset(self):
         """Фильтрация и обработка ошибок"""
         try:
-            return Location.objects.all()
+            return Location.objects.select_related('farm').order_by('id')
         except Exception as e:
             print(f"Ошибка при получении локаций: {e}")
             return Location.objects.none()
@@ -36,7 +41,8 @@ class LocationListAPIView(generics.ListAPIView):
             )
 
 
-class LocationDetailAPIView(generics.RetrieveAPIView):
-    queryset = Location.objects.all()
+class LocationDetailAPIView(ConditionalGetMixin, generics.RetrieveAPIView):
+    queryset = Location.objects.select_related('farm')
     serializer_class = LocationSerializer
-    permission_classes = (permissions.IsAuthenticatedOrReadOnly, )
\ No newline at end of file
+    permission_classes = (permissions.IsAuthenticatedOrReadOnly, )
+    conditional_related = ('farm',)
\ No newline at end of file
@@ -4,20 +4,23 @@ from .models import Order, OrderItem
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
-    readonly_fields = ['item_subtotal']
+    readonly_fields = ['unit_price', 'subtotal']
 
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['order_id', 'user', 'status', 'created_at']
+    list_display = ['order_id', 'user', 'status', 'total', 'created_at']
+    list_select_related = ['user']
     list_filter = ['status', 'created_at']
     search_fields = ['order_id', 'user__email']
-    readonly_fields = ['order_id', 'created_at']
+    readonly_fields = ['order_id', 'created_at', 'total']
     inlines = [OrderItemInline]
     ordering = ['-created_at']
 
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ['id', 'order', 'content_type', 'object_id', 'quantity', 'item_subtotal']
+    # the stored price snapshot, so no row has to load its product
+    list_display = ['id', 'order', 'content_type', 'object_id', 'quantity', 'unit_price', 'subtotal']
+    list_select_related = ['order__user', 'content_type']
     list_filter = ['content_type', 'order__status']
-    readonly_fields = ['item_subtotal']
+    readonly_fields = ['unit_price', 'subtotal']
 
 admin.site.register(Order, OrderAdmin)
 admin.site.register(OrderItem, OrderItemAdmin)
\ No newline at end of file
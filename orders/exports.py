@@ -0,0 +1,60 @@
+from django.contrib.contenttypes.models import ContentType
+
+from api import exports
+from .models import OrderItem
+
+
+class OrderHistoryExport(exports.Export):
+    """
+    One row per order item, with the price it was bought at. Generic
+    products are resolved per chunk, with one query per product type,
+    instead of through ``item.product``.
+    """
+    columns = {
+        'order_id': 'order_id',
+        'created_at': 'order__created_at',
+        'status': 'order__status',
+        'user_id': 'order__user_id',
+        'item_id': 'id',
+        'content_type_id': 'content_type_id',
+        'product_id': 'object_id',
+        'quantity': 'quantity',
+        'unit_price': 'unit_price',
+        'subtotal': 'subtotal',
+    }
+    extra_fields = ('product_type', 'product_name')
+    ordering = ('order__created_at', 'order_id', 'id')
+
+    @property
+    def fields(self):
+        return [name for name in super().fields if name != 'content_type_id']
+
+    def get_queryset(self, user):
+        queryset = OrderItem.objects.all()
+        if user is not None and not user.is_staff:
+            queryset = queryset.filter(order__user=user)
+        return queryset
+
+    def process_chunk(self, rows):
+        wanted = {}
+        for row in rows:
+            wanted.setdefault(row['content_type_id'], set()).add(row['product_id'])
+        products = {}
+        for content_type_id, ids in wanted.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            for pk, name in model._base_manager.filter(pk__in=ids).values_list('pk', 'name'):
+                products[content_type_id, pk] = (model._meta.model_name, name)
+
+        for row in rows:
+            content_type_id = row.pop('content_type_id')
+            # deleted products keep their order lines
+            product_type, name = products.get(
+                (content_type_id, row['product_id']),
+                (ContentType.objects.get_for_id(content_type_id).model, None),
+            )
+            row['product_type'] = product_type
+            row['product_name'] = name
+        return rows
+
+
+exports.register('orders', OrderHistoryExport)
@@ -0,0 +1,51 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.benchmarking import best_of, rolled_back, seed_catalog
+from api.models import Crop, Item, Machinery
+from orders.views import OrderViewSet
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Times POST /orders/orders/ for 1, 10 and 100-line orders over a seeded catalog '
+        'and counts its queries. Test rows are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1, 10, 100])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        largest = max(options['lines'])
+        with rolled_back():
+            seed_catalog(crops=largest, items=largest, machinery=largest)
+            user = User.objects.get(email='benchmark@example.com')
+            # every order takes one unit of each product it lists
+            orders = len(options['lines']) * (options['repeat'] + 1)
+            for model in (Crop, Item, Machinery):
+                model.objects.update(stock=orders)
+            products = [
+                {'quantity': 1, 'content_type': model._meta.model_name, 'object_id': pk}
+                for pks in zip(*(model.objects.values_list('pk', flat=True)[:largest] for model in (Crop, Item, Machinery)))
+                for model, pk in zip((Crop, Item, Machinery), pks)
+            ]
+            ContentType.objects.get_for_models(Crop, Item, Machinery)
+            view = OrderViewSet.as_view({'post': 'create'})
+            factory = APIRequestFactory()
+
+            def create(lines):
+                request = factory.post('/orders/orders/', {'items': products[:lines]}, format='json')
+                force_authenticate(request, user)
+                response = view(request)
+                assert response.status_code == 201, response.data
+
+            for lines in options['lines']:
+                with CaptureQueriesContext(connection) as queries:
+                    create(lines)
+                seconds = best_of(options['repeat'], lambda: create(lines))
+                self.stdout.write(f'{lines:>4} lines  {seconds * 1000:8.2f} ms  {len(queries):>3} queries')
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from orders.stock import expire_pending_orders
+
+
+class Command(BaseCommand):
+    help = 'Cancels pending orders that were never confirmed and puts their reserved stock back. Run it from cron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutes', type=int, default=getattr(settings, 'ORDER_PENDING_TTL_MINUTES', 30),
+            help='Age after which a pending order expires.',
+        )
+
+    def handle(self, *args, **options):
+        expired = expire_pending_orders(timedelta(minutes=options['minutes']))
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} pending orders.'))
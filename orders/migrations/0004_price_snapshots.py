@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:18
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def snapshot_prices(apps, schema_editor):
+    # the price at purchase is unknown for existing orders, today's price is the best there is
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    for content_type in ContentType.objects.filter(app_label='api', model__in=['crop', 'item', 'machinery']):
+        model = apps.get_model('api', content_type.model)
+        price = model.objects.filter(pk=OuterRef('object_id')).values('price')[:1]
+        OrderItem.objects.filter(content_type=content_type).update(unit_price=Subquery(price))
+    OrderItem.objects.update(subtotal=F('quantity') * F('unit_price'))
+    subtotals = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(total=Sum('subtotal'))
+    Order.objects.update(total=Coalesce(Subquery(subtotals.values('total')), 0.0, output_field=FloatField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_upload_session'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('orders', '0003_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='subtotal',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(snapshot_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:28
+
+from django.db import migrations, models
+
+
+def record_reserved_stock(apps, schema_editor):
+    # orders reserved before this migration reserved exactly their items
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    lines = {}
+    items = OrderItem.objects.filter(order__stock_reserved=True).values_list('order_id', 'content_type_id', 'object_id', 'quantity')
+    for order_id, content_type_id, object_id, quantity in items.iterator():
+        lines.setdefault(order_id, []).append([content_type_id, object_id, quantity])
+    Order.objects.bulk_update([Order(pk=pk, reserved_stock=value) for pk, value in lines.items()], ['reserved_stock'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_price_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='reserved_stock',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.RunPython(record_reserved_stock, migrations.RunPython.noop),
+    ]
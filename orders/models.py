@@ -3,6 +3,8 @@ import uuid
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
 from users.models import User
 from api.models import Crop,Machinery,Item
 
@@ -20,6 +22,18 @@ class Order(models.Model):
         default=StatusChoices.PENDING,
         max_length=10,
     )
+    # True while the items' quantities are taken off product stock (orders.stock)
+    stock_reserved = models.BooleanField(default=False)
+    # [content_type_id, object_id, quantity] taken off stock, put back as is on release
+    reserved_stock = models.JSONField(default=list, editable=False)
+    # sum of the items' subtotals, so totals stay what the buyer paid
+    total = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-order_id']),
+            models.Index(fields=['status', 'created_at']),
+        ]
 
     def __str__(self):
         return f'Order {self.order_id} by {self.user.get_full_name()}'
@@ -29,6 +43,11 @@ class Order(models.Model):
         """Возвращает связанные элементы заказа"""
         return self.orderitem_set.all()
 
+    def update_total(self):
+        """Пересчитывает сумму заказа по сохранённым позициям"""
+        self.total = self.orderitem_set.aggregate(total=Coalesce(Sum('subtotal'), 0.0))['total']
+        Order.objects.filter(pk=self.pk).update(total=self.total)
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
@@ -36,10 +55,37 @@ class OrderItem(models.Model):
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     product = GenericForeignKey('content_type', 'object_id')
+    # the product's price when the order was placed; later price changes do not apply
+    unit_price = models.FloatField(null=True, blank=True)
+    subtotal = models.FloatField(null=True, blank=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'content_type_id' in field_names and 'object_id' in field_names:
+            # the product the stored unit_price belongs to
+            instance._loaded_product = (instance.content_type_id, instance.object_id)
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            changed = self.unit_price is None
+        else:
+            loaded = getattr(self, '_loaded_product', None)
+            changed = loaded is not None and loaded != (self.content_type_id, self.object_id)
+        if changed:
+            # a different product: its price replaces the old snapshot
+            self.unit_price = getattr(self.product, 'price', None)
+            self._loaded_product = (self.content_type_id, self.object_id)
+        self.subtotal = None if self.unit_price is None else self.quantity * self.unit_price
+        super().save(*args, **kwargs)
 
     @property
     def item_subtotal(self):
-        return self.quantity * self.product.price
+        """Старое имя поля ``subtotal``, оставлено для клиентов API"""
+        return self.subtotal
 
     def __str__(self):
-        return f"{self.quantity} x {self.product} in Order {self.order.order_id}"
\ No newline at end of file
+        # используется в списках админки, поэтому без загрузки товара и заказа
+        product_type = ContentType.objects.get_for_id(self.content_type_id).model
+        return f"{self.quantity} x {product_type} {self.object_id} in Order {self.order_id}"
\ No newline at end of file
@@ -1,7 +1,26 @@
-from rest_framework import serializers
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from django.db.models import Prefetch, prefetch_related_objects
 from .models import Order, OrderItem
+from .signals import record_ordered_items
+from .stock import InsufficientStock, get_shortages, reserve_stock
+from api.bulk import PRODUCT_MODELS
 from api.models import Crop, Item, Machinery
+from api.sparse import SparseFieldsMixin
+
+
+class OutOfStock(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Not enough stock for some items.'
+    default_code = 'out_of_stock'
+
+    def __init__(self, shortages):
+        # set as is: APIException would turn the quantities into strings
+        self.detail = {'detail': self.default_detail, 'items': shortages}
+
 
 class ProductRelatedField(serializers.RelatedField):
     def to_representation(self, value):
@@ -12,6 +31,13 @@ class ProductRelatedField(serializers.RelatedField):
             "type": value.__class__.__name__.lower(),
         }
 
+def product_prefetch(lookup):
+    """
+    Prefetches the generic ``product`` of order items with one query per
+    product type for the whole page, reading only what ProductRelatedField shows.
+    """
+    return GenericPrefetch(lookup, [model.objects.only('id', 'name', 'price') for model in PRODUCT_MODELS.values()])
+
 class OrderItemSerializer(serializers.ModelSerializer):
     product = ProductRelatedField(read_only=True)
     content_type = serializers.SlugRelatedField(
@@ -20,64 +46,112 @@ class OrderItemSerializer(serializers.ModelSerializer):
     )
     class Meta:
         model = OrderItem
-        fields = ['id', 'order', 'quantity', 'content_type', 'object_id', 'product', 'item_subtotal']
-        read_only_fields = ['id', 'product', 'item_subtotal']
+        fields = ['id', 'order', 'quantity', 'content_type', 'object_id', 'product', 'unit_price', 'subtotal', 'item_subtotal']
+        read_only_fields = ['id', 'product', 'unit_price', 'subtotal', 'item_subtotal']
 
 class CreateOrderItemSerializer(serializers.ModelSerializer):
-    content_type = serializers.CharField()
-    
+    content_type = serializers.ChoiceField(choices=list(PRODUCT_MODELS))
+
     class Meta:
         model = OrderItem
         fields = ['quantity', 'content_type', 'object_id']
-    
+
     def validate_content_type(self, value):
-        """Валидирует content_type и возвращает объект ContentType"""
-        try:
-            return ContentType.objects.get(model=value)
-        except ContentType.DoesNotExist:
-            raise serializers.ValidationError(f"Content type '{value}' does not exist")
-    
-    def create(self, validated_data):
-        """Создает OrderItem с правильным content_type"""
-        content_type = validated_data.pop('content_type')
-        validated_data['content_type'] = content_type
-        return super().create(validated_data)
+        """Возвращает ContentType из кэша ContentTypeManager, без запроса на каждую строку"""
+        return ContentType.objects.get_for_model(PRODUCT_MODELS[value])
+
 
 class CreateOrderSerializer(serializers.ModelSerializer):
-    items = CreateOrderItemSerializer(many=True)
-    
+    """
+    Creates an order and all its items in one transaction: products are
+    checked with one query per product type, the items are inserted with
+    a single ``bulk_create`` and their stock is reserved with one UPDATE per
+    product type (see ``orders.stock``), so the cost does not grow per line.
+    Each item keeps the price it was bought at and the order its total.
+    """
+    items = CreateOrderItemSerializer(many=True, allow_empty=False)
+
     class Meta:
         model = Order
         fields = ['items']
-    
+
+    def validate_items(self, items):
+        ids_by_type = {}
+        for item in items:
+            ids_by_type.setdefault(item['content_type'], set()).add(item['object_id'])
+        self.products = {}
+        for content_type, ids in ids_by_type.items():
+            model = content_type.model_class()
+            for product in model.objects.filter(pk__in=ids).only('id', 'name', 'price'):
+                self.products[content_type.pk, product.pk] = product
+
+        errors = [
+            {} if (item['content_type'].pk, item['object_id']) in self.products
+            else {'object_id': [f"{item['content_type'].model} {item['object_id']} does not exist."]}
+            for item in items
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        user = self.context['request'].user
-        print(f"Creating order for user: {user.id} - {user.email}")
-        
-        order = Order.objects.create(user=user)
-        print(f"Created order: {order.order_id}")
-        
-        for item_data in items_data:
-            # Создаем OrderItem с правильным content_type
-            content_type = item_data['content_type']
-            order_item = OrderItem.objects.create(
-                order=order,
-                quantity=item_data['quantity'],
-                content_type=content_type,
-                object_id=item_data['object_id']
-            )
-            print(f"Created order item: {order_item.id} for product {item_data['object_id']}")
-        
+        items = [OrderItem(**item_data) for item_data in items_data]
+        for item in items:
+            # bulk_create skips OrderItem.save, so the snapshot is taken here
+            item.unit_price = self.products[item.content_type.pk, item.object_id].price
+            item.subtotal = None if item.unit_price is None else item.quantity * item.unit_price
+        total = sum(item.subtotal for item in items if item.subtotal is not None)
+        try:
+            with transaction.atomic():
+                order = Order.objects.create(user=self.context['request'].user, total=total)
+                for item in items:
+                    item.order = order
+                OrderItem.objects.bulk_create(items)
+                reserve_stock(order, items)
+                # bulk_create sends no post_save, so record popularity the way orders.signals does
+                transaction.on_commit(lambda: record_ordered_items(items))
+        except InsufficientStock:
+            raise OutOfStock(get_shortages(items))
+
+        # one query reads the items back for the response; their products are already loaded
+        prefetch_related_objects([order], Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('content_type')))
+        for item in order.orderitem_set.all():
+            item.product = self.products[item.content_type_id, item.object_id]
         return order
-    
+
     def to_representation(self, instance):
         """Переопределяем представление для возврата полного заказа"""
         return OrderSerializer(instance).data
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
 
+    collapsed_fields = {'items': serializers.PrimaryKeyRelatedField(many=True, read_only=True)}
+    expanded_lookups = {
+        'items': (
+            Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('content_type')),
+            product_prefetch('orderitem_set__product'),
+        ),
+    }
+    collapsed_lookups = {'items': (Prefetch('orderitem_set', queryset=OrderItem.objects.only('id', 'order_id')),)}
+
     class Meta:
         model = Order
-        fields = ['order_id', 'user', 'created_at', 'status', 'items']
\ No newline at end of file
+        fields = ['order_id', 'user', 'created_at', 'status', 'total', 'items']
+        read_only_fields = ['total']
+
+    def validate_status(self, value):
+        instance = self.instance
+        if instance is not None and value != instance.status and instance.status != Order.StatusChoices.PENDING:
+            raise serializers.ValidationError('Only pending orders can change status.')
+        return value
+
+    def update(self, instance, validated_data):
+        status = validated_data.get('status', instance.status)
+        if status != instance.status:
+            # expire_pending_orders may have cancelled the order since it was read
+            changed = Order.objects.filter(pk=instance.pk, status=Order.StatusChoices.PENDING).update(status=status)
+            if not changed:
+                raise serializers.ValidationError({'status': 'Only pending orders can change status.'})
+        return super().update(instance, validated_data)
\ No newline at end of file
@@ -0,0 +1,44 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from api import autocomplete
+from .models import Order, OrderItem
+from .stock import release_stock
+
+
+@receiver(post_save, sender=OrderItem)
+def record_product_popularity(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        model = ContentType.objects.get_for_id(instance.content_type_id).model
+        autocomplete.record_ordered(model, instance.object_id, instance.quantity)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def update_order_total(sender, instance, raw=False, origin=None, **kwargs):
+    # items created by CreateOrderSerializer use bulk_create and come with the total already set
+    if raw or isinstance(origin, Order) or getattr(origin, 'model', None) is Order:
+        # the order itself is being deleted
+        return
+    Order(pk=instance.order_id).update_total()
+
+
+def record_ordered_items(items):
+    """``record_product_popularity`` for items created with ``bulk_create``."""
+    for item in items:
+        model = ContentType.objects.get_for_id(item.content_type_id).model
+        autocomplete.record_ordered(model, item.object_id, item.quantity)
+
+
+@receiver(post_save, sender=Order)
+def release_cancelled_stock(sender, instance, raw=False, **kwargs):
+    if not raw and instance.stock_reserved and instance.status == Order.StatusChoices.CANCELLED:
+        release_stock(instance)
+
+
+@receiver(pre_delete, sender=Order)
+def release_deleted_stock(sender, instance, **kwargs):
+    # a confirmed order was sold, deleting its record does not restock
+    if instance.stock_reserved and instance.status == Order.StatusChoices.PENDING:
+        release_stock(instance)
@@ -0,0 +1,126 @@
+"""
+Stock reservation for orders.
+
+Creating an order takes its quantities off product stock with conditional
+``F()`` updates (``stock >= quantity``), inside the order's transaction, so
+two checkouts can never sell the same unit. Rows are locked in one global
+order (model label, then primary key) so concurrent checkouts that share
+products queue up instead of deadlocking. Cancelling, deleting or expiring
+a pending order puts back exactly the quantities recorded in
+``Order.reserved_stock``, whatever happened to the items since;
+``Order.stock_reserved`` makes that happen at most once.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from api.signals import stock_changed
+from .models import Order
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def get_lines(items):
+    """``[content_type_id, object_id, quantity]`` of order items, as stored in ``Order.reserved_stock``."""
+    return [[item.content_type_id, item.object_id, item.quantity] for item in items]
+
+
+def get_quantities(lines):
+    """``{model: {pk: quantity}}`` of ``get_lines`` output, summing repeated products."""
+    quantities = {}
+    for content_type_id, object_id, quantity in lines:
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        wanted = quantities.setdefault(model, {})
+        wanted[object_id] = wanted.get(object_id, 0) + quantity
+    return quantities
+
+
+def lock_rows(model, ids):
+    # SQLite has no row locks (a writer locks the whole database), skip the query there
+    if connection.features.has_select_for_update:
+        list(model.objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk', flat=True))
+
+
+def move_stock(quantities, sign):
+    """
+    Adds ``sign * quantity`` to the stock of every product, one UPDATE per
+    model. Taking stock (sign -1) raises InsufficientStock unless every row
+    had enough; the caller's transaction then rolls the others back.
+    """
+    now = timezone.now()
+    for model in sorted(quantities, key=lambda model: model._meta.label):
+        wanted = quantities[model]
+        ids = sorted(wanted)
+        lock_rows(model, ids)
+        quantity = Case(
+            *(When(pk=pk, then=Value(wanted[pk])) for pk in ids),
+            output_field=IntegerField(),
+        )
+        rows = model.objects.filter(pk__in=ids)
+        if sign < 0:
+            rows = rows.filter(stock__gte=quantity)
+        changed = rows.update(stock=F('stock') + sign * quantity, updated_at=now)
+        if changed != len(ids):
+            raise InsufficientStock(model)
+        stock_changed.send(sender=model, pks=ids)
+
+
+def reserve_stock(order, items):
+    """Takes the items off stock; call inside the transaction that creates ``order``."""
+    lines = get_lines(items)
+    move_stock(get_quantities(lines), -1)
+    Order.objects.filter(pk=order.pk).update(stock_reserved=True, reserved_stock=lines)
+    order.stock_reserved = True
+    order.reserved_stock = lines
+
+
+def get_shortages(items):
+    """Lines asking for more than is in stock now, for the error response."""
+    shortages = []
+    for model, wanted in get_quantities(get_lines(items)).items():
+        stock = dict(model.objects.filter(pk__in=wanted).values_list('pk', 'stock'))
+        for pk, quantity in wanted.items():
+            if stock.get(pk, 0) < quantity:
+                shortages.append({
+                    'content_type': model._meta.model_name,
+                    'object_id': pk,
+                    'requested': quantity,
+                    'available': stock.get(pk, 0),
+                })
+    return shortages
+
+
+@transaction.atomic
+def release_stock(order):
+    """Puts a reserved order's quantities back on stock; does nothing the second time."""
+    if not Order.objects.filter(pk=order.pk, stock_reserved=True).update(stock_reserved=False):
+        return False
+    order.stock_reserved = False
+    reserved = Order.objects.filter(pk=order.pk).values_list('reserved_stock', flat=True).get()
+    move_stock(get_quantities(reserved), 1)
+    return True
+
+
+def expire_pending_orders(older_than=None):
+    """Cancels pending orders older than ``ORDER_PENDING_TTL_MINUTES`` and releases their stock."""
+    if older_than is None:
+        older_than = timedelta(minutes=getattr(settings, 'ORDER_PENDING_TTL_MINUTES', 30))
+    cutoff = timezone.now() - older_than
+    stale = Order.objects.filter(status=Order.StatusChoices.PENDING, created_at__lt=cutoff)
+    expired = 0
+    for order in stale.only('pk').iterator():
+        with transaction.atomic():
+            # an order confirmed meanwhile is left alone
+            cancelled = Order.objects.filter(pk=order.pk, status=Order.StatusChoices.PENDING).update(
+                status=Order.StatusChoices.CANCELLED,
+            )
+            if cancelled:
+                release_stock(order)
+                expired += 1
+    return expired
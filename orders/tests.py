@@ -1,3 +1,381 @@
-from django.test import TestCase
+import io
+import json
+import threading
+import time
+from datetime import timedelta
 
-# Create your tests here.
+import msgpack
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from api.models import Crop, CropCategory, Item, Machinery, ProductIndex
+from api.testing import QueryBudgetMixin
+from api.tests import create_catalog
+from users.models import User
+from .exports import OrderHistoryExport
+from .models import Order, OrderItem
+
+
+class OrdersQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    urlconf = 'orders.urls'
+    query_budgets = {
+        'api-root': 0,
+        'order-list': 6,
+        'order-detail': 5,
+        'orderitem-list': 5,
+        'orderitem-detail': 2,
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='secret', first_name='Leyla', last_name='Mammadova')
+        category = CropCategory.objects.create(name='Vegetables')
+        self.farm, = create_catalog(self.user, category, products_per_farm=5)
+        self.order = self.add_order()
+        self.client.force_authenticate(self.user)
+
+    def add_order(self):
+        order = Order.objects.create(user=self.user)
+        for products in (self.farm.crops.all(), self.farm.items.all(), self.farm.machines.all()):
+            for product in products:
+                OrderItem.objects.create(
+                    order=order,
+                    quantity=2,
+                    content_type=ContentType.objects.get_for_model(product),
+                    object_id=product.pk,
+                )
+        return order
+
+    def grow(self):
+        for _ in range(4):
+            self.add_order()
+
+    def get_url_kwargs(self, name):
+        if name == 'order-detail':
+            return {'pk': self.order.pk}
+        if name == 'orderitem-detail':
+            return {'pk': OrderItem.objects.filter(order=self.order).first().pk}
+        return {}
+
+
+class OrderExpansionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='secret', first_name='Leyla', last_name='Mammadova')
+        farm, = create_catalog(self.user, CropCategory.objects.create(name='Vegetables'))
+        self.order = Order.objects.create(user=self.user)
+        for crop in farm.crops.all():
+            OrderItem.objects.create(order=self.order, quantity=1, content_type=ContentType.objects.get_for_model(crop), object_id=crop.pk)
+        self.client.force_authenticate(self.user)
+
+    def test_items_are_ids_unless_expanded(self):
+        url = reverse('order-detail', kwargs={'pk': self.order.pk})
+        item_ids = sorted(self.order.orderitem_set.values_list('pk', flat=True))
+        self.assertEqual(sorted(self.client.get(url, {'expand': ''}).data['items']), item_ids)
+        expanded = self.client.get(url, {'expand': 'items', 'fields': 'items'}).data
+        self.assertEqual(set(expanded), {'order_id', 'items'})
+        self.assertEqual(sorted(item['id'] for item in expanded['items']), item_ids)
+
+
+    def test_creates_orders_from_msgpack(self):
+        crop = Crop.objects.filter(stock__gte=1).first()
+        payload = {'items': [{'quantity': 1, 'content_type': 'crop', 'object_id': crop.pk}]}
+        response = self.client.post(
+            reverse('order-list'), msgpack.packb(payload),
+            content_type='application/msgpack', HTTP_ACCEPT='application/msgpack',
+        )
+        self.assertEqual(response.status_code, 201)
+        order = msgpack.unpackb(response.content)
+        self.assertEqual([(item['object_id'], item['quantity']) for item in order['items']], [(crop.pk, 1)])
+
+
+
+class OrderCreationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='secret', first_name='Leyla', last_name='Mammadova')
+        self.farm, = create_catalog(self.user, CropCategory.objects.create(name='Vegetables'), products_per_farm=10)
+        self.client.force_authenticate(self.user)
+        ContentType.objects.get_for_models(Crop, Item, Machinery)
+
+    def lines(self, count):
+        """``count`` lines taking turns between crops, items and machinery in stock."""
+        in_stock = [
+            [(product_type, pk) for pk in products.filter(stock__gt=0).order_by('id').values_list('pk', flat=True)]
+            for product_type, products in (('crop', self.farm.crops), ('item', self.farm.items), ('machinery', self.farm.machines))
+        ]
+        lines = [
+            {'quantity': 1, 'content_type': product_type, 'object_id': pk}
+            for row in zip(*in_stock)
+            for product_type, pk in row
+        ]
+        return lines[:count]
+
+    def create(self, lines):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('order-list'), {'items': lines}, format='json')
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        small_lines, large_lines = self.lines(3), self.lines(27)[3:]
+        small, small_queries = self.create(small_lines)
+        large, large_queries = self.create(large_lines)
+        self.assertEqual((small.status_code, large.status_code), (201, 201))
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual(len(large.data['items']), 24)
+        crop = Crop.objects.get(pk=large_lines[0]['object_id'])
+        self.assertEqual(large.data['items'][0]['product'], {'id': crop.pk, 'name': crop.name, 'price': crop.price, 'type': 'crop'})
+
+    def test_a_bad_line_creates_nothing(self):
+        lines = self.lines(3) + [{'quantity': 1, 'content_type': 'crop', 'object_id': 10 ** 6}]
+        response, _ = self.create(lines)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['items'][3], {'object_id': [f'crop {10 ** 6} does not exist.']})
+        self.assertFalse(Order.objects.exists())
+
+        response, _ = self.create([{'quantity': 1, 'content_type': 'user', 'object_id': self.user.pk}])
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='secret', first_name='Leyla', last_name='Mammadova')
+        self.farm, = create_catalog(self.user, CropCategory.objects.create(name='Vegetables'), products_per_farm=3)
+        other = User.objects.create_user(email='other@example.com', password='secret', first_name='Vugar', last_name='Aliyev')
+        self.add_order(self.user)
+        self.add_order(other)
+        self.client.force_authenticate(self.user)
+
+    def add_order(self, user):
+        order = Order.objects.create(user=user)
+        for product in [*self.farm.crops.all(), *self.farm.machines.all()]:
+            OrderItem.objects.create(
+                order=order, quantity=3, content_type=ContentType.objects.get_for_model(product), object_id=product.pk,
+            )
+        return order
+
+    def test_exports_own_order_items_with_products(self):
+        response = self.client.get(reverse('export', kwargs={'dataset': 'orders', 'fmt': 'ndjson'}))
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual({row['user_id'] for row in rows}, {self.user.pk})
+        crop = self.farm.crops.order_by('id').first()
+        row = next(row for row in rows if row['product_type'] == 'crop' and row['product_id'] == crop.pk)
+        self.assertEqual((row['product_name'], row['unit_price'], row['subtotal']), (crop.name, crop.price, crop.price * 3))
+
+    def test_resolves_products_once_per_type_and_chunk(self):
+        export = OrderHistoryExport(chunk_size=100)
+        ContentType.objects.get_for_model(Crop)
+        with CaptureQueriesContext(connection) as queries:
+            rows = [row for chunk in export.iter_chunks() for row in chunk]
+        self.assertEqual(len(rows), 12)
+        # the items, then crops and machinery
+        self.assertEqual(len(queries), 3)
+
+
+class PriceSnapshotTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='secret', first_name='Leyla', last_name='Mammadova')
+        self.farm, = create_catalog(self.user, CropCategory.objects.create(name='Vegetables'), products_per_farm=3)
+        self.crop = self.farm.crops.order_by('id').last()
+        self.client.force_authenticate(self.user)
+
+    def test_orders_keep_the_price_they_were_placed_at(self):
+        items = [{'quantity': 2, 'content_type': 'crop', 'object_id': self.crop.pk}]
+        order_id = self.client.post(reverse('order-list'), {'items': items}, format='json').data['order_id']
+        Crop.objects.filter(pk=self.crop.pk).update(price=self.crop.price * 10)
+
+        response = self.client.get(reverse('order-detail', kwargs={'pk': order_id}), {'expand': 'items'})
+        item, = response.data['items']
+        self.assertEqual((item['unit_price'], item['subtotal']), (self.crop.price, self.crop.price * 2))
+        self.assertEqual(response.data['total'], self.crop.price * 2)
+
+    def test_saved_items_update_the_order_total(self):
+        order = Order.objects.create(user=self.user)
+        machine = self.farm.machines.first()
+        item = OrderItem.objects.create(order=order, quantity=3, content_type=ContentType.objects.get_for_model(machine), object_id=machine.pk)
+        order.refresh_from_db()
+        self.assertEqual((item.unit_price, order.total), (machine.price, machine.price * 3))
+        item.delete()
+        order.refresh_from_db()
+        self.assertEqual(order.total, 0)
+
+    def test_changing_the_product_takes_its_price(self):
+        order = Order.objects.create(user=self.user)
+        crop, machine = self.crop, self.farm.machines.first()
+        OrderItem.objects.create(order=order, quantity=2, content_type=ContentType.objects.get_for_model(crop), object_id=crop.pk)
+        Crop.objects.filter(pk=crop.pk).update(price=crop.price * 10)
+
+        item = OrderItem.objects.get(order=order)
+        item.quantity = 3
+        item.save()
+        self.assertEqual((item.unit_price, item.subtotal), (crop.price, crop.price * 3))
+
+        item = OrderItem.objects.get(order=order)
+        item.content_type = ContentType.objects.get_for_model(machine)
+        item.object_id = machine.pk
+        item.save()
+        order.refresh_from_db()
+        self.assertEqual((item.unit_price, order.total), (machine.price, machine.price * 3))
+
+    # the manifest needs collectstatic, which the tests do not run
+    @override_settings(STORAGES={
+        **settings.STORAGES,
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_admin_changelist_does_not_load_products(self):
+        admin = User.objects.create_superuser(email='admin@example.com', password='secret', first_name='A', last_name='B')
+        self.client.force_login(admin)
+        url = reverse('admin:orders_orderitem_changelist')
+
+        def add_orders(count):
+            for _ in range(count):
+                order = Order.objects.create(user=self.user)
+                for product in self.farm.crops.all():
+                    OrderItem.objects.create(order=order, quantity=1, content_type=ContentType.objects.get_for_model(product), object_id=product.pk)
+
+        add_orders(1)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        add_orders(5)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(url)
+        self.assertEqual(len(large), len(small))
+
+
+class StockReservationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@example.com', password='secret', first_name='Leyla', last_name='Mammadova')
+        self.farm, = create_catalog(self.user, CropCategory.objects.create(name='Vegetables'), products_per_farm=6)
+        self.crop = self.farm.crops.get(stock=5)
+        self.machine = self.farm.machines.first()
+        self.client.force_authenticate(self.user)
+
+    def order(self, crop_quantity, machine_quantity=1):
+        items = [
+            {'quantity': crop_quantity, 'content_type': 'crop', 'object_id': self.crop.pk},
+            {'quantity': machine_quantity, 'content_type': 'machinery', 'object_id': self.machine.pk},
+        ]
+        return self.client.post(reverse('order-list'), {'items': items}, format='json')
+
+    def stock(self):
+        self.crop.refresh_from_db()
+        self.machine.refresh_from_db()
+        return self.crop.stock, self.machine.stock
+
+    def test_orders_take_stock(self):
+        response = self.order(3)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stock(), (2, 0))
+        self.assertEqual(ProductIndex.objects.get(product_type='crop', product_id=self.crop.pk).stock, 2)
+
+    def test_never_oversells(self):
+        response = self.order(6)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            json.loads(response.content)['items'],
+            [{'content_type': 'crop', 'object_id': self.crop.pk, 'requested': 6, 'available': 5}],
+        )
+        self.assertEqual(self.stock(), (5, 1))
+        self.assertFalse(Order.objects.exists())
+
+    def test_cancelling_releases_stock_once(self):
+        order_id = self.order(3).data['order_id']
+        url = reverse('order-detail', kwargs={'pk': order_id})
+        self.assertEqual(self.client.patch(url, {'status': 'CANCELLED'}, format='json').status_code, 200)
+        self.assertEqual(self.stock(), (5, 1))
+        self.client.patch(url, {'status': 'CANCELLED'}, format='json')
+        self.assertEqual(self.stock(), (5, 1))
+
+    def test_release_puts_back_what_was_reserved(self):
+        order_id = self.order(3).data['order_id']
+        # items edited after checkout, e.g. in the admin, do not change what is released
+        OrderItem.objects.filter(order_id=order_id).update(quantity=500)
+        url = reverse('order-detail', kwargs={'pk': order_id})
+        self.client.patch(url, {'status': 'CANCELLED'}, format='json')
+        self.assertEqual(self.stock(), (5, 1))
+
+    def test_only_pending_orders_change_status(self):
+        url = reverse('order-detail', kwargs={'pk': self.order(3).data['order_id']})
+        self.client.patch(url, {'status': 'CANCELLED'}, format='json')
+        response = self.client.patch(url, {'status': 'CONFIRMED'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.get().status, 'CANCELLED')
+
+    def test_order_items_are_read_only_and_private(self):
+        order_id = self.order(3).data['order_id']
+        item = OrderItem.objects.filter(order_id=order_id).first()
+        detail = reverse('orderitem-detail', kwargs={'pk': item.pk})
+        self.assertEqual(self.client.patch(detail, {'quantity': 500}, format='json').status_code, 405)
+        line = {'order': order_id, 'quantity': 1, 'content_type': 'crop', 'object_id': self.crop.pk}
+        self.assertEqual(self.client.post(reverse('orderitem-list'), line, format='json').status_code, 405)
+
+        other = User.objects.create_user(email='other@example.com', password='secret', first_name='Vugar', last_name='Aliyev')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(detail).status_code, 404)
+
+    def test_stale_pending_orders_expire(self):
+        order_id = self.order(2).data['order_id']
+        fresh_id = self.order(1, machine_quantity=0).data['order_id']
+        Order.objects.filter(pk=order_id).update(created_at=timezone.now() - timedelta(hours=1))
+        out = io.StringIO()
+        call_command('expire_pending_orders', stdout=out)
+        self.assertIn('Expired 1 pending orders.', out.getvalue())
+        self.assertEqual(self.stock(), (4, 1))
+        statuses = {str(pk): status for pk, status in Order.objects.values_list('pk', 'status')}
+        self.assertEqual((statuses[order_id], statuses[fresh_id]), ('CANCELLED', 'PENDING'))
+
+
+class StockContentionTests(TransactionTestCase):
+    """Concurrent checkouts of one product: nothing is oversold and nobody waits long."""
+    buyers = 8
+    orders_per_buyer = 5
+    # fewer units than checkouts, so the stock >= quantity guard turns some away
+    initial_stock = 25
+
+    def setUp(self):
+        owner = User.objects.create_user(email='farmer@example.com', password='secret', first_name='Ali', last_name='Aliyev')
+        farm, = create_catalog(owner, CropCategory.objects.create(name='Vegetables'), products_per_farm=1)
+        self.crop = Crop.objects.create(
+            name='Melon', category=CropCategory.objects.get(), farm=farm, stock=self.initial_stock, price=3.0,
+        )
+        self.users = [
+            User.objects.create_user(email=f'buyer{i}@example.com', password='secret', first_name='B', last_name=str(i))
+            for i in range(self.buyers)
+        ]
+
+    def checkout(self, user, results):
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(user)
+        items = [{'quantity': 1, 'content_type': 'crop', 'object_id': self.crop.pk}]
+        try:
+            for _ in range(self.orders_per_buyer):
+                started = time.perf_counter()
+                response = client.post(reverse('order-list'), {'items': items}, format='json')
+                results.append((response.status_code, time.perf_counter() - started))
+        finally:
+            connection.close()
+
+    def test_concurrent_orders_for_one_product(self):
+        results = []
+        threads = [threading.Thread(target=self.checkout, args=(user, results)) for user in self.users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        statuses = [status for status, _ in results]
+        attempts = self.buyers * self.orders_per_buyer
+        self.assertEqual(len(statuses), attempts)
+        self.assertEqual((statuses.count(201), statuses.count(409)), (self.initial_stock, attempts - self.initial_stock))
+        self.crop.refresh_from_db()
+        sold = OrderItem.objects.filter(object_id=self.crop.pk, content_type__model='crop').count()
+        self.assertEqual((self.crop.stock, sold, Order.objects.count()), (0, self.initial_stock, self.initial_stock))
+
+        timings = sorted(seconds for _, seconds in results)
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        self.assertLess(p99, 2.0)
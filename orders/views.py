@@ -1,18 +1,17 @@
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from .models import Order, OrderItem
-from .serializers import OrderSerializer, OrderItemSerializer, CreateOrderSerializer
+from .serializers import OrderSerializer, OrderItemSerializer, CreateOrderSerializer, product_prefetch
 
 class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all().select_related('user')
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-created_at', '-order_id')
 
     def get_queryset(self):
         """Возвращает только заказы текущего пользователя"""
-        print(f"Getting orders for user: {self.request.user.id} - {self.request.user.email}")
-        queryset = Order.objects.filter(user=self.request.user).select_related('user')
-        print(f"Found {queryset.count()} orders for user {self.request.user.id}")
-        return queryset
+        queryset = Order.objects.filter(user=self.request.user).order_by('-created_at', '-order_id')
+        return OrderSerializer.expand_queryset(queryset, self.request)
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -23,7 +22,12 @@ class OrderViewSet(viewsets.ModelViewSet):
         # Пользователь уже сохраняется в CreateOrderSerializer.create()
         serializer.save()
 
-class OrderItemViewSet(viewsets.ModelViewSet):
-    queryset = OrderItem.objects.all()
+class OrderItemViewSet(viewsets.ReadOnlyModelViewSet):
+    """Позиции заказов только для чтения: они меняются вместе с заказом, иначе разойдутся с резервом товара"""
+    queryset = OrderItem.objects.select_related('content_type').prefetch_related(product_prefetch('product')).order_by('id')
     serializer_class = OrderItemSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('id',)
+
+    def get_queryset(self):
+        return super().get_queryset().filter(order__user=self.request.user)